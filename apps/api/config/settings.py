@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -9,27 +11,107 @@ class Settings(BaseSettings):
     AZURE_AI_CHAT_DEPLOYMENT: str = ""
     AZURE_AI_REWRITE_DEPLOYMENT: str = ""
     AZURE_AI_EMBEDDING_DEPLOYMENT: str = ""
+    # Overrides for local stand-ins (evaluation/mock_services.py) or key-based auth:
+    # empty = https://{AZURE_AI_RESOURCE_NAME}.services.ai.azure.com/models and Entra ID
+    AZURE_AI_MODELS_ENDPOINT: str = ""
+    AZURE_AI_API_KEY: str = ""
 
     AZURE_SEARCH_ENDPOINT: str = ""
     AZURE_SEARCH_INDEX_NAME: str = "rag-index"
+    # Admin/query key instead of Entra ID (empty = Entra ID)
+    AZURE_SEARCH_API_KEY: str = ""
+    # "azure" (Azure AI Search) or "local" (index built by scripts/build_local_index.py)
+    RETRIEVAL_BACKEND: Literal["azure", "local"] = "azure"
+    LOCAL_INDEX_PATH: str = "data/local_index"
+    # Azure fusion: "service" (one hybrid query) or "client" (separate vector and keyword
+    # queries with their own over-fetch depths, fused locally with weighted RRF)
+    SEARCH_FUSION_MODE: Literal["service", "client"] = "service"
+    SEARCH_VECTOR_CANDIDATES: int = 50
+    SEARCH_KEYWORD_CANDIDATES: int = 50
+    SEARCH_RRF_K: int = 60
+    SEARCH_RRF_VECTOR_WEIGHT: float = 1.0
+    SEARCH_RRF_KEYWORD_WEIGHT: float = 1.0
+    # In client mode, rerank the fused pool on CPU instead of using the semantic ranker
+    # (off: semantic requests run the semantic ranker on the keyword query)
+    SEARCH_LOCAL_RERANKER: bool = False
 
     AZURE_STORAGE_ACCOUNT_NAME: str = ""
     AZURE_STORAGE_CONTAINER_NAME: str = "documents"
+    # Connection string instead of AZURE_STORAGE_ACCOUNT_NAME + Entra ID (Azurite, local stand-ins)
+    AZURE_STORAGE_CONNECTION_STRING: str = ""
 
     AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT: str = ""
 
     CORS_ORIGINS: list[str] = ["http://localhost:4000"]
 
+    # HTTP connection pools shared by the Azure SDK clients
+    HTTP_POOL_MAX_CONNECTIONS: int = 200
+    HTTP_POOL_MAX_CONNECTIONS_PER_HOST: int = 100
+    HTTP_POOL_SYNC_HOSTS: int = 10
+    HTTP_KEEPALIVE_SECONDS: float = 120
+    # Connections opened per host at startup (0 = no warm-up)
+    HTTP_POOL_WARM_CONNECTIONS: int = 4
+    # Startup warm-up (clients, tokens, tokenizer, connections); /health/ready is 503 until done
+    WARMUP_ENABLED: bool = True
+    # Also send one embedding and one search request during warm-up
+    WARMUP_PROBE: bool = True
+
+    # AAD tokens are refreshed in the background this long before they expire
+    TOKEN_REFRESH_MARGIN_SECONDS: int = 600
+    TOKEN_REFRESH_INTERVAL_SECONDS: int = 60
+    # Share tokens across API workers through CACHE_REDIS_URL (only on a Redis trusted with bearer tokens)
+    TOKEN_CACHE_SHARED: bool = False
+
+    # OpenTelemetry span export (e.g. http://localhost:4318/v1/traces); empty = disabled, needs the 'otel' extra
+    OTEL_EXPORTER_OTLP_ENDPOINT: str = ""
+    OTEL_SERVICE_NAME: str = "rag-api"
+
     DATABASE_URL: str = ""
 
     # Databricks
     DATABRICKS_HOST: str = ""
     DATABRICKS_TOKEN: str = ""
     DATABRICKS_JOB_ID: int = 0
+    # Public base URL of this API, passed to ingestion runs for cache invalidation callbacks
+    API_PUBLIC_URL: str = ""
 
     # RAG Pipeline
     MAX_HISTORY_TURNS: int = 10
     CONTEXT_TOP_K: int = 10
+    # Prompt token budgets (cl100k_base); lowest-ranked chunks and oldest turns are cut first
+    CONTEXT_TOKEN_BUDGET: int = 6000
+    HISTORY_TOKEN_BUDGET: int = 2000
+    HISTORY_OLD_MESSAGE_MAX_TOKENS: int = 300
+    # Streamed deltas arriving within this window are sent as one SSE frame (0 = one frame per delta)
+    SSE_COALESCE_MS: float = 0
+
+    # Caching — CACHE_REDIS_URL enables a cache tier shared across API workers. Required for
+    # correct search/answer cache invalidation with more than one worker: without it, uploads
+    # and deletes only invalidate the worker that handled them
+    CACHE_REDIS_URL: str = ""
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 4096
+    EMBEDDING_CACHE_TTL_SECONDS: int = 86400
+    # Micro-batching: concurrent requests' query embeddings share one call (0 = one call per request)
+    EMBEDDING_BATCH_WINDOW_MS: float = 5
+    EMBEDDING_BATCH_MAX_SIZE: int = 64
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_MAX_ENTRIES: int = 2048
+    SEARCH_CACHE_TTL_SECONDS: int = 600
+    # Semantic answer cache (opt-in): reuse answers to near-identical questions in the same scope
+    ANSWER_CACHE_ENABLED: bool = False
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.97
+    ANSWER_CACHE_MAX_SCOPES: int = 1024
+    ANSWER_CACHE_MAX_ENTRIES_PER_SCOPE: int = 128
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+
+    # Rewrite fast path: classify obvious follow-ups locally instead of calling the LLM
+    REWRITE_FAST_PATH: bool = True
+    REWRITE_FAST_PATH_MIN_CONFIDENCE: float = 0.85
+
+    # Speculative retrieval: embed + search the raw query while the rewrite is in flight
+    SPECULATIVE_RETRIEVAL: bool = True
+    SPECULATIVE_SIMILARITY_THRESHOLD: float = 0.85
 
 
 settings = Settings()
@@ -1,21 +1,57 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from utils.request_context import TraceContextMiddleware, TraceIdLogFilter
+
 _handler = logging.StreamHandler()
-for _name in ("routers", "services"):
+_handler.addFilter(TraceIdLogFilter())
+_handler.setFormatter(logging.Formatter("[%(trace_id)s] %(message)s"))
+for _name in ("routers", "services", "utils"):
     _log = logging.getLogger(_name)
     _log.setLevel(logging.INFO)
     _log.addHandler(_handler)
 
 from config.settings import settings
-from routers import health, chat, documents
+from routers import health, chat, documents, metrics
+from services.search_cache_service import warn_if_generations_unshared
+from services.warmup_service import mark_ready, warm_up
+from utils.azure_clients import close_clients, get_token_cache, token_scopes
+from utils.http_transport import close_http_sessions
+from utils.telemetry import configure_tracing, shutdown_tracing
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_tracing()
+    warn_if_generations_unshared()
+    # Warm up in the background so liveness checks are answered meanwhile (see /health/ready)
+    warm_up_task = asyncio.create_task(warm_up()) if settings.WARMUP_ENABLED else None
+    if warm_up_task is None:
+        mark_ready()
+    # Keep AAD tokens fresh so token acquisition never runs inside a request
+    token_refresh_task = None
+    if settings.AZURE_AI_RESOURCE_NAME and token_scopes():
+        token_refresh_task = asyncio.create_task(get_token_cache().run_refresh_loop())
+    yield
+    for task in (warm_up_task, token_refresh_task):
+        if task is not None and not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    await close_clients()
+    await close_http_sessions()
+    shutdown_tracing()
+
 
 app = FastAPI(
     title="Azure RAG API",
     description="Production-grade Retrieval-Augmented Generation API",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -24,8 +60,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
+app.add_middleware(TraceContextMiddleware)
 
 app.include_router(health.router, prefix="/api/v1")
 app.include_router(chat.router, prefix="/api/v1")
 app.include_router(documents.router, prefix="/api/v1")
+app.include_router(metrics.router, prefix="/api/v1")
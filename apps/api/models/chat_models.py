@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -21,6 +21,9 @@ class ChatRequest(BaseModel):
     top_k: int = 10
     # Per-request override for evaluation — None means use server default (semantic on)
     use_semantic_search: Optional[bool] = None
+    # Retrieval expansion — extra sub-queries (or HyDE passages) searched alongside the rewrite, 0 = off
+    query_expansion: int = Field(default=0, ge=0, le=4)
+    expansion_mode: Literal["sub_queries", "hyde"] = "sub_queries"
 
 
 class SearchChunk(BaseModel):
@@ -71,6 +74,29 @@ class TimingBreakdown(BaseModel):
     search_ms: float = 0
     generation_ms: float = 0
     total_ms: float = 0
+    # Generation throughput; ttft_ms is only measured when streaming
+    ttft_ms: float = 0
+    completion_tokens: int = 0
+    tokens_per_second: float = 0
+    # Speculative retrieval — None when speculation did not run for this request
+    speculative_hit: Optional[bool] = None
+    speculative_hit_rate: Optional[float] = None
+    # None when the search cache is disabled
+    search_cache_hit: Optional[bool] = None
+    # None when the answer cache is disabled or did not apply
+    answer_cache_hit: Optional[bool] = None
+    # Number of expansion queries searched and fused with the rewritten query
+    expanded_queries: int = 0
+    # Client-side fusion stages (SEARCH_FUSION_MODE=client), included in search_ms
+    vector_search_ms: float = 0
+    keyword_search_ms: float = 0
+    fusion_ms: float = 0
+    rerank_ms: float = 0
+    # Prompt size after token-budgeted packing (cl100k_base tokens)
+    prompt_tokens: int = 0
+    context_tokens: int = 0
+    history_tokens: int = 0
+    chunks_dropped: int = 0
 
 
 class RetrievedChunk(BaseModel):
@@ -87,3 +113,5 @@ class ChatQueryResponse(BaseModel):
     query_rewritten: str
     timing: Optional[TimingBreakdown] = None
     chunks_used: list[RetrievedChunk] = Field(default_factory=list)
+    # Same ID as the X-Trace-Id response header and the SDK calls' x-ms-client-request-id
+    trace_id: Optional[str] = None
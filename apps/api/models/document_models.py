@@ -1,6 +1,7 @@
 import uuid
+from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class DocumentUploadResponse(BaseModel):
@@ -25,6 +26,16 @@ class DocumentListResponse(BaseModel):
     documents: list[DocumentListItem]
 
 
+class IndexUpdatedRequest(BaseModel):
+    """Callback from the ingestion pipeline after it changed a tenant's index."""
+
+    organization_id: str
+    folder_ids: list[str] = Field(default_factory=list)
+    # Passed through from the upload that triggered the run (absent for runs started elsewhere)
+    trace_id: Optional[str] = None
+    uploaded_at: Optional[float] = None
+
+
 def generate_document_id(blob_name: str) -> str:
     """Generate a deterministic document ID from the blob name."""
     return str(uuid.uuid5(uuid.NAMESPACE_URL, blob_name))
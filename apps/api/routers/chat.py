@@ -1,19 +1,36 @@
 import asyncio
+import functools
 import logging
 import time
+from typing import AsyncIterator, Awaitable, Callable
 
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
 
+from config.settings import settings
 from models.chat_models import (
     ChatQueryResponse,
+    Citation,
     ChatRequest,
     RetrievedChunk,
+    SearchChunk,
     TimingBreakdown,
 )
-from services.generation_service import generate_answer, generate_answer_streaming
-from services.query_service import rewrite_query
-from services.retrieval_service import embed_query, hybrid_search
+from services.answer_cache_service import CachedAnswer, lookup_answer, store_answer
+from services.context_service import PackedContext, pack_context
+from services.generation_service import (
+    count_prompt_tokens,
+    generate_answer,
+    generate_answer_streaming,
+    replay_answer_streaming,
+)
+from services.query_service import is_equivalent_query, rewrite_and_expand_query, rewrite_query
+from services.ranking import reciprocal_rank_fusion
+from services.retrieval_service import embed_queries, embed_query, hybrid_search
+from services.search_cache_service import get_cached_search, set_cached_search
+from utils.metrics import GENERATION_TOKENS_PER_SECOND, STAGE_SECONDS
+from utils.request_context import get_trace_id
+from utils.telemetry import record_span, span
 
 logger = logging.getLogger(__name__)
 
@@ -21,57 +38,433 @@ router = APIRouter(prefix="/chat", tags=["chat"])
 
 SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
 
+# Process-wide speculative retrieval counters, reported through TimingBreakdown
+_speculation_stats = {"attempts": 0, "hits": 0}
+
+# Filled in by _embed_and_search, copied over when a speculative retrieval is used
+_RETRIEVAL_TIMING_FIELDS = (
+    "embed_ms",
+    "search_ms",
+    "search_cache_hit",
+    "vector_search_ms",
+    "keyword_search_ms",
+    "fusion_ms",
+    "rerank_ms",
+)
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+
+def _use_semantic(request: ChatRequest) -> bool:
+    """Resolve the per-request semantic search override."""
+    return request.use_semantic_search if request.use_semantic_search is not None else True
+
+
+def _observe(route: str, request: ChatRequest, timing: TimingBreakdown) -> None:
+    """Record the request's stage latencies in the Prometheus histograms.
+
+    Stages that did not run (search on a cache hit, generation on an answer
+    cache hit, TTFT without streaming) are left out rather than observed as 0.
+    """
+    if timing.answer_cache_hit:
+        cache_hit = "answer"
+    elif timing.search_cache_hit:
+        cache_hit = "search"
+    else:
+        cache_hit = "none"
+    labels = {"route": route, "semantic": str(_use_semantic(request)).lower(), "cache_hit": cache_hit}
+
+    stages = {"rewrite": timing.rewrite_ms, "total": timing.total_ms}
+    if not timing.search_cache_hit:
+        stages["embed"] = timing.embed_ms
+        stages["search"] = timing.search_ms
+    if not timing.answer_cache_hit:
+        stages["ttft"] = timing.ttft_ms
+        stages["generation"] = timing.generation_ms
+    for stage, ms in stages.items():
+        if ms:
+            STAGE_SECONDS.labels(stage=stage, **labels).observe(ms / 1000)
+    if timing.tokens_per_second:
+        GENERATION_TOKENS_PER_SECOND.labels(**labels).observe(timing.tokens_per_second)
+
+
+def _discard(task: asyncio.Task) -> None:
+    """Cancel a speculative task, or swallow its error if it already failed."""
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        task.exception()
+
+
+async def _embed_and_search(
+    query: str,
+    request: ChatRequest,
+    use_semantic: bool,
+    timing: TimingBreakdown,
+) -> tuple[list[SearchChunk], list[float] | None]:
+    """Embed a query and run hybrid search, serving repeated searches from the cache.
+
+    Returns (chunks, query vector). The vector is None when the search cache
+    answered and the query was never embedded.
+    """
+    top_k = request.top_k
+    folder_ids = request.filters.folder_ids or None
+    document_names = request.filters.document_names or None
+
+    cache_key = None
+    if settings.SEARCH_CACHE_ENABLED:
+        cache_key, cached = await get_cached_search(
+            query, request.organization_id, top_k, folder_ids, document_names, use_semantic
+        )
+        timing.search_cache_hit = cached is not None
+        if cached is not None:
+            return cached, None
+
+    t0 = time.perf_counter()
+    with span("embed"):
+        query_vector = await embed_query(query)
+    t1 = time.perf_counter()
+
+    # Hybrid search (always scoped by organization_id)
+    with span("search", semantic=use_semantic):
+        chunks = await hybrid_search(
+            query,
+            query_vector,
+            request.organization_id,
+            top_k,
+            folder_ids,
+            document_names,
+            use_semantic,
+            timing,
+        )
+    t2 = time.perf_counter()
+    timing.embed_ms = _ms(t1 - t0)
+    timing.search_ms = _ms(t2 - t1)
+
+    if cache_key is not None:
+        set_cached_search(cache_key, chunks)
+    return chunks, query_vector
+
+
+async def _embed_and_search_many(
+    searches: list[tuple[str, str]],
+    request: ChatRequest,
+    use_semantic: bool,
+    timing: TimingBreakdown,
+) -> tuple[list[list[SearchChunk]], list[list[float] | None]]:
+    """Run several (search_text, embed_text) searches: one batched embed call, concurrent searches.
+
+    Returns the results and the embed_text vectors (None where the search cache answered).
+    """
+    top_k = request.top_k
+    folder_ids = request.filters.folder_ids or None
+    document_names = request.filters.document_names or None
+
+    results: list[list[SearchChunk] | None] = [None] * len(searches)
+    query_vectors: list[list[float] | None] = [None] * len(searches)
+    cache_keys: list[str | None] = [None] * len(searches)
+    if settings.SEARCH_CACHE_ENABLED:
+        lookups = await asyncio.gather(*(
+            get_cached_search(
+                text if text == embed_text else f"{text}\n{embed_text}",
+                request.organization_id, top_k, folder_ids, document_names, use_semantic,
+            )
+            for text, embed_text in searches
+        ))
+        for i, (cache_key, cached) in enumerate(lookups):
+            cache_keys[i], results[i] = cache_key, cached
+
+    misses = [i for i, chunks in enumerate(results) if chunks is None]
+    timing.search_cache_hit = not misses if settings.SEARCH_CACHE_ENABLED else None
+    if misses:
+        t0 = time.perf_counter()
+        with span("embed", queries=len(misses)):
+            vectors = await embed_queries([searches[i][1] for i in misses])
+        t1 = time.perf_counter()
+        with span("search", semantic=use_semantic, queries=len(misses)):
+            found = await asyncio.gather(*(
+                hybrid_search(
+                    searches[i][0],
+                    vector,
+                    request.organization_id,
+                    top_k,
+                    folder_ids,
+                    document_names,
+                    use_semantic,
+                    timing,
+                )
+                for i, vector in zip(misses, vectors)
+            ))
+        t2 = time.perf_counter()
+        timing.embed_ms = _ms(t1 - t0)
+        timing.search_ms = _ms(t2 - t1)
+
+        for i, chunks, vector in zip(misses, found, vectors):
+            results[i] = chunks
+            query_vectors[i] = vector
+            if cache_keys[i] is not None:
+                set_cached_search(cache_keys[i], chunks)
+
+    return [chunks or [] for chunks in results], query_vectors
+
+
+async def _expanded_search(
+    rewritten_query: str,
+    expansions: list[str],
+    primary: list[SearchChunk] | None,
+    request: ChatRequest,
+    use_semantic: bool,
+    timing: TimingBreakdown,
+) -> tuple[list[SearchChunk], list[float] | None]:
+    """Search the rewritten query and its expansions, then fuse the results with RRF.
+
+    Sub-queries are searched as both keywords and vector. HyDE passages are
+    only embedded; their keyword side is the rewritten query. primary holds
+    results already retrieved for the rewritten query (speculative hit).
+
+    Returns (fused chunks, vector of the rewritten query), the vector being
+    None when it was not embedded here.
+    """
+    searches = [] if primary is not None else [(rewritten_query, rewritten_query)]
+    if request.expansion_mode == "hyde":
+        searches += [(rewritten_query, passage) for passage in expansions]
+    else:
+        searches += [(q, q) for q in expansions]
+
+    rankings, query_vectors = await _embed_and_search_many(searches, request, use_semantic, timing)
+    query_vector = None
+    if primary is not None:
+        rankings.insert(0, primary)
+    else:
+        query_vector = query_vectors[0]
+
+    # Deduplicate by chunk id, keeping the copy from the highest-priority ranking
+    by_id: dict[str, SearchChunk] = {}
+    for ranking in rankings:
+        for chunk in ranking:
+            by_id.setdefault(chunk.id, chunk)
+    fused = reciprocal_rank_fusion([[c.id for c in ranking] for ranking in rankings])
+
+    timing.expanded_queries = len(expansions)
+    logger.info(
+        "[TIMING] query expansion: %d queries, %d unique chunks fused",
+        len(rankings),
+        len(by_id),
+    )
+    return [
+        by_id[chunk_id].model_copy(update={"search_score": score})
+        for chunk_id, score in fused[: request.top_k]
+    ], query_vector
+
+
+async def _retrieve(
+    request: ChatRequest,
+    timing: TimingBreakdown,
+) -> tuple[str, bool, list[SearchChunk], list[float] | None]:
+    """Rewrite the query, then embed and search it.
+
+    With SPECULATIVE_RETRIEVAL enabled, the raw query is embedded and searched
+    while the rewrite is in flight. The speculative results are used when the
+    rewrite comes back (nearly) unchanged and discarded otherwise. With
+    request.query_expansion set, the rewrite also returns expansion queries
+    that are searched alongside it and fused (see _expanded_search).
+
+    Returns (rewritten_query, is_conversational, chunks, query_vector) and
+    fills in timing. query_vector is the embedding of the rewritten query, or
+    None when retrieval did not compute it (search cache hit, conversational
+    message, or a speculative hit on a differently worded query).
+    """
+    t_start = time.perf_counter()
+
+    use_semantic = _use_semantic(request)
+
+    # Without history the rewrite is a no-op, so there is nothing to overlap with
+    speculative = None
+    speculative_timing = TimingBreakdown()
+    if settings.SPECULATIVE_RETRIEVAL and request.conversation_history:
+        speculative = asyncio.create_task(
+            _embed_and_search(request.query, request, use_semantic, speculative_timing)
+        )
+
+    try:
+        # 1. Rewrite query (also classifies conversational vs retrieval)
+        expansions: list[str] = []
+        with span("rewrite"):
+            if request.query_expansion:
+                rewritten_query, is_conversational, expansions = await rewrite_and_expand_query(
+                    request.query,
+                    request.conversation_history,
+                    request.query_expansion,
+                    request.expansion_mode,
+                )
+            else:
+                rewritten_query, is_conversational = await rewrite_query(
+                    request.query, request.conversation_history
+                )
+        t_rewrite = time.perf_counter()
+        timing.rewrite_ms = _ms(t_rewrite - t_start)
+        logger.info("[TIMING] rewrite: %.2fs (conversational=%s)", t_rewrite - t_start, is_conversational)
+
+        # 2. Skip retrieval for conversational messages (thanks, greetings, etc.)
+        if is_conversational:
+            return rewritten_query, True, [], None
+
+        # 3. Embed + search, reusing the speculative results when the rewrite matches
+        chunks = None
+        query_vector = None
+        if speculative is not None:
+            hit = is_equivalent_query(
+                request.query, rewritten_query, settings.SPECULATIVE_SIMILARITY_THRESHOLD
+            )
+            _speculation_stats["attempts"] += 1
+            _speculation_stats["hits"] += int(hit)
+            timing.speculative_hit = hit
+            timing.speculative_hit_rate = round(
+                _speculation_stats["hits"] / _speculation_stats["attempts"], 3
+            )
+            if hit:
+                chunks, query_vector = await speculative
+                speculative = None
+                # The speculative vector embeds the raw query, not the rewrite
+                if rewritten_query != request.query:
+                    query_vector = None
+                for field in _RETRIEVAL_TIMING_FIELDS:
+                    setattr(timing, field, getattr(speculative_timing, field))
+                logger.info(
+                    "[TIMING] speculative retrieval hit, waited %.2fs after rewrite",
+                    time.perf_counter() - t_rewrite,
+                )
+            else:
+                logger.info("[TIMING] speculative retrieval miss (rewritten=%r)", rewritten_query)
+
+        # Expansion queries are searched concurrently and fused with the rewritten query
+        if expansions:
+            chunks, expanded_vector = await _expanded_search(
+                rewritten_query, expansions, chunks, request, use_semantic, timing
+            )
+            query_vector = query_vector or expanded_vector
+        elif chunks is None:
+            chunks, query_vector = await _embed_and_search(rewritten_query, request, use_semantic, timing)
+
+        if timing.search_cache_hit:
+            logger.info("[TIMING] search cache hit (%d chunks)", len(chunks))
+        else:
+            logger.info("[TIMING] embed: %.2fs", timing.embed_ms / 1000)
+            logger.info("[TIMING] hybrid search: %.2fs (%d chunks)", timing.search_ms / 1000, len(chunks))
+
+        return rewritten_query, False, chunks, query_vector
+    finally:
+        # Conversational messages, rewrite misses and errors throw the speculation away
+        if speculative is not None:
+            _discard(speculative)
+
+
+async def _check_answer_cache(
+    request: ChatRequest,
+    rewritten_query: str,
+    query_vector: list[float] | None,
+    chunks: list[SearchChunk],
+    timing: TimingBreakdown,
+) -> tuple[CachedAnswer | None, Callable[[str, list[Citation]], Awaitable[None]] | None]:
+    """Look up a cached answer for the retrieved chunks.
+
+    Returns (cached answer or None, callback that stores a freshly generated
+    answer or None). Both are None when the answer cache does not apply: it
+    is keyed on the standalone query and the chunks only, so requests with
+    conversation history, whose answers also depend on that history, skip it.
+    """
+    if not settings.ANSWER_CACHE_ENABLED or not chunks or request.conversation_history:
+        return None, None
+
+    # Retrieval hands over its vector; it only has none after a search cache hit
+    if query_vector is None:
+        query_vector = await embed_query(rewritten_query)
+    folder_ids = request.filters.folder_ids or None
+    document_names = request.filters.document_names or None
+
+    cached = await lookup_answer(
+        query_vector, chunks, request.organization_id, folder_ids, document_names
+    )
+    timing.answer_cache_hit = cached is not None
+    if cached is not None:
+        return cached, None
+
+    store = functools.partial(
+        store_answer, query_vector, chunks, request.organization_id, folder_ids, document_names
+    )
+    return None, store
+
+
+def _pack(
+    request: ChatRequest,
+    query: str,
+    chunks: list[SearchChunk],
+    timing: TimingBreakdown,
+) -> PackedContext:
+    """Pack chunks and history into the prompt token budgets and record the counts."""
+    packed = pack_context(chunks, request.conversation_history)
+    timing.prompt_tokens = count_prompt_tokens(query, packed)
+    timing.context_tokens = packed.context_tokens
+    timing.history_tokens = packed.history_tokens
+    timing.chunks_dropped = packed.chunks_dropped
+    logger.info("[TIMING] prompt tokens: %d", timing.prompt_tokens)
+    return packed
+
+
+async def _observed_stream(
+    frames: AsyncIterator[bytes],
+    request: ChatRequest,
+    timing: TimingBreakdown,
+    t_start: float,
+) -> AsyncIterator[bytes]:
+    """Pass SSE frames through, then record the request once the stream has finished."""
+    async for frame in frames:
+        yield frame
+    elapsed = time.perf_counter() - t_start
+    timing.total_ms = _ms(elapsed)
+    logger.info("[TIMING] total: %.2fs", elapsed)
+    if not timing.answer_cache_hit:
+        record_span("generation", timing.generation_ms / 1000, route="stream")
+    _observe("stream", request, timing)
+
 
 @router.post("/stream")
 async def chat_stream(request: ChatRequest):
     """Stream a RAG-powered answer as SSE events."""
     t_start = time.perf_counter()
 
-    # 1. Rewrite query (also classifies conversational vs retrieval)
-    rewritten_query, is_conversational = await asyncio.to_thread(
-        rewrite_query, request.query, request.conversation_history
-    )
-    t_rewrite = time.perf_counter()
-    logger.info("[TIMING] rewrite: %.2fs (conversational=%s)", t_rewrite - t_start, is_conversational)
+    timing = TimingBreakdown()
+    with span("chat.retrieve", route="stream", semantic=_use_semantic(request)):
+        rewritten_query, is_conversational, chunks, query_vector = await _retrieve(request, timing)
+
+    t_total = time.perf_counter()
+    logger.info("[TIMING] total before streaming: %.2fs", t_total - t_start)
 
-    # 2. Skip RAG pipeline for conversational messages (thanks, greetings, etc.)
-    if is_conversational:
+    # Conversational messages are answered from the original query without context
+    query_for_gen = request.query if is_conversational else rewritten_query
+
+    # 4. Replay a cached answer, or stream a new one
+    cached, store = await _check_answer_cache(request, rewritten_query, query_vector, chunks, timing)
+    if cached is not None:
         return StreamingResponse(
-            generate_answer_streaming(
-                request.query, [], request.conversation_history
+            _observed_stream(
+                replay_answer_streaming(cached.answer, cached.citations), request, timing, t_start
             ),
             media_type="text/event-stream",
             headers=SSE_HEADERS,
         )
 
-    # Resolve per-request semantic search override
-    use_semantic = request.use_semantic_search if request.use_semantic_search is not None else True
-
-    # 3. Embed + search
-    query_vector = await asyncio.to_thread(embed_query, rewritten_query)
-    t_embed = time.perf_counter()
-    logger.info("[TIMING] embed: %.2fs", t_embed - t_rewrite)
-
-    chunks = await asyncio.to_thread(
-        hybrid_search,
-        rewritten_query,
-        query_vector,
-        request.organization_id,
-        request.top_k,
-        request.filters.folder_ids or None,
-        request.filters.document_names or None,
-        use_semantic,
-    )
-    t_search = time.perf_counter()
-    logger.info("[TIMING] hybrid search: %.2fs (%d chunks)", t_search - t_embed, len(chunks))
-
-    t_total = time.perf_counter()
-    logger.info("[TIMING] total before streaming: %.2fs", t_total - t_start)
-
-    # 5. Stream the answer
+    packed = _pack(request, query_for_gen, chunks, timing)
     return StreamingResponse(
-        generate_answer_streaming(
-            rewritten_query, chunks, request.conversation_history
+        _observed_stream(
+            generate_answer_streaming(
+                query_for_gen, packed.chunks, packed.history, on_complete=store, timing=timing
+            ),
+            request,
+            timing,
+            t_start,
         ),
         media_type="text/event-stream",
         headers=SSE_HEADERS,
@@ -83,52 +476,33 @@ async def chat_query(request: ChatRequest):
     """Return a RAG-powered answer without streaming (for evaluation)."""
     t_start = time.perf_counter()
 
-    # 1. Rewrite query (also classifies conversational vs retrieval)
-    rewritten_query, is_conversational = await asyncio.to_thread(
-        rewrite_query, request.query, request.conversation_history
-    )
-    t_rewrite = time.perf_counter()
-    logger.info("[TIMING] rewrite: %.2fs (conversational=%s)", t_rewrite - t_start, is_conversational)
-
-    # Resolve per-request semantic search override
-    use_semantic = request.use_semantic_search if request.use_semantic_search is not None else True
-
-    timing = TimingBreakdown(rewrite_ms=round((t_rewrite - t_start) * 1000, 1))
-
-    chunks = []
-    if not is_conversational:
-        # 2. Embed the rewritten query
-        query_vector = await asyncio.to_thread(embed_query, rewritten_query)
-        t_embed = time.perf_counter()
-        timing.embed_ms = round((t_embed - t_rewrite) * 1000, 1)
-        logger.info("[TIMING] embed: %.2fs", t_embed - t_rewrite)
-
-        # 3. Hybrid search (always scoped by organization_id)
-        chunks = await asyncio.to_thread(
-            hybrid_search,
-            rewritten_query,
-            query_vector,
-            request.organization_id,
-            request.top_k,
-            request.filters.folder_ids or None,
-            request.filters.document_names or None,
-            use_semantic,
-        )
-        t_search = time.perf_counter()
-        timing.search_ms = round((t_search - t_embed) * 1000, 1)
-        logger.info("[TIMING] hybrid search: %.2fs (%d chunks)", t_search - t_embed, len(chunks))
+    timing = TimingBreakdown()
+    with span("chat.retrieve", route="query", semantic=_use_semantic(request)):
+        rewritten_query, is_conversational, chunks, query_vector = await _retrieve(request, timing)
 
-    # 5. Generate answer
+    # 4. Reuse a cached answer, or generate a new one
     query_for_gen = request.query if is_conversational else rewritten_query
+    cached, store = await _check_answer_cache(request, rewritten_query, query_vector, chunks, timing)
     t_before_gen = time.perf_counter()
-    answer, citations = await asyncio.to_thread(
-        generate_answer, query_for_gen, chunks, request.conversation_history
-    )
+    if cached is not None:
+        answer, citations = cached.answer, cached.citations
+        # The cached answer was generated from these chunks, which pack the same way again
+        used_chunks = pack_context(chunks, request.conversation_history).chunks
+    else:
+        packed = _pack(request, query_for_gen, chunks, timing)
+        used_chunks = packed.chunks
+        with span("generation", route="query"):
+            answer, citations = await generate_answer(
+                query_for_gen, packed.chunks, packed.history, timing=timing
+            )
+        if store is not None:
+            await store(answer, citations)
     t_gen = time.perf_counter()
-    timing.generation_ms = round((t_gen - t_before_gen) * 1000, 1)
-    timing.total_ms = round((t_gen - t_start) * 1000, 1)
+    timing.generation_ms = _ms(t_gen - t_before_gen)
+    timing.total_ms = _ms(t_gen - t_start)
     logger.info("[TIMING] generation: %.2fs", t_gen - t_before_gen)
     logger.info("[TIMING] total: %.2fs", t_gen - t_start)
+    _observe("query", request, timing)
 
     chunks_used = [
         RetrievedChunk(
@@ -138,7 +512,7 @@ async def chat_query(request: ChatRequest):
             search_score=c.search_score,
             reranker_score=c.reranker_score,
         )
-        for c in chunks
+        for c in used_chunks
     ]
 
     return ChatQueryResponse(
@@ -147,4 +521,5 @@ async def chat_query(request: ChatRequest):
         query_rewritten=rewritten_query,
         timing=timing,
         chunks_used=chunks_used,
+        trace_id=get_trace_id(),
     )
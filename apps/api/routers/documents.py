@@ -1,7 +1,10 @@
+import hashlib
 import logging
+import time
 from typing import Optional
 
 import httpx
+from azure.core.exceptions import ResourceNotFoundError
 from fastapi import APIRouter, BackgroundTasks, Form, HTTPException, Query, UploadFile
 
 from config.settings import settings
@@ -9,9 +12,13 @@ from models.document_models import (
     DocumentListItem,
     DocumentListResponse,
     DocumentUploadResponse,
+    IndexUpdatedRequest,
     generate_document_id,
 )
+from services.search_cache_service import bump_generation
 from utils.azure_clients import get_blob_service_client, get_search_client
+from utils.metrics import INGESTION_LATENCY_SECONDS
+from utils.request_context import get_trace_id, traceparent
 
 logger = logging.getLogger(__name__)
 
@@ -20,9 +27,26 @@ router = APIRouter(prefix="/documents", tags=["documents"])
 ALLOWED_EXTENSIONS = {".pdf", ".docx", ".doc", ".txt"}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
 
+# Blob metadata keys. The API sets content_sha256 on upload; the indexing task
+# sets indexed_sha256 (and the chunking settings used, indexed_chunking) once
+# that content is fully in the search index.
+CONTENT_HASH_METADATA = "content_sha256"
+INDEXED_HASH_METADATA = "indexed_sha256"
+INDEXED_CHUNKING_METADATA = "indexed_chunking"
 
-async def trigger_databricks_job(document_names: str, org_id: str, folder_id: str) -> None:
-    """Fire-and-forget trigger for the Databricks ingestion job."""
+
+async def trigger_databricks_job(
+    document_names: str,
+    org_id: str,
+    folder_id: str,
+    trace_id: str | None = None,
+    uploaded_at: float | None = None,
+) -> None:
+    """Fire-and-forget trigger for the Databricks ingestion job.
+
+    trace_id and uploaded_at travel with the run so the indexing task can
+    report upload-to-indexed latency back to the API under the upload's trace.
+    """
     if not settings.DATABRICKS_HOST or not settings.DATABRICKS_TOKEN or not settings.DATABRICKS_JOB_ID:
         logger.debug("Databricks not configured, skipping job trigger")
         return
@@ -33,14 +57,21 @@ async def trigger_databricks_job(document_names: str, org_id: str, folder_id: st
             "document_names": document_names,
             "organization_id": org_id,
             "folder_id": folder_id,
+            # Lets the indexing task invalidate this API's search cache when it finishes
+            "api_base_url": settings.API_PUBLIC_URL,
+            "trace_id": trace_id or "",
+            "uploaded_at": f"{uploaded_at:.3f}" if uploaded_at is not None else "",
         },
     }
     logger.info("Triggering Databricks job %s at %s", settings.DATABRICKS_JOB_ID, url)
     try:
         async with httpx.AsyncClient() as client:
+            headers = {"Authorization": f"Bearer {settings.DATABRICKS_TOKEN}"}
+            if trace_id:
+                headers["traceparent"] = traceparent(trace_id)
             resp = await client.post(
                 url,
-                headers={"Authorization": f"Bearer {settings.DATABRICKS_TOKEN}"},
+                headers=headers,
                 json=payload,
                 timeout=10,
             )
@@ -57,9 +88,15 @@ async def upload_document(
     file: UploadFile,
     organization_id: str = Form(...),
     folder_id: str = Form(...),
+    force: bool = Form(default=False),
     background_tasks: BackgroundTasks = BackgroundTasks(),
 ):
-    """Upload a document to Azure Blob Storage for ingestion."""
+    """Upload a document to Azure Blob Storage for ingestion.
+
+    Re-uploading the exact bytes that are already indexed is a no-op (status
+    "unchanged") unless force is set.
+    """
+    uploaded_at = time.time()
     if not file.filename:
         raise HTTPException(status_code=400, detail="No filename provided")
 
@@ -83,11 +120,46 @@ async def upload_document(
     # Store blob under {organization_id}/{folder_id}/{filename}
     blob_path = f"{organization_id}/{folder_id}/{file.filename}"
     blob_client = container_client.get_blob_client(blob_path)
-    blob_client.upload_blob(contents, overwrite=True)
-
     document_id = generate_document_id(blob_path)
+    content_hash = hashlib.sha256(contents).hexdigest()
+
+    try:
+        existing = blob_client.get_blob_properties().metadata or {}
+    except ResourceNotFoundError:
+        existing = {}
+
+    # Only skip when the blob holds this content and it is indexed: a pending, unindexed
+    # version in the blob must still be replaced (same rule as the pipeline's is_unchanged)
+    unchanged = (
+        existing.get(CONTENT_HASH_METADATA) == content_hash
+        and existing.get(INDEXED_HASH_METADATA) == content_hash
+    )
+    if not force and unchanged:
+        logger.info("Skipping unchanged upload %s (sha256 %s)", blob_path, content_hash[:12])
+        return DocumentUploadResponse(
+            document_id=document_id,
+            document_name=file.filename,
+            organization_id=organization_id,
+            folder_id=folder_id,
+            status="unchanged",
+            message="Document is identical to the indexed version, nothing to process.",
+        )
 
-    background_tasks.add_task(trigger_databricks_job, blob_path, organization_id, folder_id)
+    # Put Blob replaces all metadata: carry over what the indexing task recorded about
+    # the indexed version, so the pipeline can diff the new version's pages against it
+    metadata = {
+        key: existing[key]
+        for key in (INDEXED_HASH_METADATA, INDEXED_CHUNKING_METADATA)
+        if key in existing
+    }
+    metadata[CONTENT_HASH_METADATA] = content_hash
+    blob_client.upload_blob(contents, overwrite=True, metadata=metadata)
+
+    await bump_generation(organization_id, folder_id)
+
+    background_tasks.add_task(
+        trigger_databricks_job, blob_path, organization_id, folder_id, get_trace_id(), uploaded_at
+    )
 
     return DocumentUploadResponse(
         document_id=document_id,
@@ -174,4 +246,26 @@ async def delete_document(
     except Exception:
         logger.warning("Failed to delete search entries for document %s", document_id)
 
+    await bump_generation(organization_id, folder_id)
+
+    return {"ok": True}
+
+
+@router.post("/index-updated")
+async def index_updated(request: IndexUpdatedRequest):
+    """Invalidate cached search results after the ingestion pipeline changed a tenant's index."""
+    if request.uploaded_at is not None:
+        latency = time.time() - request.uploaded_at
+        INGESTION_LATENCY_SECONDS.observe(latency)
+        logger.info(
+            "[TIMING] upload to indexed: %.1fs (org=%s, upload trace_id=%s)",
+            latency,
+            request.organization_id,
+            request.trace_id,
+        )
+    if request.folder_ids:
+        for fid in request.folder_ids:
+            await bump_generation(request.organization_id, fid)
+    else:
+        await bump_generation(request.organization_id)
     return {"ok": True}
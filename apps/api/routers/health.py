@@ -1,4 +1,7 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from services.warmup_service import get_readiness
 
 router = APIRouter()
 
@@ -6,3 +9,16 @@ router = APIRouter()
 @router.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+
+@router.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: 503 until startup warm-up has finished."""
+    readiness = get_readiness()
+    return JSONResponse(
+        status_code=200 if readiness["ready"] else 503,
+        content={
+            "status": "ready" if readiness["ready"] else "warming_up",
+            "checks": readiness["checks"],
+        },
+    )
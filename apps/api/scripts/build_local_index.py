@@ -0,0 +1,174 @@
+"""Build a local search index from the chunks_with_embeddings output.
+
+Reads Parquet (a single file or a directory of Parquet files) and writes the
+files the local retrieval backend loads (RETRIEVAL_BACKEND=local). Export the
+Delta table first so only its current rows are read, e.g. in a notebook:
+
+    spark.table("rag_ingestion.chunks_with_embeddings").write.parquet("/Volumes/.../chunks_with_embeddings")
+    spark.table("rag_ingestion.parsed_documents").select("document_id", "parsed_at", "pages_json") \
+        .write.parquet("/Volumes/.../parsed_documents")
+
+The tables are appended to on every ingestion run, so the rows are reduced
+to what the search index holds after the indexing task's stale-chunk
+cleanup:
+  - the latest row per chunk id (by chunked_at)
+  - a document whose newest chunking run used document-wide IDs keeps only
+    that run's chunks
+  - otherwise each page keeps only the chunks of the newest run that
+    chunked it (pages are re-chunked independently)
+  - with --parsed, pages that the latest parsed version of the document no
+    longer has, or has without text, are dropped
+
+Usage:
+    cd apps/api
+    uv run --extra local-index python scripts/build_local_index.py /path/to/chunks_with_embeddings \
+        --parsed /path/to/parsed_documents
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import orjson
+import pyarrow.parquet as pq
+
+from config.settings import settings
+
+COLUMNS = [
+    "id", "content", "content_vector", "document_id", "document_name",
+    "document_url", "page_number", "chunk_index", "metadata",
+    "organization_id", "folder_id",
+]
+
+# Page-scoped chunk IDs written by the chunking task ({document_id}_chunk_p{page}_{n})
+_PAGE_CHUNK_ID = re.compile(r"_chunk_p(\d+)_\d+$")
+
+
+def _chunk_page(chunk_id: str) -> int | None:
+    match = _PAGE_CHUNK_ID.search(chunk_id)
+    return int(match.group(1)) if match else None
+
+
+def read_parsed_pages(path: str) -> dict[str, set[int]]:
+    """Pages with text in the latest parsed version of each document."""
+    table = pq.read_table(path, columns=["document_id", "parsed_at", "pages_json"])
+    latest: dict[str, tuple[str, str]] = {}
+    for document_id, parsed_at, pages_json in zip(
+        table.column("document_id").to_pylist(),
+        table.column("parsed_at").to_pylist(),
+        table.column("pages_json").to_pylist(),
+    ):
+        if document_id not in latest or (parsed_at or "") >= latest[document_id][0]:
+            latest[document_id] = (parsed_at or "", pages_json)
+    return {
+        document_id: {page["page_number"] for page in orjson.loads(pages_json) if page["content"].strip()}
+        for document_id, (_, pages_json) in latest.items()
+    }
+
+
+def current_rows(
+    ids: list[str],
+    document_ids: list[str],
+    chunked_at: list[str],
+    parsed_pages: dict[str, set[int]] | None,
+) -> list[int]:
+    """Indices of the rows the search index holds after the latest ingestion runs."""
+    # Latest row per chunk id; on equal chunked_at (or none) the later row wins
+    latest: dict[str, int] = {}
+    for i, chunk_id in enumerate(ids):
+        if chunk_id not in latest or chunked_at[i] >= chunked_at[latest[chunk_id]]:
+            latest[chunk_id] = i
+
+    by_document: dict[str, list[int]] = {}
+    for i in latest.values():
+        by_document.setdefault(document_ids[i], []).append(i)
+
+    keep = []
+    for document_id, rows in by_document.items():
+        newest = max(chunked_at[i] for i in rows)
+        if any(_chunk_page(ids[i]) is None for i in rows if chunked_at[i] == newest):
+            # Document-wide IDs come from a full re-chunk, which replaced everything before it
+            keep.extend(i for i in rows if chunked_at[i] == newest)
+            continue
+
+        page_rows: dict[int, list[int]] = {}
+        for i in rows:
+            page = _chunk_page(ids[i])
+            if page is not None:
+                page_rows.setdefault(page, []).append(i)
+        pages = parsed_pages.get(document_id) if parsed_pages is not None else None
+        for page, page_indices in page_rows.items():
+            if pages is not None and page not in pages:
+                continue
+            page_newest = max(chunked_at[i] for i in page_indices)
+            keep.extend(i for i in page_indices if chunked_at[i] == page_newest)
+
+    return sorted(keep)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build a local search index from chunks_with_embeddings Parquet")
+    parser.add_argument("input", help="Parquet file or directory exported from chunks_with_embeddings")
+    parser.add_argument(
+        "--parsed",
+        help="Parquet export of parsed_documents (document_id, parsed_at, pages_json), to drop removed pages",
+    )
+    parser.add_argument("--output", default=settings.LOCAL_INDEX_PATH, help="Index directory (default: LOCAL_INDEX_PATH)")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    has_chunked_at = "chunked_at" in pq.ParquetDataset(args.input).schema.names
+    table = pq.read_table(args.input, columns=COLUMNS + (["chunked_at"] if has_chunked_at else []))
+    table = table.filter(table.column("content_vector").is_valid())
+    print(f"Read {table.num_rows} rows from {args.input}")
+
+    parsed_pages = read_parsed_pages(args.parsed) if args.parsed else None
+    chunked_at = (
+        [value or "" for value in table.column("chunked_at").to_pylist()]
+        if has_chunked_at
+        else [""] * table.num_rows  # exports from before chunked_at existed: last row wins
+    )
+    keep = current_rows(
+        table.column("id").to_pylist(),
+        table.column("document_id").to_pylist(),
+        chunked_at,
+        parsed_pages,
+    )
+    print(f"Keeping {len(keep)} current chunks")
+    table = table.take(keep)
+    if has_chunked_at:
+        table = table.drop_columns(["chunked_at"])
+
+    vectors_column = table.column("content_vector").combine_chunks()
+    flat = vectors_column.flatten().to_numpy(zero_copy_only=False).astype(np.float32)
+    dims = flat.size // max(table.num_rows, 1)
+    if dims * table.num_rows != flat.size:
+        sys.exit("content_vector rows have different lengths")
+    vectors = flat.reshape(table.num_rows, dims)
+
+    # Stored unit-normalized so search is a single dot product (cosine, like the Azure index)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0, 1, norms)
+
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    np.save(output / "vectors.npy", vectors)
+
+    rows = table.drop_columns(["content_vector"]).to_pylist()
+    with open(output / "chunks.jsonl", "wb") as f:
+        for row in rows:
+            row["page_number"] = row["page_number"] or 0
+            row["metadata"] = row["metadata"] or "{}"
+            row["folder_id"] = row["folder_id"] or ""
+            f.write(orjson.dumps(row) + b"\n")
+
+    print(f"Wrote {len(rows)} chunks ({dims} dims) to {output} in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
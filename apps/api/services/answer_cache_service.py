@@ -0,0 +1,153 @@
+"""Opt-in semantic cache for generated answers.
+
+Answers are cached per retrieval scope (organization + folder/document filters)
+together with the embedding of the standalone query they answered. A later
+request in the same scope reuses the answer when its query embedding is within
+ANSWER_CACHE_SIMILARITY_THRESHOLD (cosine) and retrieval returned exactly the
+same chunk IDs in the same order, so citation numbers still point at the same
+sources. Entries are dropped when the scope's content generation changes.
+"""
+
+import json
+import logging
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from config.settings import settings
+from models.chat_models import Citation, SearchChunk
+from services.search_cache_service import get_scope_generations
+from utils.cache import TTLCache
+from utils.metrics import CACHE_ENTRIES, CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    citations: list[Citation]
+    chunk_ids: list[str]
+    generations: list[int]
+    created_at: float
+
+
+class _ScopeAnswers:
+    """Answers for one retrieval scope, with their unit-normalized query vectors stacked row-wise."""
+
+    def __init__(self) -> None:
+        self.vectors: np.ndarray | None = None
+        self.entries: list[CachedAnswer] = []
+
+    def add(self, vector: np.ndarray, entry: CachedAnswer, max_entries: int) -> None:
+        row = vector[np.newaxis, :]
+        self.vectors = row if self.vectors is None else np.vstack([self.vectors, row])
+        self.entries.append(entry)
+        if len(self.entries) > max_entries:
+            # Oldest first
+            self.vectors = self.vectors[-max_entries:]
+            self.entries = self.entries[-max_entries:]
+
+    def remove(self, keep: list[bool]) -> None:
+        if self.vectors is None:
+            return
+        self.vectors = self.vectors[np.asarray(keep, dtype=bool)]
+        self.entries = [e for e, k in zip(self.entries, keep) if k]
+        if not self.entries:
+            self.vectors = None
+
+
+_answer_cache: TTLCache[_ScopeAnswers] = TTLCache(
+    max_entries=settings.ANSWER_CACHE_MAX_SCOPES,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+)
+CACHE_ENTRIES.labels("answer").set_function(lambda: len(_answer_cache))
+
+
+def _scope_key(
+    organization_id: str,
+    folder_ids: list[str] | None,
+    document_names: list[str] | None,
+) -> str:
+    return json.dumps([
+        organization_id,
+        sorted(set(folder_ids or [])),
+        sorted(set(document_names or [])),
+    ])
+
+
+def _unit(vector: list[float]) -> np.ndarray:
+    arr = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(arr))
+    return arr / norm if norm else arr
+
+
+async def lookup_answer(
+    query_vector: list[float],
+    chunks: list[SearchChunk],
+    organization_id: str,
+    folder_ids: list[str] | None,
+    document_names: list[str] | None,
+) -> CachedAnswer | None:
+    """Find a cached answer for a semantically equivalent query in the same scope."""
+    scope = _answer_cache.get(_scope_key(organization_id, folder_ids, document_names))
+    if scope is None or scope.vectors is None:
+        CACHE_LOOKUPS.labels("answer", "miss").inc()
+        return None
+
+    # Drop answers from older content generations or past their TTL
+    generations = await get_scope_generations(organization_id, folder_ids)
+    now = time.time()
+    keep = [
+        e.generations == generations and now - e.created_at < settings.ANSWER_CACHE_TTL_SECONDS
+        for e in scope.entries
+    ]
+    if not all(keep):
+        scope.remove(keep)
+        if scope.vectors is None:
+            CACHE_LOOKUPS.labels("answer", "miss").inc()
+            return None
+
+    similarities = scope.vectors @ _unit(query_vector)
+    chunk_ids = [c.id for c in chunks]
+    for idx in np.argsort(similarities)[::-1]:
+        if similarities[idx] < settings.ANSWER_CACHE_SIMILARITY_THRESHOLD:
+            break
+        entry = scope.entries[idx]
+        if entry.chunk_ids == chunk_ids:
+            CACHE_LOOKUPS.labels("answer", "hit_local").inc()
+            logger.info("[ANSWER CACHE] hit (similarity=%.3f)", similarities[idx])
+            return entry
+
+    CACHE_LOOKUPS.labels("answer", "miss").inc()
+    return None
+
+
+async def store_answer(
+    query_vector: list[float],
+    chunks: list[SearchChunk],
+    organization_id: str,
+    folder_ids: list[str] | None,
+    document_names: list[str] | None,
+    answer: str,
+    citations: list[Citation],
+) -> None:
+    """Cache a generated answer for its retrieval scope."""
+    if not chunks or not answer:
+        return
+
+    key = _scope_key(organization_id, folder_ids, document_names)
+    scope = _answer_cache.get(key) or _ScopeAnswers()
+    # Re-set on every add so the scope outlives its newest answer; answers expire
+    # one by one through their created_at (checked in lookup_answer)
+    _answer_cache.set(key, scope)
+
+    entry = CachedAnswer(
+        answer=answer,
+        citations=citations,
+        chunk_ids=[c.id for c in chunks],
+        generations=await get_scope_generations(organization_id, folder_ids),
+        created_at=time.time(),
+    )
+    scope.add(_unit(query_vector), entry, settings.ANSWER_CACHE_MAX_ENTRIES_PER_SCOPE)
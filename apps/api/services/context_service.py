@@ -0,0 +1,209 @@
+"""Token-budgeted packing of retrieved chunks and conversation history.
+
+Chunks are packed in ranking order into CONTEXT_TOKEN_BUDGET. Adjacent chunks
+of the same document (consecutive chunk_index) are merged first, the chunk
+that straddles the budget is truncated, and the lowest-ranked remainder is
+dropped. History keeps the newest messages verbatim, trims older messages to
+HISTORY_OLD_MESSAGE_MAX_TOKENS and drops whatever does not fit in
+HISTORY_TOKEN_BUDGET.
+
+Token counts use the cl100k_base tokenizer, the same one the ingestion
+pipeline chunks with.
+"""
+
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+
+import tiktoken
+
+from config.settings import settings
+from models.chat_models import ConversationMessage, SearchChunk
+
+logger = logging.getLogger(__name__)
+
+# Chunks that would be cut below this size are dropped instead of truncated
+MIN_TRUNCATED_CHUNK_TOKENS = 64
+# Messages from the most recent turns are never trimmed
+RECENT_MESSAGES_VERBATIM = 2
+# Per-message framing overhead of the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+# Appended where a chunk or message was cut
+TRUNCATION_MARKER = " …"
+
+
+@dataclass
+class PackedContext:
+    chunks: list[SearchChunk]
+    history: list[ConversationMessage]
+    context_tokens: int = 0
+    history_tokens: int = 0
+    chunks_merged: int = 0
+    chunks_truncated: int = 0
+    chunks_dropped: int = 0
+    history_dropped: int = 0
+
+
+@lru_cache
+def get_tokenizer() -> tiktoken.Encoding:
+    return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """Count tokens with the shared tokenizer (memoized, chunks recur across requests)."""
+    return len(get_tokenizer().encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens, ellipsis included."""
+    tokens = get_tokenizer().encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    keep = max_tokens - count_tokens(TRUNCATION_MARKER)
+    if keep <= 0:
+        return get_tokenizer().decode(tokens[:max(0, max_tokens)]).rstrip()
+    while True:
+        truncated = get_tokenizer().decode(tokens[:keep]).rstrip() + TRUNCATION_MARKER
+        # Re-encoding at the cut can merge differently, so check the joined text
+        if keep == 1 or count_tokens(truncated) <= max_tokens:
+            return truncated
+        keep -= 1
+
+
+def _join_overlapping(first: str, second: str) -> str:
+    """Concatenate two consecutive chunks, dropping the overlap the chunker repeated."""
+    probe = second[:40]
+    if probe:
+        start = first.find(probe, max(0, len(first) - len(second) - len(probe)))
+        while start != -1:
+            tail = first[start:]
+            if second.startswith(tail):
+                return first + second[len(tail):]
+            start = first.find(probe, start + 1)
+    return f"{first}\n{second}"
+
+
+def merge_adjacent_chunks(chunks: list[SearchChunk]) -> tuple[list[SearchChunk], int]:
+    """Merge chunks of the same document with consecutive chunk_index.
+
+    The merged chunk takes the position of its best-ranked member and the
+    best score of the group. Returns (merged chunks in rank order, merges done).
+    """
+    rank = {id(c): i for i, c in enumerate(chunks)}
+    by_doc = sorted(chunks, key=lambda c: (c.document_id, c.chunk_index))
+
+    groups: list[list[SearchChunk]] = []
+    for chunk in by_doc:
+        prev = groups[-1][-1] if groups else None
+        if (
+            prev is not None
+            and prev.document_id == chunk.document_id
+            and chunk.chunk_index == prev.chunk_index + 1
+        ):
+            groups[-1].append(chunk)
+        else:
+            groups.append([chunk])
+
+    merged: list[tuple[int, SearchChunk]] = []
+    for group in groups:
+        best_rank = min(rank[id(c)] for c in group)
+        if len(group) == 1:
+            merged.append((best_rank, group[0]))
+            continue
+        content = group[0].content
+        for chunk in group[1:]:
+            content = _join_overlapping(content, chunk.content)
+        merged.append((best_rank, group[0].model_copy(update={
+            "content": content,
+            "search_score": max(c.search_score for c in group),
+            "reranker_score": max(c.reranker_score for c in group),
+        })))
+
+    merged.sort(key=lambda item: item[0])
+    return [c for _, c in merged], len(chunks) - len(merged)
+
+
+def _chunk_header_tokens(index: int, chunk: SearchChunk) -> int:
+    # Mirrors generation_service.format_context: header line plus separator
+    return count_tokens(f"[{index}] Source: {chunk.document_name} (Page {chunk.page_number})\n\n---\n\n")
+
+
+def pack_chunks(chunks: list[SearchChunk], budget: int, packed: PackedContext) -> list[SearchChunk]:
+    """Fit chunks (already in ranking order) into a token budget."""
+    ordered, packed.chunks_merged = merge_adjacent_chunks(chunks)
+
+    result: list[SearchChunk] = []
+    used = 0
+    for chunk in ordered:
+        header = _chunk_header_tokens(len(result) + 1, chunk)
+        body = count_tokens(chunk.content)
+        remaining = budget - used - header
+        if body <= remaining:
+            result.append(chunk)
+            used += header + body
+        elif remaining >= MIN_TRUNCATED_CHUNK_TOKENS:
+            content = truncate_to_tokens(chunk.content, remaining)
+            result.append(chunk.model_copy(update={"content": content}))
+            used += header + count_tokens(content)
+            packed.chunks_truncated += 1
+        else:
+            packed.chunks_dropped += 1
+
+    packed.context_tokens = used
+    return result
+
+
+def pack_history(
+    history: list[ConversationMessage],
+    budget: int,
+    packed: PackedContext,
+) -> list[ConversationMessage]:
+    """Keep the newest messages that fit in a token budget, trimming older ones."""
+    kept: list[ConversationMessage] = []
+    used = 0
+    for age, msg in enumerate(reversed(history)):
+        content = msg.content
+        if age >= RECENT_MESSAGES_VERBATIM:
+            content = truncate_to_tokens(content, settings.HISTORY_OLD_MESSAGE_MAX_TOKENS)
+        tokens = count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        if used + tokens > budget:
+            packed.history_dropped = len(history) - age
+            break
+        kept.append(msg if content is msg.content else msg.model_copy(update={"content": content}))
+        used += tokens
+
+    packed.history_tokens = used
+    kept.reverse()
+    return kept
+
+
+def pack_context(
+    chunks: list[SearchChunk],
+    conversation_history: list[ConversationMessage],
+    context_budget: int | None = None,
+    history_budget: int | None = None,
+) -> PackedContext:
+    """Fit retrieved chunks and conversation history into their token budgets."""
+    if context_budget is None:
+        context_budget = settings.CONTEXT_TOKEN_BUDGET
+    if history_budget is None:
+        history_budget = settings.HISTORY_TOKEN_BUDGET
+
+    packed = PackedContext(chunks=[], history=[])
+    packed.chunks = pack_chunks(chunks, context_budget, packed)
+    packed.history = pack_history(conversation_history, history_budget, packed)
+
+    logger.info(
+        "[TIMING] context packing: %d chunks -> %d (%d merged, %d truncated, %d dropped), "
+        "%d context tokens, %d history tokens (%d messages dropped)",
+        len(chunks),
+        len(packed.chunks),
+        packed.chunks_merged,
+        packed.chunks_truncated,
+        packed.chunks_dropped,
+        packed.context_tokens,
+        packed.history_tokens,
+        packed.history_dropped,
+    )
+    return packed
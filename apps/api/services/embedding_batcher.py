@@ -0,0 +1,99 @@
+"""Micro-batching for query embeddings.
+
+Concurrent chat requests each need one or a few query embeddings. Instead of
+one embeddings call per request, texts are collected for up to
+EMBEDDING_BATCH_WINDOW_MS (or until EMBEDDING_BATCH_MAX_SIZE texts are
+pending) and sent in a single call; each caller gets back its own vectors.
+Fewer round trips under load also means fewer 429s from the deployment.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+
+from config.settings import settings
+from utils.azure_clients import get_async_embeddings_client
+from utils.metrics import EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingText:
+    text: str
+    future: asyncio.Future
+    enqueued_at: float
+
+
+class EmbeddingBatcher:
+    def __init__(self, window_ms: float, max_batch_size: int) -> None:
+        self.window_s = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending: list[_PendingText] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        # Keep references so in-flight batches are not garbage collected
+        self._in_flight: set[asyncio.Task] = set()
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """Embed texts as part of the next batch."""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._pending.append(_PendingText(text, future, loop.time()))
+            futures.append(future)
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+
+        if self._pending and self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_s, self._flush)
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch = [p for p in self._pending[: self.max_batch_size] if not p.future.done()]
+        self._pending = self._pending[self.max_batch_size :]
+        if self._pending:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window_s, self._flush)
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._send(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: list[_PendingText]) -> None:
+        now = asyncio.get_running_loop().time()
+        for pending in batch:
+            EMBEDDING_BATCH_WAIT_SECONDS.observe(now - pending.enqueued_at)
+
+        # The same query from concurrent requests is embedded once
+        unique_texts = list(dict.fromkeys(p.text for p in batch))
+        EMBEDDING_BATCH_SIZE.observe(len(unique_texts))
+
+        error: Exception | None = None
+        try:
+            client = get_async_embeddings_client()
+            response = await client.embed(input=unique_texts)
+            vectors = {text: item.embedding for text, item in zip(unique_texts, response.data)}
+            for pending in batch:
+                # Callers that went away (e.g. discarded speculative retrieval) are skipped
+                if not pending.future.done():
+                    pending.future.set_result(vectors[pending.text])
+        except Exception as e:
+            logger.warning("Embedding batch of %d texts failed: %s", len(unique_texts), e)
+            error = e
+        finally:
+            # Also reached on cancellation, so no caller is left waiting on its future
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(error or RuntimeError("Embedding batch was cancelled"))
+
+
+@lru_cache
+def get_embedding_batcher() -> EmbeddingBatcher:
+    return EmbeddingBatcher(settings.EMBEDDING_BATCH_WINDOW_MS, settings.EMBEDDING_BATCH_MAX_SIZE)
@@ -1,16 +1,18 @@
-import json
 import logging
 import re
 import time
-from typing import Generator
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable
 
 logger = logging.getLogger(__name__)
 
 from azure.ai.inference.models import AssistantMessage, SystemMessage, UserMessage
 
 from config.settings import settings
-from models.chat_models import Citation, ConversationMessage, SearchChunk
-from utils.azure_clients import get_chat_client
+from models.chat_models import Citation, ConversationMessage, SearchChunk, TimingBreakdown
+from services.context_service import MESSAGE_OVERHEAD_TOKENS, PackedContext, count_tokens
+from utils.azure_clients import get_async_chat_client
+from utils.request_context import get_trace_id
+from utils.sse import coalesce_deltas, encode_chunk, encode_citation, encode_done
 
 SYSTEM_PROMPT = """You are a helpful assistant that answers questions based ONLY on the provided context.
 
@@ -25,6 +27,10 @@ CRITICAL RULES:
 4. If the context is empty but the user asked a real question, let the user know you couldn't find relevant documents. Suggest they upload documents through the Files page in the sidebar and try again. Do not include any citation references in this case.
 5. Never speculate or use external knowledge"""
 
+_CITATION_PATTERN = re.compile(r"\[(\d+)\]")
+# An unfinished marker at the end of a delta, e.g. "[" or "[12"
+_PARTIAL_CITATION_PATTERN = re.compile(r"\[\d{0,4}")
+
 
 def format_context(chunks: list[SearchChunk]) -> str:
     """Format retrieved chunks into a numbered context string for the LLM."""
@@ -35,6 +41,17 @@ def format_context(chunks: list[SearchChunk]) -> str:
     return "\n\n---\n\n".join(parts)
 
 
+def count_prompt_tokens(query: str, packed: PackedContext) -> int:
+    """Total prompt tokens for a packed context: system prompt, history and the context + question message."""
+    final_message_tokens = count_tokens(f"Context:\n\nQuestion: {query}") + packed.context_tokens
+    return (
+        count_tokens(SYSTEM_PROMPT)
+        + packed.history_tokens
+        + final_message_tokens
+        + 2 * MESSAGE_OVERHEAD_TOKENS
+    )
+
+
 def build_messages(
     query: str,
     chunks: list[SearchChunk],
@@ -44,6 +61,8 @@ def build_messages(
     """Build the message list for the chat completion request.
 
     Order: system prompt -> conversation history (capped) -> context + query.
+    Chunks and history are expected to be packed to their token budgets
+    already (see context_service.pack_context); the turn cap is a backstop.
     """
     if max_history_turns is None:
         max_history_turns = settings.MAX_HISTORY_TURNS
@@ -66,94 +85,188 @@ def build_messages(
     return messages
 
 
-def generate_answer_streaming(
+def _record_generation(
+    timing: TimingBreakdown | None,
+    answer: str,
+    elapsed_s: float,
+    decode_s: float,
+    completion_tokens: int | None = None,
+) -> None:
+    """Fill in generation time, completion tokens and decode throughput."""
+    if timing is None:
+        return
+    timing.generation_ms = round(elapsed_s * 1000, 1)
+    timing.completion_tokens = completion_tokens if completion_tokens is not None else count_tokens(answer)
+    if decode_s > 0:
+        timing.tokens_per_second = round(timing.completion_tokens / decode_s, 1)
+
+
+async def _stream_deltas(
+    response, t_request: float, timing: TimingBreakdown | None = None
+) -> AsyncIterator[str]:
+    """Yield the text deltas of a streaming completion, recording time to first token."""
+    first_token = True
+    async for update in response:
+        if update.choices and update.choices[0].delta and update.choices[0].delta.content:
+            if first_token:
+                ttft = time.perf_counter() - t_request
+                logger.info("[TIMING] time to first token: %.2fs", ttft)
+                if timing is not None:
+                    timing.ttft_ms = round(ttft * 1000, 1)
+                first_token = False
+            yield update.choices[0].delta.content
+
+
+async def generate_answer_streaming(
     query: str,
     chunks: list[SearchChunk],
     conversation_history: list[ConversationMessage],
-) -> Generator[str, None, None]:
-    """Generate an answer with streaming, yielding SSE-formatted events."""
+    on_complete: Callable[[str, list[Citation]], Awaitable[None]] | None = None,
+    timing: TimingBreakdown | None = None,
+) -> AsyncGenerator[bytes, None]:
+    """Generate an answer with streaming, yielding encoded SSE frames.
+
+    Deltas arriving within SSE_COALESCE_MS of each other are sent as one
+    chunk event. on_complete is awaited with the full answer and its
+    citations once the stream has finished (not when the client disconnects
+    early). timing, if given, gets TTFT, generation time and throughput.
+    """
     t0 = time.perf_counter()
-    client = get_chat_client()
+    client = get_async_chat_client()
     messages = build_messages(query, chunks, conversation_history)
     t1 = time.perf_counter()
     logger.info("[TIMING] build messages: %.2fs", t1 - t0)
 
-    response = client.complete(messages=messages, stream=True)
+    response = await client.complete(messages=messages, stream=True)
     t2 = time.perf_counter()
     logger.info("[TIMING] client.complete() call: %.2fs", t2 - t1)
 
-    full_text = ""
-    first_token = True
-    for update in response:
-        if update.choices and update.choices[0].delta and update.choices[0].delta.content:
-            if first_token:
-                logger.info("[TIMING] time to first token: %.2fs", time.perf_counter() - t2)
-                first_token = False
-            content = update.choices[0].delta.content
-            full_text += content
-            event = json.dumps({"type": "chunk", "content": content})
-            yield f"data: {event}\n\n"
+    parser = StreamingCitationParser()
+    citations: list[Citation] = []
+    # Release the upstream HTTP stream even if the client disconnects mid-answer
+    async with response:
+        deltas = coalesce_deltas(
+            _stream_deltas(response, t2, timing), settings.SSE_COALESCE_MS / 1000
+        )
+        async for content in deltas:
+            yield encode_chunk(content)
+
+            # Send each source the first time it is cited so the UI can render it immediately
+            for num in parser.feed(content):
+                citation = _citation_for(num, chunks)
+                if citation is not None:
+                    citations.append(citation)
+                    yield encode_citation(citation)
 
-    # Extract citations after streaming completes
-    citations = extract_citations(full_text, chunks)
+    yield encode_done(trace_id=get_trace_id())
+
+    t3 = time.perf_counter()
+    ttft_s = timing.ttft_ms / 1000 if timing is not None else 0
+    _record_generation(timing, parser.text, t3 - t1, t3 - t2 - ttft_s)
+
+    if on_complete is not None:
+        citations.sort(key=lambda c: c.number)
+        await on_complete(parser.text, citations)
+
+
+async def replay_answer_streaming(
+    answer: str,
+    citations: list[Citation],
+) -> AsyncGenerator[bytes, None]:
+    """Replay a cached answer as the same SSE events a live generation produces."""
+    yield encode_chunk(answer)
     for citation in citations:
-        event = json.dumps({
-            "type": "citation",
-            "number": citation.number,
-            "source": {
-                "document_id": citation.document_id,
-                "document_name": citation.document_name,
-                "document_url": citation.document_url,
-                "page_number": citation.page_number,
-                "chunk_text": citation.chunk_text,
-                "relevance_score": citation.relevance_score,
-                "folder_id": citation.folder_id,
-            },
-        })
-        yield f"data: {event}\n\n"
-
-    yield f"data: {json.dumps({'type': 'done'})}\n\n"
-
-
-def generate_answer(
+        yield encode_citation(citation)
+    yield encode_done(trace_id=get_trace_id())
+
+
+async def generate_answer(
     query: str,
     chunks: list[SearchChunk],
     conversation_history: list[ConversationMessage],
+    timing: TimingBreakdown | None = None,
 ) -> tuple[str, list[Citation]]:
     """Generate an answer without streaming (for evaluation)."""
-    client = get_chat_client()
+    t0 = time.perf_counter()
+    client = get_async_chat_client()
     messages = build_messages(query, chunks, conversation_history)
 
-    response = client.complete(messages=messages)
+    response = await client.complete(messages=messages)
     answer = response.choices[0].message.content
+    elapsed = time.perf_counter() - t0
+    usage = getattr(response, "usage", None)
+    # Without streaming there is no first token to split on, so throughput spans the whole call
+    _record_generation(timing, answer, elapsed, elapsed, usage.completion_tokens if usage else None)
 
     citations = extract_citations(answer, chunks)
     return answer, citations
 
 
+class StreamingCitationParser:
+    """Track [n] citation markers in a streamed answer, including markers split across deltas.
+
+    Text is buffered in a list and only joined once, so long answers do not
+    pay for repeated string concatenation.
+    """
+
+    def __init__(self) -> None:
+        self._parts: list[str] = []
+        self._pending = ""
+        self._seen: set[int] = set()
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, delta: str) -> list[int]:
+        """Add a delta and return citation numbers seen for the first time."""
+        self._parts.append(delta)
+        # Only an unfinished marker ("[", "[1") is carried over, so no marker is counted twice
+        window = self._pending + delta
+
+        new_numbers = []
+        for match in _CITATION_PATTERN.finditer(window):
+            num = int(match.group(1))
+            if num not in self._seen:
+                self._seen.add(num)
+                new_numbers.append(num)
+
+        tail_start = window.rfind("[")
+        tail = window[tail_start:] if tail_start != -1 else ""
+        self._pending = tail if _PARTIAL_CITATION_PATTERN.fullmatch(tail) else ""
+        return new_numbers
+
+
+def _citation_for(num: int, chunks: list[SearchChunk]) -> Citation | None:
+    """Map a 1-indexed citation number to its source chunk."""
+    idx = num - 1
+    if not 0 <= idx < len(chunks):
+        return None
+    chunk = chunks[idx]
+    return Citation(
+        number=num,
+        document_id=chunk.document_id,
+        document_name=chunk.document_name,
+        document_url=chunk.document_url,
+        page_number=chunk.page_number,
+        chunk_text=chunk.content,
+        relevance_score=chunk.reranker_score or chunk.search_score,
+        folder_id=chunk.folder_id,
+    )
+
+
 def extract_citations(
     text: str,
     chunks: list[SearchChunk],
 ) -> list[Citation]:
     """Extract citation references [1], [2], etc. from text and map to source chunks."""
-    pattern = r"\[(\d+)\]"
-    matches = re.findall(pattern, text)
+    matches = _CITATION_PATTERN.findall(text)
     cited_numbers = sorted(set(int(m) for m in matches))
 
     citations = []
     for num in cited_numbers:
-        idx = num - 1  # 1-indexed to 0-indexed
-        if 0 <= idx < len(chunks):
-            chunk = chunks[idx]
-            citations.append(Citation(
-                number=num,
-                document_id=chunk.document_id,
-                document_name=chunk.document_name,
-                document_url=chunk.document_url,
-                page_number=chunk.page_number,
-                chunk_text=chunk.content,
-                relevance_score=chunk.reranker_score or chunk.search_score,
-                folder_id=chunk.folder_id,
-            ))
+        citation = _citation_for(num, chunks)
+        if citation is not None:
+            citations.append(citation)
 
     return citations
@@ -0,0 +1,202 @@
+"""In-process hybrid search over a local copy of the index (RETRIEVAL_BACKEND=local).
+
+The index directory (LOCAL_INDEX_PATH) is written by scripts/build_local_index.py
+from the chunks_with_embeddings output of the ingestion pipeline:
+  vectors.npy   unit-normalized float32 content vectors, memory-mapped on load
+  chunks.jsonl  one chunk per line, row-aligned with vectors.npy
+
+Vector search is an exact (brute-force) cosine top-k over the rows that pass
+the filters, keyword search is BM25 over content, and the two rankings are
+fused with RRF like an Azure AI Search hybrid query. There is no semantic
+ranker, so reranker_score is always 0 and use_semantic is ignored.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import orjson
+
+from models.chat_models import SearchChunk, TimingBreakdown
+from services.ranking import reciprocal_rank_fusion, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Azure AI Search returns up to 50 keyword matches into hybrid fusion
+KEYWORD_CANDIDATES = 50
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < scores.size:
+        candidates = np.argpartition(scores, -k)[-k:]
+    else:
+        candidates = np.arange(scores.size)
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+
+class BM25Index:
+    """Inverted index over chunk content with BM25 weights precomputed per posting.
+
+    Uses the same k1/b defaults as Azure AI Search. Terms are lowercased
+    word tokens without stemming or stop-word removal.
+    """
+
+    def __init__(self, documents: list[str], k1: float = 1.2, b: float = 0.75) -> None:
+        self.size = len(documents)
+        term_rows: dict[str, list[int]] = {}
+        term_freqs: dict[str, list[int]] = {}
+        lengths = np.zeros(self.size, dtype=np.float32)
+
+        for row, text in enumerate(documents):
+            counts = Counter(tokenize(text))
+            lengths[row] = sum(counts.values())
+            for term, tf in counts.items():
+                term_rows.setdefault(term, []).append(row)
+                term_freqs.setdefault(term, []).append(tf)
+
+        avg_length = float(lengths.mean()) if self.size else 1.0
+        self._postings: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for term, rows in term_rows.items():
+            row_arr = np.asarray(rows, dtype=np.int32)
+            tf = np.asarray(term_freqs[term], dtype=np.float32)
+            idf = math.log(1 + (self.size - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = k1 * (1 - b + b * lengths[row_arr] / (avg_length or 1.0))
+            self._postings[term] = (row_arr, (idf * tf * (k1 + 1) / (tf + norm)).astype(np.float32))
+
+    def scores(self, query: str) -> np.ndarray:
+        """Dense BM25 scores for every row (0 where no query term matches)."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                rows, weights = posting
+                scores[rows] += weights
+        return scores
+
+
+class LocalIndex:
+    def __init__(self, path: Path) -> None:
+        self.vectors: np.ndarray = np.load(path / "vectors.npy", mmap_mode="r")
+        with open(path / "chunks.jsonl", "rb") as f:
+            self.chunks: list[dict] = [orjson.loads(line) for line in f]
+        if len(self.chunks) != self.vectors.shape[0]:
+            raise ValueError(
+                f"Local index at {path} is inconsistent: "
+                f"{len(self.chunks)} chunks but {self.vectors.shape[0]} vectors"
+            )
+
+        self._folder_ids = np.array([c["folder_id"] for c in self.chunks])
+        self._document_names = np.array([c["document_name"] for c in self.chunks])
+        rows_by_org: dict[str, list[int]] = {}
+        for row, chunk in enumerate(self.chunks):
+            rows_by_org.setdefault(chunk["organization_id"], []).append(row)
+        self._rows_by_org = {org: np.asarray(rows, dtype=np.intp) for org, rows in rows_by_org.items()}
+
+        self.bm25 = BM25Index([c["content"] for c in self.chunks])
+
+    def _filter_rows(
+        self,
+        organization_id: str,
+        folder_ids: list[str] | None,
+        document_names: list[str] | None,
+    ) -> np.ndarray:
+        rows = self._rows_by_org.get(organization_id)
+        if rows is None:
+            return np.empty(0, dtype=np.intp)
+        if folder_ids:
+            rows = rows[np.isin(self._folder_ids[rows], folder_ids)]
+        if document_names:
+            rows = rows[np.isin(self._document_names[rows], document_names)]
+        return rows
+
+    def search(
+        self,
+        query: str,
+        query_vector: list[float],
+        organization_id: str,
+        top_k: int,
+        folder_ids: list[str] | None,
+        document_names: list[str] | None,
+    ) -> list[SearchChunk]:
+        rows = self._filter_rows(organization_id, folder_ids, document_names)
+        if rows.size == 0:
+            return []
+
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        if norm:
+            q = q / norm
+        # Avoid copying the whole matrix out of the memory map when nothing is filtered out
+        candidates = self.vectors if rows.size == self.vectors.shape[0] else self.vectors[rows]
+        similarities = candidates @ q
+        vector_ranking = rows[top_k_indices(similarities, top_k)]
+
+        keyword_scores = self.bm25.scores(query)[rows]
+        keyword_top = top_k_indices(keyword_scores, KEYWORD_CANDIDATES)
+        keyword_ranking = rows[keyword_top[keyword_scores[keyword_top] > 0]]
+
+        fused = reciprocal_rank_fusion([vector_ranking.tolist(), keyword_ranking.tolist()])
+        return [self._to_chunk(row, score) for row, score in fused[:top_k]]
+
+    def _to_chunk(self, row: int, score: float) -> SearchChunk:
+        chunk = self.chunks[row]
+        return SearchChunk(
+            id=chunk["id"],
+            content=chunk["content"],
+            document_id=chunk.get("document_id", ""),
+            document_name=chunk.get("document_name", ""),
+            document_url=chunk.get("document_url", ""),
+            page_number=chunk.get("page_number") or 0,
+            chunk_index=chunk.get("chunk_index", 0),
+            organization_id=chunk.get("organization_id", ""),
+            folder_id=chunk.get("folder_id", ""),
+            metadata=chunk.get("metadata", ""),
+            search_score=score,
+        )
+
+
+@lru_cache
+def load_local_index(path: str) -> LocalIndex:
+    t0 = time.perf_counter()
+    index = LocalIndex(Path(path))
+    logger.info(
+        "[TIMING] local index loaded: %d chunks, %d dims in %.2fs",
+        len(index.chunks),
+        index.vectors.shape[1] if index.vectors.ndim == 2 else 0,
+        time.perf_counter() - t0,
+    )
+    return index
+
+
+class LocalSearchBackend:
+    """Hybrid search against a local index; scoring runs in a worker thread to keep the event loop free."""
+
+    def __init__(self, index_path: str) -> None:
+        self.index_path = index_path
+
+    async def hybrid_search(
+        self,
+        query: str,
+        query_vector: list[float],
+        organization_id: str,
+        top_k: int,
+        folder_ids: list[str] | None,
+        document_names: list[str] | None,
+        use_semantic: bool,
+        timing: TimingBreakdown | None = None,
+    ) -> list[SearchChunk]:
+        return await asyncio.to_thread(
+            self._search, query, query_vector, organization_id, top_k, folder_ids, document_names
+        )
+
+    def _search(self, *args) -> list[SearchChunk]:
+        # The first search loads the index (memory-mapped, BM25 built in memory)
+        return load_local_index(self.index_path).search(*args)
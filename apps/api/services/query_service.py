@@ -1,10 +1,15 @@
 import logging
+import re
+import time
+from difflib import SequenceMatcher
+from typing import Literal
 
 from azure.ai.inference.models import SystemMessage, UserMessage
 
 from config.settings import settings
 from models.chat_models import ConversationMessage
-from utils.azure_clients import get_rewrite_client
+from utils.azure_clients import get_async_rewrite_client
+from utils.metrics import REWRITE_DECISIONS
 
 logger = logging.getLogger(__name__)
 
@@ -20,8 +25,155 @@ Output ONLY "NONE" or the search query, nothing else."""
 
 CONVERSATIONAL_MARKER = "NONE"
 
+EXPANSION_SYSTEM_PROMPT = """Classify the user's latest message and, if needed, turn it into search queries.
 
-def rewrite_query(
+Rules:
+1. If the message is conversational (greetings, thanks, acknowledgements, small talk, follow-up questions that don't need documents) — return exactly: NONE
+2. Otherwise, on the first line write the message as a concise standalone search query, using conversation history to resolve references (pronouns, "that", "it", etc.)
+3. {expansion_rule}
+
+Output ONLY "NONE" or the lines described above, one per line, without numbering."""
+
+_EXPANSION_RULES = {
+    "sub_queries": (
+        "Then write {n} alternative search queries, one per line, that cover different aspects, "
+        "phrasings or sub-questions of the request"
+    ),
+    "hyde": (
+        "Then write {n} short hypothetical passage(s), 2-3 sentences each and one per line, "
+        "written as if quoted from a document that answers the request"
+    ),
+}
+
+ExpansionMode = Literal["sub_queries", "hyde"]
+
+_LIST_MARKER = re.compile(r"^(?:[-*\u2022]|\d+[.)])\s*")
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def _query_terms(query: str) -> list[str]:
+    return _WORD_PATTERN.findall(query.casefold())
+
+
+def is_equivalent_query(original: str, rewritten: str, threshold: float) -> bool:
+    """Check whether a rewrite is close enough to the original to share its retrieval.
+
+    Compares the word sequences of both queries (case and punctuation
+    insensitive) and returns True when their similarity ratio is at least
+    threshold.
+    """
+    original_terms = _query_terms(original)
+    rewritten_terms = _query_terms(rewritten)
+    if original_terms == rewritten_terms:
+        return True
+    return SequenceMatcher(None, original_terms, rewritten_terms).ratio() >= threshold
+
+
+QueryKind = Literal["conversational", "standalone", "needs_rewrite"]
+
+# Whole-message acknowledgements, greetings and thanks. "yes", "no" and "sure" are left out:
+# they usually answer a clarifying question and must be rewritten against the history
+_CONVERSATIONAL_PATTERN = re.compile(
+    r"^(?:(?:hi|hello|hey|yo|thanks|thank you|thank u|thx|ty|cheers|ok|okay|k|cool|great|perfect|"
+    r"awesome|nice|got it|understood|makes sense|sounds good|good|bye|goodbye|see you|"
+    r"good (?:morning|afternoon|evening)|no worries|all good)"
+    r"(?: (?:so much|a lot|very much|again|you|all|there|that helps|thats helpful))*"
+    r"[\s!.,:)(]*)+$"
+)
+
+# Words that refer back to earlier turns and need history to resolve
+_ANAPHORA = {
+    "it", "its", "it's", "itself", "that", "this", "these", "those", "they", "them", "their",
+    "theirs", "he", "she", "him", "her", "his", "hers", "there", "same", "above", "previous",
+    "former", "latter", "earlier", "aforementioned", "else", "more", "another", "other",
+}
+_FOLLOW_UP_PREFIXES = ("and ", "also ", "what about", "how about", "why", "but ", "so ", "then ")
+_QUESTION_WORDS = {
+    "what", "which", "who", "whom", "whose", "when", "where", "why", "how", "is", "are", "was",
+    "were", "do", "does", "did", "can", "could", "should", "list", "summarize", "describe",
+    "explain", "compare", "show", "give", "find",
+}
+# Capitalised words that do not name anything: the pronoun "I" and common function words
+_NOT_ENTITIES = {
+    "i", "i'm", "i've", "i'd", "i'll", "a", "an", "the", "and", "or", "of", "in", "on", "at",
+    "to", "for", "from", "by", "with", "about", "my", "me", "we", "our", "us", "you", "your",
+    "please", "also", "not", "all", "any", "some",
+} | _QUESTION_WORDS | _ANAPHORA
+
+# Process-wide fast path statistics for the [TIMING] log line
+_fast_path_stats = {"total": 0, "skipped": 0, "llm_seconds": 0.0, "llm_calls": 0}
+
+
+def classify_query(query: str) -> tuple[QueryKind, float]:
+    """Classify a follow-up message locally with lexical rules.
+
+    Returns (kind, confidence). Only "conversational" and "standalone" results
+    with high confidence let rewrite_query skip the LLM; everything else is
+    sent to GPT-5 Nano.
+    """
+    text = query.strip().casefold()
+    terms = _WORD_PATTERN.findall(text)
+
+    if not terms:
+        return "conversational", 0.9
+    if "?" not in text and _CONVERSATIONAL_PATTERN.match(text.replace("'", "")):
+        return "conversational", 0.95
+
+    if any(t in _ANAPHORA for t in terms) or text.startswith(_FOLLOW_UP_PREFIXES):
+        return "needs_rewrite", 0.9
+    if len(terms) < 4:
+        # Short fragments ("revenue?", "and Tesla") are usually elliptical follow-ups
+        return "needs_rewrite", 0.6
+
+    # Only a named entity makes a question self-contained: "What was the revenue in 2023?"
+    # still needs the company from earlier turns, so without one the score stays below
+    # the default REWRITE_FAST_PATH_MIN_CONFIDENCE
+    confidence = 0.6
+    if terms[0] in _QUESTION_WORDS or text.endswith("?"):
+        confidence += 0.1
+    if _has_named_entity(query):
+        confidence += 0.2
+    if any(ch.isdigit() for ch in text):
+        confidence += 0.05
+    if len(terms) >= 6:
+        confidence += 0.05
+    return "standalone", round(min(confidence, 0.99), 2)
+
+
+def _has_named_entity(query: str) -> bool:
+    """Whether a word after the first is capitalised and not a pronoun, function word or period label (Q3, FY2023)."""
+    for word in query.split()[1:]:
+        word = word.strip(".,;:!?()\"'")
+        if (
+            word[:1].isupper()
+            and word.casefold() not in _NOT_ENTITIES
+            and not any(ch.isdigit() for ch in word)
+        ):
+            return True
+    return False
+
+
+def _log_fast_path(kind: QueryKind, confidence: float, skipped: bool) -> None:
+    stats = _fast_path_stats
+    stats["total"] += 1
+    stats["skipped"] += int(skipped)
+    REWRITE_DECISIONS.labels("fast_path" if skipped else "llm").inc()
+    if not skipped:
+        return
+    avg_llm = stats["llm_seconds"] / stats["llm_calls"] if stats["llm_calls"] else 0.0
+    logger.info(
+        "[TIMING] rewrite fast path: %s (confidence=%.2f), skipped %d/%d rewrites (%.0f%%), ~%.2fs saved",
+        kind,
+        confidence,
+        stats["skipped"],
+        stats["total"],
+        100 * stats["skipped"] / stats["total"],
+        avg_llm,
+    )
+
+
+async def rewrite_query(
     query: str,
     conversation_history: list[ConversationMessage],
 ) -> tuple[str, bool]:
@@ -33,7 +185,33 @@ def rewrite_query(
     if not conversation_history:
         return query, False
 
-    client = get_rewrite_client()
+    if settings.REWRITE_FAST_PATH:
+        kind, confidence = classify_query(query)
+        skip = kind != "needs_rewrite" and confidence >= settings.REWRITE_FAST_PATH_MIN_CONFIDENCE
+        _log_fast_path(kind, confidence, skip)
+        if skip:
+            return query, kind == "conversational"
+
+    content = await _complete_rewrite(REWRITE_SYSTEM_PROMPT, query, conversation_history, 128)
+    rewritten = content.strip().strip('"') if content else ""
+    logger.info("[REWRITE] input=%r, output=%r", query, rewritten)
+
+    if not rewritten:
+        return query, False
+
+    if rewritten.upper() == CONVERSATIONAL_MARKER:
+        return query, True
+
+    return rewritten, False
+
+
+async def _complete_rewrite(
+    system_prompt: str,
+    query: str,
+    conversation_history: list[ConversationMessage],
+    max_completion_tokens: int,
+) -> str:
+    client = get_async_rewrite_client()
 
     recent = conversation_history[-settings.MAX_HISTORY_TURNS:]
     history_text = "\n".join(
@@ -41,24 +219,66 @@ def rewrite_query(
     )
 
     messages = [
-        SystemMessage(content=REWRITE_SYSTEM_PROMPT),
+        SystemMessage(content=system_prompt),
         UserMessage(
             content=f"History:\n{history_text}\n\nLatest message: {query}"
         ),
     ]
 
-    response = client.complete(
+    t0 = time.perf_counter()
+    response = await client.complete(
         messages=messages,
-        model_extras={"max_completion_tokens": 128, "reasoning_effort": "low"},
+        model_extras={"max_completion_tokens": max_completion_tokens, "reasoning_effort": "low"},
     )
-    content = response.choices[0].message.content
-    rewritten = content.strip().strip('"') if content else ""
-    logger.info("[REWRITE] input=%r, output=%r", query, rewritten)
+    _fast_path_stats["llm_seconds"] += time.perf_counter() - t0
+    _fast_path_stats["llm_calls"] += 1
+    return response.choices[0].message.content or ""
 
-    if not rewritten:
-        return query, False
 
-    if rewritten.upper() == CONVERSATIONAL_MARKER:
-        return query, True
+async def rewrite_and_expand_query(
+    query: str,
+    conversation_history: list[ConversationMessage],
+    expansion: int,
+    mode: ExpansionMode = "sub_queries",
+) -> tuple[str, bool, list[str]]:
+    """Rewrite a query and expand it for retrieval in a single GPT-5 Nano call.
 
-    return rewritten, False
+    mode "sub_queries" asks for `expansion` alternative search queries, "hyde"
+    for `expansion` hypothetical answer passages. Unlike rewrite_query this
+    also calls the LLM without history, since expansions are needed either way;
+    the fast path only short-circuits conversational messages.
+
+    Returns (rewritten_query, is_conversational, expansions).
+    """
+    if settings.REWRITE_FAST_PATH and conversation_history:
+        kind, confidence = classify_query(query)
+        skip = kind == "conversational" and confidence >= settings.REWRITE_FAST_PATH_MIN_CONFIDENCE
+        _log_fast_path(kind, confidence, skip)
+        if skip:
+            return query, True, []
+
+    system_prompt = EXPANSION_SYSTEM_PROMPT.format(
+        expansion_rule=_EXPANSION_RULES[mode].format(n=expansion)
+    )
+    per_expansion_tokens = 160 if mode == "hyde" else 48
+    content = await _complete_rewrite(
+        system_prompt, query, conversation_history, 128 + per_expansion_tokens * expansion
+    )
+
+    lines = [_LIST_MARKER.sub("", line.strip()).strip('"') for line in content.splitlines()]
+    lines = [line for line in lines if line]
+    logger.info("[REWRITE] input=%r, output=%r", query, lines)
+
+    if not lines:
+        return query, False, []
+    if lines[0].upper() == CONVERSATIONAL_MARKER:
+        return query, True, []
+
+    rewritten = lines[0]
+    expansions: list[str] = []
+    seen = {rewritten.casefold()}
+    for line in lines[1:]:
+        if line.casefold() not in seen and len(expansions) < expansion:
+            seen.add(line.casefold())
+            expansions.append(line)
+    return rewritten, False, expansions
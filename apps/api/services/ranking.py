@@ -0,0 +1,77 @@
+"""Rank fusion and lightweight local reranking shared by the retrieval backends."""
+
+import math
+import re
+from collections.abc import Hashable, Sequence
+from typing import TypeVar
+
+from models.chat_models import SearchChunk
+
+K = TypeVar("K", bound=Hashable)
+
+# Smoothing constant Azure AI Search uses for hybrid RRF
+RRF_K = 60
+
+# Weights of the local reranker signals (they sum to 1, so scores are in [0, 1])
+RERANK_FUSED_WEIGHT = 0.6
+RERANK_COVERAGE_WEIGHT = 0.3
+RERANK_PROXIMITY_WEIGHT = 0.1
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(text.casefold())
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[K]],
+    k: int = RRF_K,
+    weights: Sequence[float] | None = None,
+) -> list[tuple[K, float]]:
+    """Fuse best-first rankings: score = sum of weight / (k + rank). Returns (key, score) best first."""
+    if weights is None:
+        weights = [1.0] * len(rankings)
+    scores: dict[K, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def rerank_chunks(query: str, chunks: list[SearchChunk]) -> list[SearchChunk]:
+    """Rerank a fused candidate pool on CPU, setting reranker_score.
+
+    Combines the fused score (normalized to the best in the pool), the
+    IDF-weighted share of query terms a chunk contains, and the share of
+    query bigrams it contains verbatim. IDF is computed over the pool itself.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not chunks or not terms:
+        return chunks
+
+    chunk_tokens = [tokenize(c.content) for c in chunks]
+    chunk_terms = [set(tokens) for tokens in chunk_tokens]
+    idf = {
+        term: math.log(1 + len(chunks) / (1 + sum(term in t for t in chunk_terms)))
+        for term in terms
+    }
+    total_idf = sum(idf.values()) or 1.0
+    query_bigrams = set(zip(terms, terms[1:]))
+    best_fused = max(c.search_score for c in chunks) or 1.0
+
+    reranked = []
+    for chunk, tokens, present in zip(chunks, chunk_tokens, chunk_terms):
+        coverage = sum(idf[t] for t in terms if t in present) / total_idf
+        proximity = 0.0
+        if query_bigrams:
+            proximity = len(query_bigrams & set(zip(tokens, tokens[1:]))) / len(query_bigrams)
+        score = (
+            RERANK_FUSED_WEIGHT * chunk.search_score / best_fused
+            + RERANK_COVERAGE_WEIGHT * coverage
+            + RERANK_PROXIMITY_WEIGHT * proximity
+        )
+        reranked.append(chunk.model_copy(update={"reranker_score": round(score, 6)}))
+
+    reranked.sort(key=lambda c: (c.reranker_score, c.search_score), reverse=True)
+    return reranked
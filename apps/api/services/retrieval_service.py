@@ -1,21 +1,101 @@
-from azure.search.documents.models import VectorizedQuery, QueryType
+import hashlib
+
+import numpy as np
 
 from config.settings import settings
-from models.chat_models import SearchChunk
-from utils.azure_clients import get_embeddings_client, get_search_client
+from models.chat_models import SearchChunk, TimingBreakdown
+from services.embedding_batcher import get_embedding_batcher
+from services.search_backend import get_search_backend
+from utils.azure_clients import get_async_embeddings_client
+from utils.cache import TTLCache, shared_get, shared_set
+from utils.metrics import CACHE_ENTRIES, CACHE_LOOKUPS
+
+# Query embeddings are held as float32 arrays (12 KB per 3072-dim vector)
+_embedding_cache: TTLCache[np.ndarray] = TTLCache(
+    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS,
+)
+CACHE_ENTRIES.labels("embedding").set_function(lambda: len(_embedding_cache))
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for cache keys: case-folded with collapsed whitespace."""
+    return " ".join(query.casefold().split())
+
+
+def _embedding_cache_key(query: str) -> str:
+    deployment = settings.AZURE_AI_EMBEDDING_DEPLOYMENT
+    digest = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+    return f"rag:emb:{deployment}:{digest}"
+
 
+async def _get_cached_embedding(key: str) -> list[float] | None:
+    cached = _embedding_cache.get(key)
+    if cached is not None:
+        CACHE_LOOKUPS.labels("embedding", "hit_local").inc()
+        return cached.tolist()
 
-def embed_query(query: str) -> list[float]:
-    """Generate embedding vector for a query string."""
-    client = get_embeddings_client()
-    response = client.embed(input=[query])
-    embedding = response.data[0].embedding
-    if isinstance(embedding, str):
-        raise TypeError("Expected embedding vector, got string")
-    return embedding
+    raw = await shared_get(key)
+    if raw is not None:
+        vector = np.frombuffer(raw, dtype=np.float32)
+        _embedding_cache.set(key, vector)
+        CACHE_LOOKUPS.labels("embedding", "hit_shared").inc()
+        return vector.tolist()
 
+    CACHE_LOOKUPS.labels("embedding", "miss").inc()
+    return None
 
-def hybrid_search(
+
+async def embed_queries(queries: list[str]) -> list[list[float]]:
+    """Generate embedding vectors for several query strings.
+
+    Vectors are cached by normalized query and embedding deployment, in process
+    and (when CACHE_REDIS_URL is set) in the cache shared by all API workers.
+    Cache misses are embedded together in one call, batched with other
+    requests' misses when EMBEDDING_BATCH_WINDOW_MS is set.
+    """
+    cache_enabled = settings.EMBEDDING_CACHE_ENABLED
+    keys = [_embedding_cache_key(q) for q in queries]
+    vectors: dict[str, list[float]] = {}
+
+    # Queries that normalize to the same key are looked up and embedded once
+    misses: dict[str, str] = {}
+    for key, query in zip(keys, queries):
+        if key in vectors or key in misses:
+            continue
+        cached = await _get_cached_embedding(key) if cache_enabled else None
+        if cached is not None:
+            vectors[key] = cached
+        else:
+            misses[key] = query
+
+    if misses:
+        if settings.EMBEDDING_BATCH_WINDOW_MS > 0:
+            embeddings = await get_embedding_batcher().embed(list(misses.values()))
+        else:
+            client = get_async_embeddings_client()
+            response = await client.embed(input=list(misses.values()))
+            embeddings = [item.embedding for item in response.data]
+
+        for key, embedding in zip(misses, embeddings):
+            if isinstance(embedding, str):
+                raise TypeError("Expected embedding vector, got string")
+            vectors[key] = embedding
+
+            if cache_enabled:
+                vector = np.asarray(embedding, dtype=np.float32)
+                _embedding_cache.set(key, vector)
+                await shared_set(key, vector.tobytes(), settings.EMBEDDING_CACHE_TTL_SECONDS)
+
+    return [vectors[key] for key in keys]
+
+
+async def embed_query(query: str) -> list[float]:
+    """Generate embedding vector for a query string (cached, see embed_queries)."""
+    return (await embed_queries([query]))[0]
+
+
+async def hybrid_search(
     query: str,
     query_vector: list[float],
     organization_id: str,
@@ -23,74 +103,17 @@ def hybrid_search(
     folder_ids: list[str] | None = None,
     document_names: list[str] | None = None,
     use_semantic: bool = True,
+    timing: TimingBreakdown | None = None,
 ) -> list[SearchChunk]:
-    """Execute hybrid search (vector + keyword + semantic) against Azure AI Search.
+    """Execute hybrid search (vector + keyword, plus semantic ranking where supported).
 
-    Always filters by organization_id. Optionally filters by folder_ids and document_names.
+    Runs against the configured RETRIEVAL_BACKEND. Always filters by
+    organization_id. Optionally filters by folder_ids and document_names.
+    Backends that run in stages record them on timing.
     """
     if top_k is None:
         top_k = settings.CONTEXT_TOP_K
 
-    client = get_search_client()
-
-    vector_query = VectorizedQuery(
-        vector=query_vector,
-        k_nearest_neighbors=top_k,
-        fields="content_vector",
+    return await get_search_backend().hybrid_search(
+        query, query_vector, organization_id, top_k, folder_ids, document_names, use_semantic, timing
     )
-
-    # Build OData filter -- organization_id is always required
-    filters = [f"organization_id eq '{organization_id}'"]
-
-    if folder_ids:
-        folder_conditions = [f"folder_id eq '{fid}'" for fid in folder_ids]
-        filters.append(f"({' or '.join(folder_conditions)})")
-
-    if document_names:
-        name_conditions = [f"document_name eq '{name}'" for name in document_names]
-        filters.append(f"({' or '.join(name_conditions)})")
-
-    filter_expression = " and ".join(filters)
-
-    search_kwargs: dict = {
-        "search_text": query,
-        "vector_queries": [vector_query],
-        "top": top_k,
-        "filter": filter_expression,
-        "select": [
-            "id", "content", "document_id", "document_name",
-            "document_url", "page_number", "chunk_index", "metadata",
-            "organization_id", "folder_id",
-        ],
-    }
-
-    if use_semantic:
-        search_kwargs["query_type"] = QueryType.SEMANTIC
-        search_kwargs["semantic_configuration_name"] = "semantic-config"
-
-    results = client.search(**search_kwargs)
-
-    chunks = []
-    for result in results:
-        chunks.append(SearchChunk(
-            id=result["id"],
-            content=result["content"],
-            document_id=result.get("document_id", ""),
-            document_name=result.get("document_name", ""),
-            document_url=result.get("document_url", ""),
-            page_number=result.get("page_number", 0),
-            chunk_index=result.get("chunk_index", 0),
-            organization_id=result.get("organization_id", ""),
-            folder_id=result.get("folder_id", ""),
-            metadata=result.get("metadata", ""),
-            search_score=result.get("@search.score", 0.0),
-            reranker_score=result.get("@search.reranker_score") or 0.0,
-        ))
-
-    # Sort by semantic reranker score, fall back to search score
-    chunks.sort(
-        key=lambda c: (c.reranker_score, c.search_score),
-        reverse=True,
-    )
-
-    return chunks
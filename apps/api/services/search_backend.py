@@ -0,0 +1,238 @@
+"""Retrieval backends behind retrieval_service.hybrid_search.
+
+RETRIEVAL_BACKEND selects Azure AI Search ("azure", the default) or an
+in-process index built from the ingestion output ("local", see
+services/local_search_service.py). Both apply the same organization, folder
+and document filters and return chunks ranked best first.
+"""
+
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Protocol
+
+from azure.search.documents.models import QueryType, VectorizedQuery
+
+from config.settings import settings
+from models.chat_models import SearchChunk, TimingBreakdown
+from services.ranking import reciprocal_rank_fusion, rerank_chunks
+from utils.azure_clients import get_async_search_client
+
+logger = logging.getLogger(__name__)
+
+SELECT_FIELDS = [
+    "id", "content", "document_id", "document_name",
+    "document_url", "page_number", "chunk_index", "metadata",
+    "organization_id", "folder_id",
+]
+
+
+class SearchBackend(Protocol):
+    async def hybrid_search(
+        self,
+        query: str,
+        query_vector: list[float],
+        organization_id: str,
+        top_k: int,
+        folder_ids: list[str] | None,
+        document_names: list[str] | None,
+        use_semantic: bool,
+        timing: TimingBreakdown | None = None,
+    ) -> list[SearchChunk]: ...
+
+
+def build_filter(
+    organization_id: str,
+    folder_ids: list[str] | None,
+    document_names: list[str] | None,
+) -> str:
+    """Build the OData filter for a retrieval scope -- organization_id is always required."""
+    filters = [f"organization_id eq '{organization_id}'"]
+
+    if folder_ids:
+        folder_conditions = [f"folder_id eq '{fid}'" for fid in folder_ids]
+        filters.append(f"({' or '.join(folder_conditions)})")
+
+    if document_names:
+        name_conditions = [f"document_name eq '{name}'" for name in document_names]
+        filters.append(f"({' or '.join(name_conditions)})")
+
+    return " and ".join(filters)
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+
+def _to_chunk(result: dict) -> SearchChunk:
+    return SearchChunk(
+        id=result["id"],
+        content=result["content"],
+        document_id=result.get("document_id", ""),
+        document_name=result.get("document_name", ""),
+        document_url=result.get("document_url", ""),
+        page_number=result.get("page_number", 0),
+        chunk_index=result.get("chunk_index", 0),
+        organization_id=result.get("organization_id", ""),
+        folder_id=result.get("folder_id", ""),
+        metadata=result.get("metadata", ""),
+        search_score=result.get("@search.score", 0.0),
+        reranker_score=result.get("@search.reranker_score") or 0.0,
+    )
+
+
+class AzureSearchBackend:
+    """Hybrid search (vector + keyword + semantic) against Azure AI Search.
+
+    With SEARCH_FUSION_MODE=service a single hybrid query is sent and Azure
+    fuses (and optionally semantic-reranks) the results. With "client" the
+    vector and keyword queries are sent as two concurrent requests, each with
+    its own over-fetch depth, fused locally with weighted RRF and, for
+    semantic requests with SEARCH_LOCAL_RERANKER on, reranked on CPU instead
+    of by the semantic ranker.
+    """
+
+    async def hybrid_search(
+        self,
+        query: str,
+        query_vector: list[float],
+        organization_id: str,
+        top_k: int,
+        folder_ids: list[str] | None,
+        document_names: list[str] | None,
+        use_semantic: bool,
+        timing: TimingBreakdown | None = None,
+    ) -> list[SearchChunk]:
+        filter_expression = build_filter(organization_id, folder_ids, document_names)
+        if settings.SEARCH_FUSION_MODE == "client":
+            return await self._client_fused_search(
+                query, query_vector, filter_expression, top_k, use_semantic, timing
+            )
+
+        client = get_async_search_client()
+
+        vector_query = VectorizedQuery(
+            vector=query_vector,
+            k_nearest_neighbors=top_k,
+            fields="content_vector",
+        )
+
+        search_kwargs: dict = {
+            "search_text": query,
+            "vector_queries": [vector_query],
+            "top": top_k,
+            "filter": filter_expression,
+            "select": SELECT_FIELDS,
+        }
+
+        if use_semantic:
+            search_kwargs["query_type"] = QueryType.SEMANTIC
+            search_kwargs["semantic_configuration_name"] = "semantic-config"
+
+        results = await client.search(**search_kwargs)
+        chunks = [_to_chunk(result) async for result in results]
+
+        # Sort by semantic reranker score, fall back to search score
+        chunks.sort(
+            key=lambda c: (c.reranker_score, c.search_score),
+            reverse=True,
+        )
+
+        return chunks
+
+    async def _timed_search(self, **search_kwargs) -> tuple[list[SearchChunk], float]:
+        t0 = time.perf_counter()
+        results = await get_async_search_client().search(**search_kwargs)
+        chunks = [_to_chunk(result) async for result in results]
+        return chunks, time.perf_counter() - t0
+
+    async def _client_fused_search(
+        self,
+        query: str,
+        query_vector: list[float],
+        filter_expression: str,
+        top_k: int,
+        use_semantic: bool,
+        timing: TimingBreakdown | None,
+    ) -> list[SearchChunk]:
+        vector_depth = max(top_k, settings.SEARCH_VECTOR_CANDIDATES)
+        keyword_depth = max(top_k, settings.SEARCH_KEYWORD_CANDIDATES)
+
+        # Without the local reranker, semantic requests keep the semantic ranker on the
+        # keyword leg, so its candidates enter the fusion in reranked order
+        keyword_kwargs: dict = {}
+        service_rerank = use_semantic and not settings.SEARCH_LOCAL_RERANKER
+        if service_rerank:
+            keyword_kwargs["query_type"] = QueryType.SEMANTIC
+            keyword_kwargs["semantic_configuration_name"] = "semantic-config"
+
+        (vector_chunks, vector_s), (keyword_chunks, keyword_s) = await asyncio.gather(
+            self._timed_search(
+                search_text=None,
+                vector_queries=[VectorizedQuery(
+                    vector=query_vector,
+                    k_nearest_neighbors=vector_depth,
+                    fields="content_vector",
+                )],
+                top=vector_depth,
+                filter=filter_expression,
+                select=SELECT_FIELDS,
+            ),
+            self._timed_search(
+                search_text=query,
+                top=keyword_depth,
+                filter=filter_expression,
+                select=SELECT_FIELDS,
+                **keyword_kwargs,
+            ),
+        )
+        if service_rerank:
+            keyword_chunks.sort(key=lambda c: (c.reranker_score, c.search_score), reverse=True)
+
+        t_fuse = time.perf_counter()
+        by_id = {c.id: c for c in keyword_chunks}
+        by_id.update({c.id: c for c in vector_chunks})
+        reranker_scores = {c.id: c.reranker_score for c in keyword_chunks}
+        fused = reciprocal_rank_fusion(
+            [[c.id for c in vector_chunks], [c.id for c in keyword_chunks]],
+            k=settings.SEARCH_RRF_K,
+            weights=[settings.SEARCH_RRF_VECTOR_WEIGHT, settings.SEARCH_RRF_KEYWORD_WEIGHT],
+        )
+        pool = [
+            by_id[chunk_id].model_copy(
+                update={"search_score": score, "reranker_score": reranker_scores.get(chunk_id, 0.0)}
+            )
+            for chunk_id, score in fused
+        ]
+        t_rerank = time.perf_counter()
+
+        if use_semantic and settings.SEARCH_LOCAL_RERANKER:
+            pool = rerank_chunks(query, pool)
+        t_end = time.perf_counter()
+
+        logger.info(
+            "[TIMING] client fusion: vector %.2fs (%d), keyword %.2fs (%d), fusion %.1fms, rerank %.1fms",
+            vector_s,
+            len(vector_chunks),
+            keyword_s,
+            len(keyword_chunks),
+            (t_rerank - t_fuse) * 1000,
+            (t_end - t_rerank) * 1000,
+        )
+        if timing is not None:
+            timing.vector_search_ms = _ms(vector_s)
+            timing.keyword_search_ms = _ms(keyword_s)
+            timing.fusion_ms = _ms(t_rerank - t_fuse)
+            timing.rerank_ms = _ms(t_end - t_rerank)
+
+        return pool[:top_k]
+
+
+@lru_cache
+def get_search_backend() -> SearchBackend:
+    if settings.RETRIEVAL_BACKEND == "local":
+        from services.local_search_service import LocalSearchBackend
+
+        return LocalSearchBackend(settings.LOCAL_INDEX_PATH)
+    return AzureSearchBackend()
@@ -0,0 +1,158 @@
+"""Tenant-scoped cache for hybrid search results.
+
+Cache keys include a per-tenant generation number. Anything that changes a
+tenant's indexed content (upload, delete, an ingestion run finishing) bumps the
+generation, so stale entries are never read again and age out of the LRU.
+
+Generations are tracked at two levels:
+  - folder: bumped when a document in that folder changes
+  - organization: "all" is bumped on every change in the organization, "wide"
+    only for changes that are not attributed to a single folder
+
+Queries scoped to folders depend on the folder generations plus the org-wide
+one. Unscoped queries depend on the organization's "all" generation.
+
+Without CACHE_REDIS_URL the generations live in each worker process, so a
+bump only reaches the worker that handled the change; the other workers keep
+serving their cached results until the cache TTL runs out.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+from config.settings import settings
+from models.chat_models import SearchChunk
+from utils.cache import TTLCache, get_shared_cache
+from utils.metrics import CACHE_ENTRIES, CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+_search_cache: TTLCache[list[SearchChunk]] = TTLCache(
+    max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SEARCH_CACHE_TTL_SECONDS,
+)
+CACHE_ENTRIES.labels("search").set_function(lambda: len(_search_cache))
+
+# In-process generations, used when no shared cache is configured
+_local_generations: dict[str, int] = {}
+
+
+def _org_all_key(organization_id: str) -> str:
+    return f"rag:gen:{organization_id}:all"
+
+
+def _org_wide_key(organization_id: str) -> str:
+    return f"rag:gen:{organization_id}:wide"
+
+
+def _folder_key(organization_id: str, folder_id: str) -> str:
+    return f"rag:gen:{organization_id}:folder:{folder_id}"
+
+
+def warn_if_generations_unshared() -> None:
+    """Log a warning when several workers (WEB_CONCURRENCY) cache without CACHE_REDIS_URL."""
+    try:
+        workers = int(os.environ.get("WEB_CONCURRENCY") or 1)
+    except ValueError:
+        return
+    ttls = [
+        ttl
+        for enabled, ttl in (
+            (settings.SEARCH_CACHE_ENABLED, settings.SEARCH_CACHE_TTL_SECONDS),
+            (settings.ANSWER_CACHE_ENABLED, settings.ANSWER_CACHE_TTL_SECONDS),
+        )
+        if enabled
+    ]
+    if workers > 1 and ttls and not settings.CACHE_REDIS_URL:
+        logger.warning(
+            "%d workers without CACHE_REDIS_URL: cache invalidation only reaches the worker that "
+            "handled the change, others may serve stale results for up to %ds",
+            workers,
+            max(ttls),
+        )
+
+
+async def _read_generations(keys: list[str]) -> list[int]:
+    shared = get_shared_cache()
+    if shared is not None:
+        try:
+            values = await shared.mget(keys)
+            return [int(v) if v is not None else 0 for v in values]
+        except Exception:
+            logger.warning("Shared cache read failed for generations", exc_info=True)
+    return [_local_generations.get(k, 0) for k in keys]
+
+
+async def bump_generation(organization_id: str, folder_id: str | None = None) -> None:
+    """Invalidate cached search results for an organization, or one of its folders."""
+    keys = [_org_all_key(organization_id)]
+    keys.append(_folder_key(organization_id, folder_id) if folder_id else _org_wide_key(organization_id))
+
+    for key in keys:
+        _local_generations[key] = _local_generations.get(key, 0) + 1
+
+    shared = get_shared_cache()
+    if shared is not None:
+        try:
+            for key in keys:
+                await shared.incr(key)
+        except Exception:
+            logger.warning("Shared cache write failed for generations", exc_info=True)
+
+    logger.info("Invalidated search cache for org=%s folder=%s", organization_id, folder_id or "*")
+
+
+async def get_scope_generations(organization_id: str, folder_ids: list[str] | None) -> list[int]:
+    """Return the generation numbers that content in this retrieval scope depends on."""
+    folders = sorted(set(folder_ids or []))
+    if folders:
+        generation_keys = [_org_wide_key(organization_id)]
+        generation_keys += [_folder_key(organization_id, f) for f in folders]
+    else:
+        generation_keys = [_org_all_key(organization_id)]
+    return await _read_generations(generation_keys)
+
+
+async def _cache_key(
+    query: str,
+    organization_id: str,
+    top_k: int,
+    folder_ids: list[str] | None,
+    document_names: list[str] | None,
+    use_semantic: bool,
+) -> str:
+    folders = sorted(set(folder_ids or []))
+    generations = await get_scope_generations(organization_id, folders)
+
+    payload = json.dumps([
+        " ".join(query.casefold().split()),
+        organization_id,
+        folders,
+        sorted(set(document_names or [])),
+        top_k,
+        use_semantic,
+        generations,
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def get_cached_search(
+    query: str,
+    organization_id: str,
+    top_k: int,
+    folder_ids: list[str] | None,
+    document_names: list[str] | None,
+    use_semantic: bool,
+) -> tuple[str, list[SearchChunk] | None]:
+    """Look up cached search results. Returns (cache_key, chunks or None)."""
+    key = await _cache_key(query, organization_id, top_k, folder_ids, document_names, use_semantic)
+    chunks = _search_cache.get(key)
+    CACHE_LOOKUPS.labels("search", "hit_local" if chunks is not None else "miss").inc()
+    return key, list(chunks) if chunks is not None else None
+
+
+def set_cached_search(key: str, chunks: list[SearchChunk]) -> None:
+    """Store search results under a key returned by get_cached_search."""
+    _search_cache.set(key, list(chunks))
@@ -0,0 +1,121 @@
+"""Startup warm-up and readiness.
+
+The lifespan handler starts warm_up() in the background so the process can
+answer liveness checks right away. Warm-up builds every client, fetches AAD
+tokens, loads the tokenizer, opens pooled connections and runs a tiny
+embedding + search probe, so the first user request after a deploy or
+scale-out does not pay for any of it. GET /health/ready returns 503 until
+warm-up has finished.
+
+A failing step is logged and reported in the readiness payload but does not
+block readiness: the same failure would surface on the first request anyway.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Literal
+
+from config.settings import settings
+from services.context_service import count_tokens
+from services.search_backend import get_search_backend
+from utils.azure_clients import (
+    connection_warm_up_urls,
+    get_async_chat_client,
+    get_async_embeddings_client,
+    get_async_rewrite_client,
+    get_async_search_client,
+    get_blob_service_client,
+    get_search_client,
+    get_token_cache,
+    models_configured,
+    token_scopes,
+)
+from utils.http_transport import warm_up_connections
+
+logger = logging.getLogger(__name__)
+
+CheckStatus = Literal["ok", "failed", "skipped"]
+
+# Matches nothing in the index; the search probe only exercises the connection and auth
+_PROBE_ORGANIZATION_ID = "__warmup__"
+
+_state: dict = {"ready": False, "started_at": None, "finished_at": None, "checks": {}}
+
+
+def get_readiness() -> dict:
+    return _state
+
+
+async def _run_check(name: str, check: Callable[[], Awaitable[None]], enabled: bool = True) -> None:
+    if not enabled:
+        _state["checks"][name] = {"status": "skipped"}
+        return
+
+    t0 = time.perf_counter()
+    try:
+        await check()
+        status: CheckStatus = "ok"
+        error = None
+    except Exception as e:
+        status = "failed"
+        error = str(e)[:200]
+        logger.warning("Warm-up step %s failed: %s", name, e)
+    elapsed_ms = round((time.perf_counter() - t0) * 1000, 1)
+    _state["checks"][name] = {"status": status, "ms": elapsed_ms, **({"error": error} if error else {})}
+    logger.info("[TIMING] warm-up %s: %s in %.0fms", name, status, elapsed_ms)
+
+
+async def _build_clients() -> None:
+    get_async_chat_client()
+    get_async_rewrite_client()
+    get_async_embeddings_client()
+    get_async_search_client()
+    get_search_client()
+    get_blob_service_client()
+
+
+async def _fetch_tokens() -> None:
+    await get_token_cache().refresh_all()
+
+
+async def _load_tokenizer() -> None:
+    await asyncio.to_thread(count_tokens, "warm-up")
+
+
+async def _open_connections() -> None:
+    await warm_up_connections(connection_warm_up_urls())
+
+
+async def _probe() -> None:
+    response = await get_async_embeddings_client().embed(input=["warm-up"])
+    vector = response.data[0].embedding
+    await get_search_backend().hybrid_search(
+        "warm-up", vector, _PROBE_ORGANIZATION_ID, 1, None, None, False
+    )
+
+
+async def warm_up() -> None:
+    """Run every warm-up step, then mark the process ready."""
+    _state["started_at"] = time.time()
+    t0 = time.perf_counter()
+    uses_tokens = bool(settings.AZURE_AI_RESOURCE_NAME and token_scopes())
+
+    await _run_check("clients", _build_clients)
+    # Tokens, tokenizer and connections are independent of each other
+    await asyncio.gather(
+        _run_check("tokens", _fetch_tokens, uses_tokens),
+        _run_check("tokenizer", _load_tokenizer),
+        _run_check("connections", _open_connections, settings.HTTP_POOL_WARM_CONNECTIONS > 0),
+    )
+    await _run_check("probe", _probe, models_configured() and settings.WARMUP_PROBE)
+
+    _state["ready"] = True
+    _state["finished_at"] = time.time()
+    logger.info("[TIMING] warm-up finished in %.2fs, ready for traffic", time.perf_counter() - t0)
+
+
+def mark_ready() -> None:
+    """Mark the process ready without warming up (WARMUP_ENABLED=false)."""
+    _state["ready"] = True
+    _state["finished_at"] = time.time()
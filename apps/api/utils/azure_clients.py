@@ -1,26 +1,96 @@
 from functools import lru_cache
 
+from azure.core.credentials import AzureKeyCredential
 from azure.ai.inference import ChatCompletionsClient, EmbeddingsClient
+from azure.ai.inference.aio import (
+    ChatCompletionsClient as AsyncChatCompletionsClient,
+    EmbeddingsClient as AsyncEmbeddingsClient,
+)
 from azure.search.documents import SearchClient
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
 from azure.identity import DefaultAzureCredential
+from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
 from azure.ai.formrecognizer import DocumentAnalysisClient
 from azure.storage.blob import BlobServiceClient
 
 from config.settings import settings
+from utils.http_transport import async_transport, sync_transport
+from utils.request_context import inject_trace_headers
+from utils.token_cache import (
+    COGNITIVE_SERVICES_SCOPE,
+    SEARCH_SCOPE,
+    STORAGE_SCOPE,
+    CachedAsyncCredential,
+    CachedSyncCredential,
+    TokenCache,
+)
 
-_COGNITIVE_SERVICES_SCOPES = ["https://cognitiveservices.azure.com/.default"]
+_COGNITIVE_SERVICES_SCOPES = [COGNITIVE_SERVICES_SCOPE]
+
+
+def _models_endpoint() -> str:
+    if settings.AZURE_AI_MODELS_ENDPOINT:
+        return settings.AZURE_AI_MODELS_ENDPOINT.rstrip("/")
+    return f"https://{settings.AZURE_AI_RESOURCE_NAME}.services.ai.azure.com/models"
+
+
+def models_configured() -> bool:
+    return bool(settings.AZURE_AI_RESOURCE_NAME or settings.AZURE_AI_MODELS_ENDPOINT)
+
+
+def connection_warm_up_urls() -> list[str]:
+    """Hosts the request path talks to (the chat, rewrite and embeddings clients share the first)."""
+    urls = []
+    if models_configured():
+        urls.append(_models_endpoint())
+    if settings.AZURE_SEARCH_ENDPOINT:
+        urls.append(settings.AZURE_SEARCH_ENDPOINT)
+    return urls
+
+
+def token_scopes() -> list[str]:
+    """AAD scopes of the configured clients that use Entra ID rather than a key or connection string."""
+    scopes = []
+    # Document Intelligence always authenticates with Entra ID
+    if (models_configured() and not settings.AZURE_AI_API_KEY) or settings.AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT:
+        scopes.append(COGNITIVE_SERVICES_SCOPE)
+    if settings.AZURE_SEARCH_ENDPOINT and not settings.AZURE_SEARCH_API_KEY:
+        scopes.append(SEARCH_SCOPE)
+    if settings.AZURE_STORAGE_ACCOUNT_NAME and not settings.AZURE_STORAGE_CONNECTION_STRING:
+        scopes.append(STORAGE_SCOPE)
+    return scopes
+
+
+@lru_cache
+def get_token_cache() -> TokenCache:
+    """Token cache shared by every client (refreshed in the background, see utils/token_cache.py)."""
+    return TokenCache(AsyncDefaultAzureCredential(), DefaultAzureCredential(), token_scopes())
 
 
 @lru_cache
-def get_credential() -> DefaultAzureCredential:
-    return DefaultAzureCredential()
+def get_credential() -> CachedSyncCredential:
+    return get_token_cache().sync_credential
+
+
+def _models_credential() -> AzureKeyCredential | CachedSyncCredential:
+    if settings.AZURE_AI_API_KEY:
+        return AzureKeyCredential(settings.AZURE_AI_API_KEY)
+    return get_credential()
+
+
+def _search_credential() -> AzureKeyCredential | CachedSyncCredential:
+    if settings.AZURE_SEARCH_API_KEY:
+        return AzureKeyCredential(settings.AZURE_SEARCH_API_KEY)
+    return get_credential()
 
 
 @lru_cache
 def get_chat_client() -> ChatCompletionsClient:
     return ChatCompletionsClient(
-        endpoint=f"https://{settings.AZURE_AI_RESOURCE_NAME}.services.ai.azure.com/models",
-        credential=get_credential(),
+        endpoint=_models_endpoint(),
+        credential=_models_credential(),
+        transport=sync_transport(),
+        raw_request_hook=inject_trace_headers,
         credential_scopes=_COGNITIVE_SERVICES_SCOPES,
         model=settings.AZURE_AI_CHAT_DEPLOYMENT,
     )
@@ -29,8 +99,10 @@ def get_chat_client() -> ChatCompletionsClient:
 @lru_cache
 def get_rewrite_client() -> ChatCompletionsClient:
     return ChatCompletionsClient(
-        endpoint=f"https://{settings.AZURE_AI_RESOURCE_NAME}.services.ai.azure.com/models",
-        credential=get_credential(),
+        endpoint=_models_endpoint(),
+        credential=_models_credential(),
+        transport=sync_transport(),
+        raw_request_hook=inject_trace_headers,
         credential_scopes=_COGNITIVE_SERVICES_SCOPES,
         model=settings.AZURE_AI_REWRITE_DEPLOYMENT,
     )
@@ -39,8 +111,10 @@ def get_rewrite_client() -> ChatCompletionsClient:
 @lru_cache
 def get_embeddings_client() -> EmbeddingsClient:
     return EmbeddingsClient(
-        endpoint=f"https://{settings.AZURE_AI_RESOURCE_NAME}.services.ai.azure.com/models",
-        credential=get_credential(),
+        endpoint=_models_endpoint(),
+        credential=_models_credential(),
+        transport=sync_transport(),
+        raw_request_hook=inject_trace_headers,
         credential_scopes=_COGNITIVE_SERVICES_SCOPES,
         model=settings.AZURE_AI_EMBEDDING_DEPLOYMENT,
     )
@@ -51,7 +125,9 @@ def get_search_client() -> SearchClient:
     return SearchClient(
         endpoint=settings.AZURE_SEARCH_ENDPOINT,
         index_name=settings.AZURE_SEARCH_INDEX_NAME,
-        credential=get_credential(),
+        credential=_search_credential(),
+        transport=sync_transport(),
+        raw_request_hook=inject_trace_headers,
     )
 
 
@@ -60,12 +136,124 @@ def get_document_analysis_client() -> DocumentAnalysisClient:
     return DocumentAnalysisClient(
         endpoint=settings.AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT,
         credential=get_credential(),
+        transport=sync_transport(),
+        raw_request_hook=inject_trace_headers,
     )
 
 
 @lru_cache
 def get_blob_service_client() -> BlobServiceClient:
+    if settings.AZURE_STORAGE_CONNECTION_STRING:
+        return BlobServiceClient.from_connection_string(
+            settings.AZURE_STORAGE_CONNECTION_STRING,
+            transport=sync_transport(),
+            raw_request_hook=inject_trace_headers,
+        )
     return BlobServiceClient(
         account_url=f"https://{settings.AZURE_STORAGE_ACCOUNT_NAME}.blob.core.windows.net",
         credential=get_credential(),
+        transport=sync_transport(),
+        raw_request_hook=inject_trace_headers,
     )
+
+
+# ---------------------------------------------------------------------------
+# Async clients (request path)
+#
+# The chat pipeline awaits these directly on the event loop instead of pushing
+# the sync clients through asyncio.to_thread(), so a single worker can hold
+# many concurrent streams without exhausting the threadpool. They share one
+# pooled aiohttp session (see utils/http_transport.py).
+# ---------------------------------------------------------------------------
+
+
+@lru_cache
+def get_async_credential() -> CachedAsyncCredential:
+    return get_token_cache().async_credential
+
+
+def _async_models_credential() -> AzureKeyCredential | CachedAsyncCredential:
+    if settings.AZURE_AI_API_KEY:
+        return AzureKeyCredential(settings.AZURE_AI_API_KEY)
+    return get_async_credential()
+
+
+def _async_search_credential() -> AzureKeyCredential | CachedAsyncCredential:
+    if settings.AZURE_SEARCH_API_KEY:
+        return AzureKeyCredential(settings.AZURE_SEARCH_API_KEY)
+    return get_async_credential()
+
+
+@lru_cache
+def get_async_chat_client() -> AsyncChatCompletionsClient:
+    return AsyncChatCompletionsClient(
+        endpoint=_models_endpoint(),
+        credential=_async_models_credential(),
+        transport=async_transport(),
+        raw_request_hook=inject_trace_headers,
+        credential_scopes=_COGNITIVE_SERVICES_SCOPES,
+        model=settings.AZURE_AI_CHAT_DEPLOYMENT,
+    )
+
+
+@lru_cache
+def get_async_rewrite_client() -> AsyncChatCompletionsClient:
+    return AsyncChatCompletionsClient(
+        endpoint=_models_endpoint(),
+        credential=_async_models_credential(),
+        transport=async_transport(),
+        raw_request_hook=inject_trace_headers,
+        credential_scopes=_COGNITIVE_SERVICES_SCOPES,
+        model=settings.AZURE_AI_REWRITE_DEPLOYMENT,
+    )
+
+
+@lru_cache
+def get_async_embeddings_client() -> AsyncEmbeddingsClient:
+    return AsyncEmbeddingsClient(
+        endpoint=_models_endpoint(),
+        credential=_async_models_credential(),
+        transport=async_transport(),
+        raw_request_hook=inject_trace_headers,
+        credential_scopes=_COGNITIVE_SERVICES_SCOPES,
+        model=settings.AZURE_AI_EMBEDDING_DEPLOYMENT,
+    )
+
+
+@lru_cache
+def get_async_search_client() -> AsyncSearchClient:
+    return AsyncSearchClient(
+        endpoint=settings.AZURE_SEARCH_ENDPOINT,
+        index_name=settings.AZURE_SEARCH_INDEX_NAME,
+        credential=_async_search_credential(),
+        transport=async_transport(),
+        raw_request_hook=inject_trace_headers,
+    )
+
+
+async def close_clients() -> None:
+    """Close every client that was built, then the credentials (shutdown)."""
+    for factory in (
+        get_async_chat_client,
+        get_async_rewrite_client,
+        get_async_embeddings_client,
+        get_async_search_client,
+        get_async_credential,
+    ):
+        if factory.cache_info().currsize:
+            await factory().close()
+            factory.cache_clear()
+
+    for factory in (
+        get_chat_client,
+        get_rewrite_client,
+        get_embeddings_client,
+        get_search_client,
+        get_document_analysis_client,
+        get_blob_service_client,
+        get_credential,
+    ):
+        if factory.cache_info().currsize:
+            factory().close()
+            factory.cache_clear()
+    get_token_cache.cache_clear()
@@ -0,0 +1,92 @@
+import logging
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+from config.settings import settings
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """Size-bounded LRU cache whose entries expire after ttl_seconds.
+
+    Not thread-safe — it is only touched from the event loop.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: V) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+@lru_cache
+def get_shared_cache() -> "Redis | None":
+    """Return the Redis client shared across API workers, or None if not configured."""
+    if not settings.CACHE_REDIS_URL:
+        return None
+    try:
+        from redis.asyncio import Redis
+    except ImportError as e:
+        raise RuntimeError(
+            "CACHE_REDIS_URL is set but the 'redis' package is not installed "
+            "(install the api with the 'redis' extra)"
+        ) from e
+    return Redis.from_url(settings.CACHE_REDIS_URL)
+
+
+async def shared_get(key: str) -> bytes | None:
+    """Read a value from the shared cache. Backend errors are logged and treated as a miss."""
+    shared = get_shared_cache()
+    if shared is None:
+        return None
+    try:
+        return await shared.get(key)
+    except Exception:
+        logger.warning("Shared cache read failed for %s", key, exc_info=True)
+        return None
+
+
+async def shared_set(key: str, value: bytes, ttl_seconds: int) -> None:
+    """Write a value to the shared cache. Backend errors are logged and ignored."""
+    shared = get_shared_cache()
+    if shared is None:
+        return
+    try:
+        await shared.set(key, value, ex=ttl_seconds)
+    except Exception:
+        logger.warning("Shared cache write failed for %s", key, exc_info=True)
@@ -0,0 +1,95 @@
+"""Shared, pooled HTTP transports for the Azure SDK clients.
+
+Every async client gets its own AioHttpTransport, but all of them wrap one
+aiohttp session, so the chat, rewrite and embeddings clients (same
+services.ai.azure.com host) and the search client draw from one connection
+pool with explicit limits and keep-alive. The sync clients share one
+requests session the same way. The transports do not own the sessions;
+close_http_sessions() closes them on shutdown.
+
+azure-core's transports speak HTTP/1.1 only, so reuse comes from keep-alive
+connection pooling rather than HTTP/2 multiplexing.
+"""
+
+import asyncio
+import logging
+from functools import lru_cache
+
+import aiohttp
+import requests
+from azure.core.pipeline.transport import AioHttpTransport, RequestsTransport
+from requests.adapters import HTTPAdapter
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache
+def get_aiohttp_session() -> aiohttp.ClientSession:
+    """Shared aiohttp session; must first be called with the event loop running."""
+    connector = aiohttp.TCPConnector(
+        limit=settings.HTTP_POOL_MAX_CONNECTIONS,
+        limit_per_host=settings.HTTP_POOL_MAX_CONNECTIONS_PER_HOST,
+        keepalive_timeout=settings.HTTP_KEEPALIVE_SECONDS,
+        ttl_dns_cache=300,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+@lru_cache
+def get_requests_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=settings.HTTP_POOL_SYNC_HOSTS,
+        pool_maxsize=settings.HTTP_POOL_MAX_CONNECTIONS_PER_HOST,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def async_transport() -> AioHttpTransport:
+    return AioHttpTransport(session=get_aiohttp_session(), session_owner=False)
+
+
+def sync_transport() -> RequestsTransport:
+    return RequestsTransport(session=get_requests_session(), session_owner=False)
+
+
+async def _open_connection(session: aiohttp.ClientSession, url: str) -> None:
+    # Any response will do: the point is the TCP + TLS handshake, the connection then stays in the pool
+    async with session.head(url, allow_redirects=False) as response:
+        await response.read()
+
+
+async def warm_up_connections(urls: list[str]) -> None:
+    """Open HTTP_POOL_WARM_CONNECTIONS pooled connections to each host so early requests skip the handshake."""
+    per_host = settings.HTTP_POOL_WARM_CONNECTIONS
+    urls = [u for u in dict.fromkeys(urls) if u]
+    if not urls or per_host <= 0:
+        return
+
+    session = get_aiohttp_session()
+    results = await asyncio.gather(
+        *(_open_connection(session, url) for url in urls for _ in range(per_host)),
+        return_exceptions=True,
+    )
+    failures = [r for r in results if isinstance(r, Exception)]
+    for error in failures[:3]:
+        logger.warning("Connection warm-up failed: %s", error)
+    logger.info(
+        "Warmed %d/%d pooled connections to %d hosts",
+        len(results) - len(failures),
+        len(results),
+        len(urls),
+    )
+
+
+async def close_http_sessions() -> None:
+    if get_aiohttp_session.cache_info().currsize:
+        await get_aiohttp_session().close()
+        get_aiohttp_session.cache_clear()
+    if get_requests_session.cache_info().currsize:
+        get_requests_session().close()
+        get_requests_session.cache_clear()
@@ -0,0 +1,54 @@
+"""Prometheus metrics for the API, exposed on GET /api/v1/metrics."""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+CACHE_LOOKUPS = Counter(
+    "rag_cache_lookups_total",
+    "Cache lookups by cache name and outcome (hit_local, hit_shared, miss).",
+    ["cache", "outcome"],
+)
+
+CACHE_ENTRIES = Gauge(
+    "rag_cache_entries",
+    "Entries currently held in an in-process cache.",
+    ["cache"],
+)
+
+REWRITE_DECISIONS = Counter(
+    "rag_rewrite_decisions_total",
+    "Follow-up rewrites settled by the local fast path vs sent to the LLM.",
+    ["path"],
+)
+
+EMBEDDING_BATCH_SIZE = Histogram(
+    "rag_embedding_batch_size",
+    "Texts per embeddings call sent by the micro-batching embedder.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+EMBEDDING_BATCH_WAIT_SECONDS = Histogram(
+    "rag_embedding_batch_wait_seconds",
+    "Time an embedding request waited for its batch to be sent.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+
+# Per-request stage latencies. cache_hit is "answer", "search" or "none"
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds",
+    "Chat request stage latency (rewrite, embed, search, ttft, generation, total).",
+    ["stage", "route", "semantic", "cache_hit"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32),
+)
+
+GENERATION_TOKENS_PER_SECOND = Histogram(
+    "rag_generation_tokens_per_second",
+    "Completion tokens per second after the first token.",
+    ["route", "semantic", "cache_hit"],
+    buckets=(5, 10, 20, 40, 60, 80, 120, 160, 240, 320),
+)
+
+INGESTION_LATENCY_SECONDS = Histogram(
+    "rag_ingestion_latency_seconds",
+    "Time from document upload to the ingestion job reporting it indexed.",
+    buckets=(30, 60, 120, 300, 600, 900, 1800, 3600, 7200),
+)
@@ -0,0 +1,105 @@
+"""Per-request trace context.
+
+TraceContextMiddleware gives every API request a trace ID, continuing the
+caller's W3C traceparent when one is sent. The ID lives in a contextvar, so
+it follows the request through every service call and background task
+without being passed around: the Azure SDK clients send it upstream
+(traceparent and x-ms-client-request-id, see inject_trace_headers), log lines
+carry it, the chat stream returns it in the done event and document uploads
+hand it to the Databricks ingestion run.
+"""
+
+import logging
+import re
+import secrets
+from contextvars import ContextVar
+
+from azure.core.pipeline import PipelineRequest
+
+_trace_id: ContextVar[str | None] = ContextVar("trace_id", default=None)
+
+TRACE_ID_HEADER = "x-trace-id"
+
+_TRACEPARENT_PATTERN = re.compile(r"00-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}")
+_INVALID_TRACE_ID = "0" * 32
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def get_trace_id() -> str | None:
+    return _trace_id.get()
+
+
+def trace_id_from_traceparent(header: str | None) -> str | None:
+    """Extract the trace ID from a W3C traceparent header, or None if it is missing or malformed."""
+    if not header:
+        return None
+    match = _TRACEPARENT_PATTERN.fullmatch(header.strip().lower())
+    if match is None or match.group(1) == _INVALID_TRACE_ID:
+        return None
+    return match.group(1)
+
+
+def traceparent(trace_id: str) -> str:
+    """W3C traceparent for an outgoing call: the request's trace ID with a fresh span ID."""
+    return f"00-{trace_id}-{secrets.token_hex(8)}-01"
+
+
+def inject_trace_headers(request: PipelineRequest) -> None:
+    """raw_request_hook for the Azure SDK clients: tag outgoing calls with the current trace.
+
+    x-ms-client-request-id is echoed in Azure's diagnostic logs, so a slow
+    request can be matched to the upstream calls it made.
+    """
+    trace_id = _trace_id.get()
+    if trace_id is None:
+        return
+    headers = request.http_request.headers
+    headers["traceparent"] = traceparent(trace_id)
+    headers["x-ms-client-request-id"] = trace_id
+
+
+class TraceIdLogFilter(logging.Filter):
+    """Add the current trace ID to log records as %(trace_id)s."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = _trace_id.get() or "-"
+        return True
+
+
+class TraceContextMiddleware:
+    """ASGI middleware that sets the trace ID for each HTTP request and returns it as X-Trace-Id.
+
+    Written against raw ASGI rather than BaseHTTPMiddleware so streamed
+    responses pass through untouched.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                incoming = trace_id_from_traceparent(value.decode("latin-1"))
+                break
+        trace_id = incoming or new_trace_id()
+        token = _trace_id.set(trace_id)
+
+        async def send_with_trace_id(message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((TRACE_ID_HEADER.encode(), trace_id.encode()))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            _trace_id.reset(token)
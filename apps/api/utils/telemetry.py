@@ -0,0 +1,77 @@
+"""Optional OpenTelemetry span export.
+
+Set OTEL_EXPORTER_OTLP_ENDPOINT (e.g. http://localhost:4318/v1/traces for a
+local collector) and install the api with the 'otel' extra to export a span
+per request stage. Without it, span() is a no-op.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator
+
+from config.settings import settings
+from utils.request_context import get_trace_id
+
+if TYPE_CHECKING:
+    from opentelemetry.trace import Span, Tracer
+
+logger = logging.getLogger(__name__)
+
+_tracer: "Tracer | None" = None
+
+
+def configure_tracing() -> None:
+    """Set up OTLP span export when OTEL_EXPORTER_OTLP_ENDPOINT is configured (called at startup)."""
+    global _tracer
+    if not settings.OTEL_EXPORTER_OTLP_ENDPOINT or _tracer is not None:
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError as e:
+        raise RuntimeError(
+            "OTEL_EXPORTER_OTLP_ENDPOINT is set but OpenTelemetry is not installed "
+            "(install the api with the 'otel' extra)"
+        ) from e
+
+    provider = TracerProvider(resource=Resource.create({"service.name": settings.OTEL_SERVICE_NAME}))
+    provider.add_span_processor(
+        BatchSpanProcessor(OTLPSpanExporter(endpoint=settings.OTEL_EXPORTER_OTLP_ENDPOINT))
+    )
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("rag-api")
+    logger.info("Exporting spans to %s", settings.OTEL_EXPORTER_OTLP_ENDPOINT)
+
+
+def shutdown_tracing() -> None:
+    """Flush pending spans (called at shutdown)."""
+    if _tracer is None:
+        return
+    from opentelemetry import trace
+
+    trace.get_tracer_provider().shutdown()
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator["Span | None"]:
+    """Record a span around a block when tracing is configured."""
+    if _tracer is None:
+        yield None
+        return
+    attributes.setdefault("rag.trace_id", get_trace_id() or "")
+    with _tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+def record_span(name: str, duration_s: float, **attributes) -> None:
+    """Record an already finished span, for work that outlives its request handler (streamed generation)."""
+    if _tracer is None:
+        return
+    attributes.setdefault("rag.trace_id", get_trace_id() or "")
+    end = time.time_ns()
+    current = _tracer.start_span(name, start_time=end - int(duration_s * 1e9), attributes=attributes)
+    current.end(end_time=end)
@@ -0,0 +1,212 @@
+"""Proactively refreshed AAD tokens for the Azure SDK clients.
+
+The SDK's bearer token policies request a token from their credential when
+the cached one is about to expire, which puts the AAD round trip (often
+several hundred milliseconds) on a user request. TokenCache keeps one token
+per scope and a background task refreshes each one
+TOKEN_REFRESH_MARGIN_SECONDS before it expires, so the credentials handed to
+the clients answer from memory. Only the scopes of clients that authenticate
+with Entra ID are refreshed (see azure_clients.token_scopes); services
+reached with API keys or connection strings need no token.
+
+With TOKEN_CACHE_SHARED and CACHE_REDIS_URL set, refreshed tokens are also
+published to Redis and picked up by the other API workers instead of each
+worker calling AAD. Only enable this on a Redis instance that is trusted with
+bearer tokens.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+import orjson
+from azure.core.credentials import AccessToken, TokenCredential
+from azure.core.credentials_async import AsyncTokenCredential
+
+from config.settings import settings
+from utils.cache import get_shared_cache
+
+logger = logging.getLogger(__name__)
+
+COGNITIVE_SERVICES_SCOPE = "https://cognitiveservices.azure.com/.default"
+SEARCH_SCOPE = "https://search.azure.com/.default"
+STORAGE_SCOPE = "https://storage.azure.com/.default"
+
+# A cached token is served as long as it stays valid for at least this long
+_MIN_VALIDITY_SECONDS = 60
+
+
+def _shared_key(scope: str) -> str:
+    return f"rag:aad:{scope}"
+
+
+class TokenCache:
+    def __init__(
+        self,
+        credential: AsyncTokenCredential,
+        sync_credential: TokenCredential,
+        scopes: list[str],
+    ) -> None:
+        self.scopes = scopes
+        self._credential = credential
+        self._sync_credential = sync_credential
+        self._tokens: dict[str, AccessToken] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._sync_lock = threading.Lock()
+        self.async_credential = CachedAsyncCredential(self, credential)
+        self.sync_credential = CachedSyncCredential(self, sync_credential)
+
+    def cached(self, scope: str, min_validity: float = _MIN_VALIDITY_SECONDS) -> AccessToken | None:
+        token = self._tokens.get(scope)
+        if token is not None and token.expires_on - time.time() > min_validity:
+            return token
+        return None
+
+    async def get_token(self, scope: str) -> AccessToken:
+        token = self.cached(scope)
+        if token is None:
+            token = await self._refresh(scope, _MIN_VALIDITY_SECONDS)
+        return token
+
+    def get_token_sync(self, scope: str) -> AccessToken:
+        """Blocking variant for the sync clients; only fetches when the background refresh has not."""
+        token = self.cached(scope)
+        if token is not None:
+            return token
+        with self._sync_lock:
+            token = self.cached(scope)
+            if token is None:
+                token = self._sync_credential.get_token(scope)
+                self._tokens[scope] = token
+        return token
+
+    async def _refresh(self, scope: str, min_validity: float) -> AccessToken:
+        """Fetch a token unless another task (or worker) already has one valid for min_validity."""
+        lock = self._locks.setdefault(scope, asyncio.Lock())
+        async with lock:
+            token = self.cached(scope, min_validity)
+            if token is not None:
+                return token
+
+            token = await self._read_shared(scope)
+            if token is None or token.expires_on - time.time() <= min_validity:
+                t0 = time.perf_counter()
+                token = await self._credential.get_token(scope)
+                logger.info("[TIMING] token refresh %s: %.2fs", scope, time.perf_counter() - t0)
+                await self._write_shared(scope, token)
+
+            self._tokens[scope] = token
+            return token
+
+    async def refresh_all(self) -> None:
+        """Refresh every configured scope whose token expires within TOKEN_REFRESH_MARGIN_SECONDS."""
+        margin = settings.TOKEN_REFRESH_MARGIN_SECONDS
+        results = await asyncio.gather(
+            *(self._refresh(scope, margin) for scope in self.scopes),
+            return_exceptions=True,
+        )
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            raise errors[0]
+
+    async def run_refresh_loop(self) -> None:
+        """Background task: keep every scope's token fresh until cancelled."""
+        while True:
+            try:
+                await self.refresh_all()
+            except Exception as e:
+                # The clients fall back to fetching on demand; retry on the next tick
+                logger.warning("Background token refresh failed: %s", e)
+            await asyncio.sleep(settings.TOKEN_REFRESH_INTERVAL_SECONDS)
+
+    async def _read_shared(self, scope: str) -> AccessToken | None:
+        shared = get_shared_cache() if settings.TOKEN_CACHE_SHARED else None
+        if shared is None:
+            return None
+        try:
+            raw = await shared.get(_shared_key(scope))
+        except Exception:
+            logger.warning("Shared cache read failed for token %s", scope, exc_info=True)
+            return None
+        if raw is None:
+            return None
+        data = orjson.loads(raw)
+        return AccessToken(data["token"], data["expires_on"])
+
+    async def _write_shared(self, scope: str, token: AccessToken) -> None:
+        shared = get_shared_cache() if settings.TOKEN_CACHE_SHARED else None
+        ttl = int(token.expires_on - time.time()) - _MIN_VALIDITY_SECONDS
+        if shared is None or ttl <= 0:
+            return
+        try:
+            payload = orjson.dumps({"token": token.token, "expires_on": token.expires_on})
+            await shared.set(_shared_key(scope), payload, ex=ttl)
+        except Exception:
+            logger.warning("Shared cache write failed for token %s", scope, exc_info=True)
+
+    async def close(self) -> None:
+        await self._credential.close()
+        self._sync_credential.close()
+
+
+class CachedAsyncCredential:
+    """Async credential that serves tokens from a TokenCache.
+
+    Requests the cache cannot answer (several scopes, CAE claims, another
+    tenant) go straight to the wrapped credential.
+    """
+
+    def __init__(self, cache: TokenCache, credential: AsyncTokenCredential) -> None:
+        self._cache = cache
+        self._credential = credential
+
+    async def get_token(
+        self,
+        *scopes: str,
+        claims: str | None = None,
+        tenant_id: str | None = None,
+        **kwargs,
+    ) -> AccessToken:
+        if len(scopes) != 1 or claims or tenant_id:
+            return await self._credential.get_token(*scopes, claims=claims, tenant_id=tenant_id, **kwargs)
+        return await self._cache.get_token(scopes[0])
+
+    async def close(self) -> None:
+        await self._cache.close()
+
+    async def __aenter__(self) -> "CachedAsyncCredential":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        # The cache outlives individual clients; close() is called on shutdown
+        pass
+
+
+class CachedSyncCredential:
+    """Sync counterpart of CachedAsyncCredential for the document routes' clients."""
+
+    def __init__(self, cache: TokenCache, credential: TokenCredential) -> None:
+        self._cache = cache
+        self._credential = credential
+
+    def get_token(
+        self,
+        *scopes: str,
+        claims: str | None = None,
+        tenant_id: str | None = None,
+        **kwargs,
+    ) -> AccessToken:
+        if len(scopes) != 1 or claims or tenant_id:
+            return self._credential.get_token(*scopes, claims=claims, tenant_id=tenant_id, **kwargs)
+        return self._cache.get_token_sync(scopes[0])
+
+    def close(self) -> None:
+        # Closed together with the async credential by TokenCache.close()
+        pass
+
+    def __enter__(self) -> "CachedSyncCredential":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
@@ -35,6 +35,7 @@ export function UploadButton({
           blobUrl: `${organizationId}/${folderId}/${file.name}`,
           fileType: file.name.split(".").pop() ?? "",
           fileSize: file.size,
+          unchanged: result.status === "unchanged",
         })
       }
       onUploaded()
@@ -123,6 +123,8 @@ export const documentRouter = createTRPCRouter({
         blobUrl: z.string(),
         fileType: z.string(),
         fileSize: z.number(),
+        // The API skipped the upload because the indexed content is identical
+        unchanged: z.boolean().optional(),
       }),
     )
     .mutation(async ({ ctx, input }) => {
@@ -136,18 +138,20 @@ export const documentRouter = createTRPCRouter({
           blobUrl: input.blobUrl,
           fileType: input.fileType,
           fileSize: input.fileSize,
-          status: "uploaded",
+          status: input.unchanged ? "indexed" : "uploaded",
           error: null,
           uploadedBy: ctx.session.user.id,
         })
         .onConflictDoUpdate({
           target: [document.organizationId, document.folderId, document.name],
-          set: {
-            status: "uploaded",
-            error: null,
-            fileSize: input.fileSize,
-            blobUrl: input.blobUrl,
-          },
+          set: input.unchanged
+            ? { fileSize: input.fileSize, blobUrl: input.blobUrl }
+            : {
+                status: "uploaded",
+                error: null,
+                fileSize: input.fileSize,
+                blobUrl: input.blobUrl,
+              },
         })
         .returning({ id: document.id })
 
@@ -47,6 +47,7 @@ export interface SSEThinkingDoneEvent {
 
 export interface SSEDoneEvent {
   type: "done"
+  trace_id?: string
 }
 
 export type SSEEvent =
@@ -7,6 +7,10 @@
 # MAGIC Reads documents from Azure Blob Storage, parses them via Azure Document Intelligence,
 # MAGIC and appends parsed results to a Delta table. Only processes the documents specified
 # MAGIC in the `document_names` parameter (or all documents if empty).
+# MAGIC
+# MAGIC Documents are parsed concurrently (`parse_concurrency` analyze operations in flight);
+# MAGIC uploads of at least `spark_parse_min_documents` documents are spread across Spark executors.
+# MAGIC With `skip_unchanged`, blobs whose content is already indexed are skipped (see `utils/incremental.py`).
 
 # COMMAND ----------
 
@@ -16,16 +20,23 @@ dbutils.widgets.text("output_table", "rag_ingestion.parsed_documents", "Output D
 dbutils.widgets.text("document_names", "", "Comma-separated blob names to process (empty = all)")
 dbutils.widgets.text("organization_id", "", "Organization ID")
 dbutils.widgets.text("folder_id", "", "Folder ID")
+dbutils.widgets.text("trace_id", "", "Trace ID of the upload request (for log correlation)")
+dbutils.widgets.text("parse_concurrency", "8", "Concurrent Document Intelligence analyze operations")
+dbutils.widgets.text("spark_parse_min_documents", "100", "Parse on Spark executors from this many documents (0 = never)")
+dbutils.widgets.dropdown("skip_unchanged", "true", ["true", "false"], "Skip documents whose content is already indexed")
 
 # COMMAND ----------
 
 import sys
 import json
+import time
 import uuid
 from datetime import datetime, timezone
 
 sys.path.append("../")
-from utils.azure_clients import get_document_analysis_client, get_blob_service_client
+from utils.azure_clients import get_document_analysis_client, get_blob_service_client, get_secret
+from utils.document_parsing import parse_blobs, parse_blobs_on_executors
+from utils.incremental import INDEXED_CHUNKING_METADATA, INDEXED_HASH_METADATA, is_unchanged
 from utils.quality_checks import validate_parsed_document
 
 # COMMAND ----------
@@ -35,6 +46,12 @@ output_table = dbutils.widgets.get("output_table")
 document_names_raw = dbutils.widgets.get("document_names").strip()
 organization_id = dbutils.widgets.get("organization_id").strip()
 folder_id = dbutils.widgets.get("folder_id").strip()
+trace_id = dbutils.widgets.get("trace_id").strip()
+parse_concurrency = int(dbutils.widgets.get("parse_concurrency") or "8")
+spark_parse_min_documents = int(dbutils.widgets.get("spark_parse_min_documents") or "0")
+skip_unchanged = dbutils.widgets.get("skip_unchanged") == "true"
+if trace_id:
+    print(f"Ingestion run for upload trace_id={trace_id}")
 
 blob_client = get_blob_service_client()
 doc_intel_client = get_document_analysis_client()
@@ -59,7 +76,7 @@ if document_names_raw:
 else:
     # Process all documents in the container
     blobs = []
-    for blob in container_client.list_blobs():
+    for blob in container_client.list_blobs(include=["metadata"]):
         ext = "." + blob.name.rsplit(".", 1)[-1].lower() if "." in blob.name else ""
         if ext in SUPPORTED_EXTENSIONS:
             blobs.append(blob)
@@ -75,22 +92,62 @@ if not blobs:
 # Compute document IDs upfront so we can mark them as failed if anything goes wrong
 from utils.db_status import update_document_status
 
-document_ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, blob.name)) for blob in blobs]
 db_url = dbutils.secrets.get(scope=dbutils.widgets.get("secrets_scope"), key="DATABASE_URL")
 
+# Blobs whose content hash (set by the API on upload) matches the indexed one need no work
+unchanged_ids = []
+if skip_unchanged:
+    unchanged_ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, blob.name)) for blob in blobs if is_unchanged(blob.metadata)]
+    blobs = [blob for blob in blobs if not is_unchanged(blob.metadata)]
+    if unchanged_ids:
+        print(f"Skipping {len(unchanged_ids)} documents that are already indexed")
+        update_document_status(unchanged_ids, "indexed", db_url)
+    if not blobs:
+        dbutils.jobs.taskValues.set(key="document_ids", value="")
+        dbutils.notebook.exit(json.dumps({"status": "SUCCESS", "document_count": 0, "unchanged_count": len(unchanged_ids)}))
+
+document_ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, blob.name)) for blob in blobs]
+
 update_document_status(document_ids, "processing", db_url)
 
 # COMMAND ----------
 
 try:
-    parsed_documents = []
+    blob_names = [blob.name for blob in blobs]
+    t0 = time.perf_counter()
+
+    if spark_parse_min_documents and len(blob_names) >= spark_parse_min_documents:
+        print(f"Parsing {len(blob_names)} documents on Spark executors ({parse_concurrency} concurrent in total)")
+        parsed_results = parse_blobs_on_executors(
+            spark,
+            blob_names,
+            container_name,
+            storage_connection_string=get_secret("azure-storage-connection-string"),
+            document_intelligence_endpoint=get_secret("document-intelligence-endpoint"),
+            document_intelligence_key=get_secret("document-intelligence-key"),
+            max_concurrency=parse_concurrency,
+        )
+    else:
+        print(f"Parsing {len(blob_names)} documents ({parse_concurrency} concurrent)")
+        parsed_results = parse_blobs(container_client, doc_intel_client, blob_names, parse_concurrency)
+
+    print(f"[TIMING] Parsing: {time.perf_counter() - t0:.1f}s")
 
-    for blob in blobs:
-        document_id = str(uuid.uuid5(uuid.NAMESPACE_URL, blob.name))
-        print(f"Processing: {blob.name} (id: {document_id})")
+    parsed_documents = []
+    parsed_unchanged_ids = []
+    for document_id, blob, parsed in zip(document_ids, blobs, parsed_results):
+        name = parsed["document_name"]
+        metadata = blob.metadata or {}
+
+        # Blobs without a content hash in their metadata (not uploaded through the API)
+        # can only be compared once downloaded
+        if skip_unchanged and parsed["content_hash"] == metadata.get(INDEXED_HASH_METADATA):
+            print(f"  Unchanged: {name}")
+            parsed_unchanged_ids.append(document_id)
+            continue
 
         # Extract organization_id and folder_id from blob path ({org_id}/{folder_id}/{filename})
-        path_parts = blob.name.split("/")
+        path_parts = name.split("/")
         if len(path_parts) >= 3 and not organization_id:
             blob_org_id = path_parts[0]
             blob_folder_id = path_parts[1]
@@ -98,72 +155,37 @@ try:
             blob_org_id = organization_id
             blob_folder_id = folder_id
 
-        blob_data = container_client.download_blob(blob.name).readall()
-        ext = blob.name.rsplit(".", 1)[-1].lower()
-
-        if ext == "txt":
-            content = blob_data.decode("utf-8")
-            parsed_doc = {
-                "document_id": document_id,
-                "document_name": blob.name,
-                "document_url": f"https://{blob_client.account_name}.blob.core.windows.net/{container_name}/{blob.name}",
-                "content": content,
-                "pages": [{"page_number": 1, "content": content, "layout": []}],
-                "page_count": 1,
-                "parsed_at": datetime.now(timezone.utc).isoformat(),
-                "organization_id": blob_org_id,
-                "folder_id": blob_folder_id,
-            }
-        else:
-            poller = doc_intel_client.begin_analyze_document(
-                "prebuilt-layout",
-                document=blob_data,
-            )
-            result = poller.result()
-
-            pages_data = []
-            for page in result.pages or []:
-                page_content = ""
-                page_layout = []
-                for paragraph in result.paragraphs or []:
-                    if any(br.page_number == page.page_number for br in (paragraph.bounding_regions or [])):
-                        page_content += paragraph.content + "\n"
-                        page_layout.append({
-                            "content": paragraph.content,
-                            "role": getattr(paragraph, "role", None),
-                            "bounding_regions": [
-                                {"page_number": br.page_number}
-                                for br in (paragraph.bounding_regions or [])
-                            ],
-                        })
-                pages_data.append({
-                    "page_number": page.page_number,
-                    "content": page_content.strip(),
-                    "layout": page_layout,
-                })
-
-            full_content = "\n\n".join(p["content"] for p in pages_data if p["content"])
-
-            parsed_doc = {
-                "document_id": document_id,
-                "document_name": blob.name,
-                "document_url": f"https://{blob_client.account_name}.blob.core.windows.net/{container_name}/{blob.name}",
-                "content": full_content,
-                "pages": pages_data,
-                "page_count": len(pages_data),
-                "parsed_at": datetime.now(timezone.utc).isoformat(),
-                "organization_id": blob_org_id,
-                "folder_id": blob_folder_id,
-            }
+        parsed_doc = {
+            "document_id": document_id,
+            "document_name": name,
+            "document_url": f"https://{blob_client.account_name}.blob.core.windows.net/{container_name}/{name}",
+            "content": parsed["content"],
+            "content_hash": parsed["content_hash"],
+            "pages": parsed["pages"],
+            "page_count": parsed["page_count"],
+            "parsed_at": datetime.now(timezone.utc).isoformat(),
+            "organization_id": blob_org_id,
+            "folder_id": blob_folder_id,
+            # The indexing task marks the blob as indexed only if it still has this etag
+            "blob_etag": blob.etag or "",
+            # Version currently in the index, which the chunking task diffs pages against
+            "indexed_content_hash": metadata.get(INDEXED_HASH_METADATA, "") if skip_unchanged else "",
+            "indexed_chunking": metadata.get(INDEXED_CHUNKING_METADATA, "") if skip_unchanged else "",
+        }
 
         is_valid, errors = validate_parsed_document(parsed_doc)
         if not is_valid:
-            print(f"  WARNING: Validation issues for {blob.name}: {errors}")
+            print(f"  WARNING: Validation issues for {name}: {errors}")
 
         parsed_documents.append(parsed_doc)
 
     print(f"Parsed {len(parsed_documents)} documents successfully")
 
+    if parsed_unchanged_ids:
+        print(f"{len(parsed_unchanged_ids)} parsed documents are identical to their indexed version")
+        update_document_status(parsed_unchanged_ids, "indexed", db_url)
+        document_ids = [did for did in document_ids if did not in parsed_unchanged_ids]
+
     # Save to Delta table
     for doc in parsed_documents:
         doc["pages_json"] = json.dumps(doc["pages"])
@@ -172,8 +194,10 @@ try:
     schema_name = output_table.rsplit(".", 1)[0]
     spark.sql(f"CREATE SCHEMA IF NOT EXISTS {schema_name}")
 
-    df = spark.createDataFrame(parsed_documents)
-    df.write.mode("append").saveAsTable(output_table)
+    if parsed_documents:
+        df = spark.createDataFrame(parsed_documents)
+        # mergeSchema adds the content hash columns to tables created before they existed
+        df.write.mode("append").option("mergeSchema", "true").saveAsTable(output_table)
 
     print(f"Appended {len(parsed_documents)} parsed documents to {output_table}")
 
@@ -187,4 +211,8 @@ dbutils.jobs.taskValues.set(key="document_ids", value=",".join(document_ids))
 dbutils.jobs.taskValues.set(key="organization_id", value=organization_id)
 dbutils.jobs.taskValues.set(key="folder_id", value=folder_id)
 
-dbutils.notebook.exit(json.dumps({"status": "SUCCESS", "document_count": len(parsed_documents)}))
+dbutils.notebook.exit(json.dumps({
+    "status": "SUCCESS",
+    "document_count": len(parsed_documents),
+    "unchanged_count": len(unchanged_ids) + len(parsed_unchanged_ids),
+}))
@@ -6,6 +6,9 @@
 # MAGIC
 # MAGIC Reads parsed documents from Delta table (filtered by document_ids from the previous task),
 # MAGIC applies the selected chunking strategy, and appends chunks to a Delta table.
+# MAGIC
+# MAGIC For a new version of an indexed document chunked with the same settings, only pages
+# MAGIC whose content hash changed are re-chunked; the indexing task removes the stale chunks.
 
 # COMMAND ----------
 
@@ -20,8 +23,10 @@ dbutils.widgets.text("overlap_tokens", "50", "Overlap Tokens")
 
 import sys
 import json
+from datetime import datetime, timezone
 
 import pyspark.sql.functions as F
+from pyspark.sql import Window
 
 sys.path.append("../")
 from utils.chunking_strategies import (
@@ -29,6 +34,13 @@ from utils.chunking_strategies import (
     structure_aware_chunker,
     sliding_window_chunker,
 )
+from utils.incremental import (
+    PAGE_BASED_STRATEGIES,
+    changed_pages,
+    chunking_signature,
+    page_chunk_id,
+    page_chunk_index,
+)
 from utils.quality_checks import validate_chunks
 
 # COMMAND ----------
@@ -38,6 +50,7 @@ output_table = dbutils.widgets.get("output_table")
 strategy = dbutils.widgets.get("chunking_strategy")
 max_tokens = int(dbutils.widgets.get("max_tokens"))
 overlap_tokens = int(dbutils.widgets.get("overlap_tokens"))
+chunking = chunking_signature(strategy, max_tokens, overlap_tokens)
 
 # COMMAND ----------
 
@@ -49,6 +62,7 @@ folder_id = dbutils.jobs.taskValues.get(taskKey="parse_documents", key="folder_i
 if not document_ids_raw:
     print("No document IDs received from parsing task, nothing to chunk")
     dbutils.jobs.taskValues.set(key="chunk_ids", value="")
+    dbutils.jobs.taskValues.set(key="document_ids", value="")
     dbutils.notebook.exit(json.dumps({"status": "SUCCESS", "chunk_count": 0, "strategy": strategy}))
 
 document_ids = [did.strip() for did in document_ids_raw.split(",") if did.strip()]
@@ -60,11 +74,42 @@ db_url = dbutils.secrets.get(scope=dbutils.widgets.get("secrets_scope"), key="DA
 # COMMAND ----------
 
 try:
-    df = spark.table(input_table).filter(F.col("document_id").isin(document_ids))
+    # The table is appended to on every run, so take the latest version of each document
+    latest = Window.partitionBy("document_id").orderBy(F.col("parsed_at").desc())
+    df = (
+        spark.table(input_table)
+        .filter(F.col("document_id").isin(document_ids))
+        .withColumn("_version", F.row_number().over(latest))
+        .filter(F.col("_version") == 1)
+        .drop("_version")
+    )
     documents = df.collect()
     print(f"Read {len(documents)} documents from {input_table}")
 
+    # Pages of the indexed versions, for documents that can be updated page by page
+    previous_keys = []
+    if strategy in PAGE_BASED_STRATEGIES:
+        previous_keys = [
+            f"{row['document_id']}:{row['indexed_content_hash']}"
+            for row in documents
+            if row["indexed_content_hash"] and row["indexed_chunking"] == chunking
+        ]
+    previous_pages = {}
+    if previous_keys:
+        previous_rows = (
+            spark.table(input_table)
+            .filter(F.concat_ws(":", "document_id", "content_hash").isin(previous_keys))
+            .select("document_id", "pages_json")
+            .dropDuplicates(["document_id"])
+            .collect()
+        )
+        previous_pages = {row["document_id"]: json.loads(row["pages_json"]) for row in previous_rows}
+
     all_chunks = []
+    # Chunk IDs repeat across versions of a document; later tasks read the latest row per ID
+    chunked_at = datetime.now(timezone.utc).isoformat()
+    # document_id -> page numbers re-chunked (or removed), None when re-chunked in full
+    changed_pages_by_doc = {}
 
     for doc_row in documents:
         doc = doc_row.asDict()
@@ -73,6 +118,17 @@ try:
         document_url = doc["document_url"]
         pages = json.loads(doc["pages_json"])
 
+        changed = None
+        if document_id in previous_pages:
+            changed = changed_pages(pages, previous_pages[document_id])
+            changed_set = set(changed)
+            if all(page["page_number"] in changed_set for page in pages):
+                changed = None  # nothing to reuse, same as a full re-chunk
+            else:
+                print(f"  {document_name}: {len(changed)} changed pages, reusing the chunks of the rest")
+                pages = [page for page in pages if page["page_number"] in changed_set]
+        changed_pages_by_doc[document_id] = changed
+
         doc_chunks = []
 
         if strategy == "structure_aware":
@@ -105,13 +161,23 @@ try:
                 )
                 doc_chunks.extend(page_chunks)
 
-        # Re-index chunks sequentially for the entire document
+        # Structure-aware chunks span pages and are indexed sequentially for the entire
+        # document; page-based chunks are numbered within their page so unchanged pages keep their IDs
+        page_positions = {}
         for i, chunk in enumerate(doc_chunks):
-            chunk["chunk_index"] = i
+            if strategy in PAGE_BASED_STRATEGIES:
+                page_number = chunk["page_number"]
+                n = page_positions.get(page_number, 0)
+                page_positions[page_number] = n + 1
+                chunk["chunk_index"] = page_chunk_index(page_number, n)
+                chunk["id"] = page_chunk_id(document_id, page_number, n)
+            else:
+                chunk["chunk_index"] = i
+                chunk["id"] = f"{document_id}_chunk_{i}"
             chunk["document_id"] = document_id
             chunk["document_name"] = document_name
             chunk["document_url"] = document_url
-            chunk["id"] = f"{document_id}_chunk_{i}"
+            chunk["chunked_at"] = chunked_at
             chunk["metadata"] = json.dumps(chunk.get("metadata", {}))
             chunk["organization_id"] = doc.get("organization_id", organization_id) or organization_id
             chunk["folder_id"] = doc.get("folder_id", folder_id) or folder_id
@@ -124,8 +190,9 @@ try:
 
     print(f"Generated {len(all_chunks)} chunks using '{strategy}' strategy")
 
-    chunk_df = spark.createDataFrame(all_chunks)
-    chunk_df.write.mode("append").saveAsTable(output_table)
+    if all_chunks:
+        chunk_df = spark.createDataFrame(all_chunks)
+        chunk_df.write.mode("append").option("mergeSchema", "true").saveAsTable(output_table)
 
     print(f"Appended {len(all_chunks)} chunks to {output_table}")
 
@@ -137,6 +204,10 @@ except Exception as e:
 
 chunk_ids = [chunk["id"] for chunk in all_chunks]
 dbutils.jobs.taskValues.set(key="chunk_ids", value=",".join(chunk_ids))
+# The indexing task needs these to remove stale chunks, even for documents that produced none
+dbutils.jobs.taskValues.set(key="document_ids", value=",".join(document_ids))
+dbutils.jobs.taskValues.set(key="changed_pages", value=json.dumps(changed_pages_by_doc))
+dbutils.jobs.taskValues.set(key="chunking", value=chunking)
 dbutils.jobs.taskValues.set(key="organization_id", value=organization_id)
 dbutils.jobs.taskValues.set(key="folder_id", value=folder_id)
 
@@ -5,27 +5,38 @@
 # MAGIC # 03 - Embedding Generation
 # MAGIC
 # MAGIC Reads chunks from Delta table (filtered by chunk_ids from the previous task),
-# MAGIC generates embeddings via Azure AI Foundry in batches, and appends the results.
+# MAGIC generates embeddings via Azure AI Foundry in token-packed batches sent concurrently
+# MAGIC within the deployment's TPM/RPM limits, and appends the results.
+# MAGIC Embeddings are looked up in a cache table (keyed by chunk content hash, deployment and
+# MAGIC dimensions) first; only misses are sent to the model.
 
 # COMMAND ----------
 
 dbutils.widgets.text("input_table", "rag_ingestion.chunks", "Input Chunks Table")
 dbutils.widgets.text("output_table", "rag_ingestion.chunks_with_embeddings", "Output Table")
 dbutils.widgets.text("secrets_scope", "rag-ingestion", "Databricks Secrets Scope")
-dbutils.widgets.text("batch_size", "100", "Embedding Batch Size")
+dbutils.widgets.text("batch_size", "100", "Max Chunks per Embedding Batch")
+dbutils.widgets.text("max_batch_tokens", "32000", "Max Tokens per Embedding Batch")
+dbutils.widgets.text("max_concurrency", "4", "Concurrent Embedding Batches")
+dbutils.widgets.text("tpm_limit", "150000", "Deployment Tokens per Minute (0 = rate-limit headers only)")
+dbutils.widgets.text("rpm_limit", "900", "Deployment Requests per Minute (0 = rate-limit headers only)")
 dbutils.widgets.text("max_retries", "5", "Max Retries per Batch")
 dbutils.widgets.text("embedding_dimensions", "3072", "Expected Embedding Dimensions")
+dbutils.widgets.text("embedding_cache_table", "rag_ingestion.embedding_cache", "Embedding Cache Table (empty = disabled)")
 
 # COMMAND ----------
 
 import sys
 import json
-import time
 
 import pyspark.sql.functions as F
+from pyspark.sql import Window
 
 sys.path.append("../")
-from utils.azure_clients import get_embeddings_client
+from utils.azure_clients import get_embeddings_client, get_secret
+from utils.chunking_strategies import count_tokens
+from utils.embedding_cache import ensure_cache_table, lookup_embeddings, store_embeddings, text_hash
+from utils.embedding_executor import RateLimiter, embed_texts
 from utils.quality_checks import validate_embeddings
 
 # COMMAND ----------
@@ -33,8 +44,13 @@ from utils.quality_checks import validate_embeddings
 input_table = dbutils.widgets.get("input_table")
 output_table = dbutils.widgets.get("output_table")
 batch_size = int(dbutils.widgets.get("batch_size"))
+max_batch_tokens = int(dbutils.widgets.get("max_batch_tokens"))
+max_concurrency = int(dbutils.widgets.get("max_concurrency"))
+tpm_limit = int(dbutils.widgets.get("tpm_limit") or "0")
+rpm_limit = int(dbutils.widgets.get("rpm_limit") or "0")
 max_retries = int(dbutils.widgets.get("max_retries"))
 expected_dims = int(dbutils.widgets.get("embedding_dimensions"))
+cache_table = dbutils.widgets.get("embedding_cache_table").strip()
 
 # COMMAND ----------
 
@@ -46,7 +62,9 @@ folder_id = dbutils.jobs.taskValues.get(taskKey="chunk_documents", key="folder_i
 if not chunk_ids_raw:
     print("No chunk IDs received from chunking task, nothing to embed")
     dbutils.jobs.taskValues.set(key="chunk_ids", value="")
-    dbutils.notebook.exit(json.dumps({"status": "SUCCESS", "embedded_count": 0}))
+    dbutils.notebook.exit(json.dumps({
+        "status": "SUCCESS", "embedded_count": 0, "cache_hits": 0, "cache_hit_rate": None, "tokens_per_second": None,
+    }))
 
 chunk_ids = [cid.strip() for cid in chunk_ids_raw.split(",") if cid.strip()]
 print(f"Generating embeddings for {len(chunk_ids)} chunks")
@@ -60,70 +78,76 @@ db_url = dbutils.secrets.get(scope=dbutils.widgets.get("secrets_scope"), key="DA
 # COMMAND ----------
 
 client = get_embeddings_client()
-
-# COMMAND ----------
-
-def generate_embeddings_batch(texts: list[str], retries: int = 0) -> list[list[float]]:
-    """Generate embeddings for a batch with retry logic and rate limiting."""
-    try:
-        response = client.embed(
-            input=texts,
-        )
-        embeddings = [item.embedding for item in response.data]
-
-        for emb in embeddings:
-            if len(emb) != expected_dims:
-                raise ValueError(f"Expected {expected_dims} dimensions, got {len(emb)}")
-
-        return embeddings
-
-    except Exception as e:
-        if retries < max_retries:
-            wait_time = (2 ** retries) * 5.0
-            error_str = str(e)
-            if "429" in error_str or "rate" in error_str.lower():
-                wait_time = max(wait_time, 60.0)
-            print(f"  Retry {retries + 1}/{max_retries} after {wait_time}s: {error_str[:100]}")
-            time.sleep(wait_time)
-            return generate_embeddings_batch(texts, retries + 1)
-        raise
+embedding_deployment = get_secret("azure-ai-embedding-deployment")
+limiter = RateLimiter(tokens_per_minute=tpm_limit, requests_per_minute=rpm_limit)
 
 # COMMAND ----------
 
 try:
-    df = spark.table(input_table).filter(F.col("id").isin(chunk_ids))
+    # Chunk IDs repeat across versions of a document, so take the latest row per ID
+    latest = Window.partitionBy("id").orderBy(F.col("chunked_at").desc())
+    df = (
+        spark.table(input_table)
+        .filter(F.col("id").isin(chunk_ids))
+        .withColumn("_version", F.row_number().over(latest))
+        .filter(F.col("_version") == 1)
+        .drop("_version")
+    )
     chunks = df.collect()
     print(f"Read {len(chunks)} chunks from {input_table}")
 
-    all_results = []
-    total_batches = (len(chunks) + batch_size - 1) // batch_size
-
-    for batch_idx in range(total_batches):
-        start = batch_idx * batch_size
-        end = min(start + batch_size, len(chunks))
-        batch_chunks = chunks[start:end]
-        batch_texts = [row["content"] for row in batch_chunks]
-
-        print(f"  Batch {batch_idx + 1}/{total_batches} ({len(batch_texts)} chunks)")
+    chunk_hashes = [text_hash(row["content"]) for row in chunks]
+
+    cached = {}
+    if cache_table:
+        ensure_cache_table(spark, cache_table)
+        cached = lookup_embeddings(spark, cache_table, chunk_hashes, embedding_deployment, expected_dims)
+    cache_hits = sum(1 for h in chunk_hashes if h in cached)
+    cache_hit_rate = round(cache_hits / len(chunks), 3) if chunks else None
+    print(f"Embedding cache: {cache_hits}/{len(chunks)} hits")
+
+    # Each distinct text that missed the cache is embedded once
+    texts_by_hash = {}
+    for h, row in zip(chunk_hashes, chunks):
+        if h not in cached:
+            texts_by_hash.setdefault(h, row["content"])
+    miss_hashes = list(texts_by_hash)
+
+    embeddings, stats = embed_texts(
+        client,
+        [texts_by_hash[h] for h in miss_hashes],
+        count_tokens=count_tokens,
+        expected_dims=expected_dims,
+        limiter=limiter,
+        max_batch_tokens=max_batch_tokens,
+        max_batch_items=batch_size,
+        max_concurrency=max_concurrency,
+        max_retries=max_retries,
+    )
+
+    is_valid, errors = validate_embeddings(embeddings, expected_dim=expected_dims)
+    if not is_valid:
+        print(f"  WARNING: Embedding validation issues: {errors[:5]}")
+
+    generated = dict(zip(miss_hashes, embeddings))
+
+    print(f"Generated {len(generated)} embeddings, reused {cache_hits} from the cache")
+    print(
+        f"[TIMING] Embedding: {stats.elapsed_s:.1f}s, {stats.requests} requests, {stats.tokens} tokens "
+        f"({stats.tokens_per_second:.0f} tokens/s), {stats.retries} retries ({stats.throttled} throttled)"
+    )
+
+    if cache_table:
+        store_embeddings(spark, cache_table, generated, embedding_deployment, expected_dims)
 
-        embeddings = generate_embeddings_batch(batch_texts)
-
-        is_valid, errors = validate_embeddings(embeddings, expected_dim=expected_dims)
-        if not is_valid:
-            print(f"    WARNING: Embedding validation issues: {errors}")
-
-        for i, row in enumerate(batch_chunks):
-            result = row.asDict()
-            result["content_vector"] = embeddings[i]
-            all_results.append(result)
-
-        if batch_idx < total_batches - 1:
-            time.sleep(0.5)
-
-    print(f"Generated embeddings for {len(all_results)} chunks")
+    all_results = []
+    for h, row in zip(chunk_hashes, chunks):
+        result = row.asDict()
+        result["content_vector"] = cached[h] if h in cached else generated[h]
+        all_results.append(result)
 
     result_df = spark.createDataFrame(all_results)
-    result_df.write.mode("append").saveAsTable(output_table)
+    result_df.write.mode("append").option("mergeSchema", "true").saveAsTable(output_table)
 
     print(f"Appended {len(all_results)} chunks with embeddings to {output_table}")
 
@@ -137,4 +161,13 @@ dbutils.jobs.taskValues.set(key="chunk_ids", value=chunk_ids_raw)
 dbutils.jobs.taskValues.set(key="organization_id", value=organization_id)
 dbutils.jobs.taskValues.set(key="folder_id", value=folder_id)
 
-dbutils.notebook.exit(json.dumps({"status": "SUCCESS", "embedded_count": len(all_results)}))
+dbutils.notebook.exit(json.dumps({
+    "status": "SUCCESS",
+    "embedded_count": len(all_results),
+    "generated_count": len(generated),
+    "cache_hits": cache_hits,
+    "cache_hit_rate": cache_hit_rate,
+    "embedding_tokens": stats.tokens,
+    "tokens_per_second": round(stats.tokens_per_second, 1),
+    "retries": stats.retries,
+}))
@@ -5,32 +5,49 @@
 # MAGIC # 04 - Indexing
 # MAGIC
 # MAGIC Reads chunks with embeddings from Delta table (filtered by chunk_ids from the previous task)
-# MAGIC and uploads them to Azure AI Search in batches using upsert semantics.
+# MAGIC and uploads them to Azure AI Search in batches using upsert semantics. Chunks the new
+# MAGIC document versions no longer produce are deleted, and each blob is marked as indexed
+# MAGIC (content hash in its metadata) so identical re-uploads are skipped.
 
 # COMMAND ----------
 
 dbutils.widgets.text("input_table", "rag_ingestion.chunks_with_embeddings", "Input Table")
+dbutils.widgets.text("parsed_table", "rag_ingestion.parsed_documents", "Parsed Documents Table")
+dbutils.widgets.text("storage_container", "documents", "Storage Container Name")
 dbutils.widgets.text("index_name", "rag-index", "Search Index Name")
 dbutils.widgets.text("secrets_scope", "rag-ingestion", "Databricks Secrets Scope")
 dbutils.widgets.text("upload_batch_size", "100", "Upload Batch Size")
+dbutils.widgets.text("api_base_url", "", "API base URL for search cache invalidation (empty = skip)")
+dbutils.widgets.text("trace_id", "", "Trace ID of the upload request (for log correlation)")
+dbutils.widgets.text("uploaded_at", "", "Upload time as epoch seconds (for upload-to-indexed latency)")
 
 # COMMAND ----------
 
 import sys
 import json
 import time
+import urllib.request
+import uuid
 
 import pyspark.sql.functions as F
+from pyspark.sql import Window
 
 sys.path.append("../")
-from utils.azure_clients import get_search_client
+from utils.azure_clients import get_blob_service_client, get_search_client
+from utils.incremental import mark_indexed, stale_chunk_ids
 from utils.quality_checks import validate_index_document
 
 # COMMAND ----------
 
 input_table = dbutils.widgets.get("input_table")
+parsed_table = dbutils.widgets.get("parsed_table")
+container_name = dbutils.widgets.get("storage_container")
 index_name = dbutils.widgets.get("index_name")
 upload_batch_size = int(dbutils.widgets.get("upload_batch_size"))
+api_base_url = dbutils.widgets.get("api_base_url").strip().rstrip("/")
+trace_id = dbutils.widgets.get("trace_id").strip()
+uploaded_at_raw = dbutils.widgets.get("uploaded_at").strip()
+uploaded_at = float(uploaded_at_raw) if uploaded_at_raw else None
 
 # COMMAND ----------
 
@@ -39,15 +56,24 @@ chunk_ids_raw = dbutils.jobs.taskValues.get(taskKey="generate_embeddings", key="
 organization_id = dbutils.jobs.taskValues.get(taskKey="generate_embeddings", key="organization_id", default="")
 folder_id = dbutils.jobs.taskValues.get(taskKey="generate_embeddings", key="folder_id", default="")
 
-if not chunk_ids_raw:
-    print("No chunk IDs received from embedding task, nothing to index")
-    dbutils.notebook.exit(json.dumps({"status": "SUCCESS", "success_count": 0, "error_count": 0}))
+# Documents of this run and the pages they re-chunked, from the chunking task. A document
+# whose changes only removed pages has no new chunks but still has stale ones to delete.
+document_ids_raw = dbutils.jobs.taskValues.get(taskKey="chunk_documents", key="document_ids", default="")
+changed_pages_by_doc = json.loads(dbutils.jobs.taskValues.get(taskKey="chunk_documents", key="changed_pages", default="{}"))
+chunking = dbutils.jobs.taskValues.get(taskKey="chunk_documents", key="chunking", default="")
 
 chunk_ids = [cid.strip() for cid in chunk_ids_raw.split(",") if cid.strip()]
-print(f"Indexing {len(chunk_ids)} chunks")
 
-# Get document IDs for status updates (extract from chunk IDs: "{doc_id}_chunk_{n}")
-document_ids = list(set(cid.rsplit("_chunk_", 1)[0] for cid in chunk_ids))
+# Get document IDs for status updates (fall back to extracting them from chunk IDs: "{doc_id}_chunk_{n}")
+document_ids = [did.strip() for did in document_ids_raw.split(",") if did.strip()]
+if not document_ids:
+    document_ids = list(set(cid.rsplit("_chunk_", 1)[0] for cid in chunk_ids))
+
+if not document_ids:
+    print("No chunk IDs received from embedding task, nothing to index")
+    dbutils.notebook.exit(json.dumps({"status": "SUCCESS", "success_count": 0, "error_count": 0}))
+
+print(f"Indexing {len(chunk_ids)} chunks for {len(document_ids)} documents")
 
 from utils.db_status import update_document_status
 db_url = dbutils.secrets.get(scope=dbutils.widgets.get("secrets_scope"), key="DATABASE_URL")
@@ -57,8 +83,18 @@ db_url = dbutils.secrets.get(scope=dbutils.widgets.get("secrets_scope"), key="DA
 try:
     search_client = get_search_client(index_name)
 
-    df = spark.table(input_table).filter(F.col("id").isin(chunk_ids))
-    chunks = df.collect()
+    chunks = []
+    if chunk_ids:
+        # Chunk IDs repeat across versions of a document, so take the latest row per ID
+        latest_chunk = Window.partitionBy("id").orderBy(F.col("chunked_at").desc())
+        df = (
+            spark.table(input_table)
+            .filter(F.col("id").isin(chunk_ids))
+            .withColumn("_version", F.row_number().over(latest_chunk))
+            .filter(F.col("_version") == 1)
+            .drop("_version")
+        )
+        chunks = df.collect()
     print(f"Read {len(chunks)} chunks from {input_table}")
 
     documents = []
@@ -122,6 +158,46 @@ try:
 
     print(f"\nIndexing complete: {success_count} succeeded, {error_count} failed")
 
+    # Latest parsed version of each document: blob name, content hash and the etag it was parsed at
+    latest = Window.partitionBy("document_id").orderBy(F.col("parsed_at").desc())
+    parsed_versions = (
+        spark.table(parsed_table)
+        .filter(F.col("document_id").isin(document_ids))
+        .withColumn("_version", F.row_number().over(latest))
+        .filter(F.col("_version") == 1)
+        .select("document_id", "document_name", "organization_id", "folder_id", "content_hash", "blob_etag")
+        .collect()
+    )
+
+    deleted_count = 0
+    if error_count == 0:
+        new_ids = set(chunk_ids)
+        for document_id in document_ids:
+            existing_ids = [
+                r["id"] for r in search_client.search(
+                    search_text="*",
+                    filter=f"document_id eq '{document_id}'",
+                    select=["id"],
+                )
+            ]
+            stale = stale_chunk_ids(existing_ids, new_ids, changed_pages_by_doc.get(document_id))
+            for start in range(0, len(stale), upload_batch_size):
+                search_client.delete_documents([{"id": cid} for cid in stale[start:start + upload_batch_size]])
+            deleted_count += len(stale)
+        print(f"Deleted {deleted_count} stale chunks")
+
+        # Record the indexed content hash on each blob so identical re-uploads are skipped
+        container_client = get_blob_service_client().get_container_client(container_name)
+        for row in parsed_versions:
+            if not row["content_hash"] or not row["blob_etag"]:
+                continue
+            if not mark_indexed(container_client, row["document_name"], row["blob_etag"], row["content_hash"], chunking):
+                print(f"  {row['document_name']} changed since it was parsed, not marking it as indexed")
+
+    upload_to_indexed_s = round(time.time() - uploaded_at, 1) if uploaded_at is not None else None
+    if upload_to_indexed_s is not None:
+        print(f"Upload to indexed: {upload_to_indexed_s}s (trace_id={trace_id or '-'})")
+
     if error_count == 0:
         update_document_status(document_ids, "indexed", db_url)
     else:
@@ -133,8 +209,43 @@ except Exception as e:
 
 # COMMAND ----------
 
+# Tell the API which tenants changed so it drops their cached search results
+if api_base_url and (success_count > 0 or deleted_count > 0):
+    folders_by_org: dict[str, set[str]] = {}
+    for doc in [*documents, *parsed_versions]:
+        folders_by_org.setdefault(doc["organization_id"], set()).add(doc["folder_id"])
+
+    for org_id, folder_ids in folders_by_org.items():
+        payload = json.dumps({
+            "organization_id": org_id,
+            "folder_ids": sorted(f for f in folder_ids if f),
+            "trace_id": trace_id or None,
+            "uploaded_at": uploaded_at,
+        })
+        headers = {"Content-Type": "application/json"}
+        if trace_id:
+            # Continue the upload's trace so the callback's API logs carry the same ID
+            headers["traceparent"] = f"00-{trace_id}-{uuid.uuid4().hex[:16]}-01"
+        req = urllib.request.Request(
+            f"{api_base_url}/api/v1/documents/index-updated",
+            data=payload.encode("utf-8"),
+            headers=headers,
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=10) as resp:
+                print(f"Invalidated API search cache for org {org_id} ({resp.status})")
+        except Exception as e:
+            # The cache TTL bounds staleness if the callback fails
+            print(f"WARNING: Search cache invalidation failed for org {org_id}: {e}")
+
+# COMMAND ----------
+
 dbutils.notebook.exit(json.dumps({
     "status": "SUCCESS" if error_count == 0 else "PARTIAL_SUCCESS",
     "success_count": success_count,
     "error_count": error_count,
+    "deleted_count": deleted_count,
+    "trace_id": trace_id,
+    "upload_to_indexed_seconds": upload_to_indexed_s,
 }))
@@ -0,0 +1,121 @@
+"""Micro-benchmark for assemble_pages on synthetic Document Intelligence results.
+
+Compares utils.document_parsing.assemble_pages with the per-page scan over
+every paragraph that notebook 01 used before, and checks that both produce
+the same page text.
+
+Usage:
+    cd databricks
+    python scripts/benchmark_page_assembly.py --pages 1000 --paragraphs-per-page 40
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.document_parsing import assemble_pages
+
+
+def synthetic_result(pages: int, paragraphs_per_page: int, table_every: int) -> SimpleNamespace:
+    """A result shaped like AnalyzeResult: headings, body paragraphs, page-spanning paragraphs and tables."""
+    def region(page_number: int) -> SimpleNamespace:
+        return SimpleNamespace(page_number=page_number)
+
+    paragraphs = []
+    tables = []
+    for page_number in range(1, pages + 1):
+        for i in range(paragraphs_per_page):
+            regions = [region(page_number)]
+            if i == paragraphs_per_page - 1 and page_number < pages:
+                regions.append(region(page_number + 1))
+            paragraphs.append(SimpleNamespace(
+                content=f"Paragraph {i} on page {page_number}. " * 4,
+                role="sectionHeading" if i == 0 else None,
+                bounding_regions=regions,
+            ))
+        if table_every and page_number % table_every == 0:
+            tables.append(SimpleNamespace(
+                row_count=3,
+                column_count=2,
+                cells=[
+                    SimpleNamespace(row_index=r, column_index=c, kind=None, content=f"r{r}c{c}")
+                    for r in range(3) for c in range(2)
+                ],
+                bounding_regions=[region(page_number)],
+            ))
+
+    return SimpleNamespace(
+        pages=[SimpleNamespace(page_number=n) for n in range(1, pages + 1)],
+        paragraphs=paragraphs,
+        tables=tables,
+    )
+
+
+def assemble_pages_quadratic(result) -> list[dict]:
+    """The previous notebook 01 implementation: every page scans every paragraph."""
+    pages_data = []
+    for page in result.pages or []:
+        page_content = ""
+        page_layout = []
+        for paragraph in result.paragraphs or []:
+            if any(br.page_number == page.page_number for br in (paragraph.bounding_regions or [])):
+                page_content += paragraph.content + "\n"
+                page_layout.append({
+                    "content": paragraph.content,
+                    "role": getattr(paragraph, "role", None),
+                    "bounding_regions": [
+                        {"page_number": br.page_number}
+                        for br in (paragraph.bounding_regions or [])
+                    ],
+                })
+        pages_data.append({
+            "page_number": page.page_number,
+            "content": page_content.strip(),
+            "layout": page_layout,
+        })
+    return pages_data
+
+
+def time_runs(fn, result, runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn(result)
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark page assembly on synthetic Document Intelligence results")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--paragraphs-per-page", type=int, default=40)
+    parser.add_argument("--table-every", type=int, default=5, help="Add a table every N pages (0 = none)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--quadratic-runs", type=int, default=1, help="Runs of the old implementation (0 = skip)")
+    args = parser.parse_args()
+
+    result = synthetic_result(args.pages, args.paragraphs_per_page, args.table_every)
+    print(f"Synthetic result: {args.pages} pages, {len(result.paragraphs)} paragraphs, {len(result.tables)} tables")
+
+    linear = time_runs(assemble_pages, result, args.runs)
+    print(f"assemble_pages:       median {statistics.median(linear) * 1000:8.1f}ms over {args.runs} runs")
+
+    if args.quadratic_runs:
+        quadratic = time_runs(assemble_pages_quadratic, result, args.quadratic_runs)
+        print(f"previous (quadratic): median {statistics.median(quadratic) * 1000:8.1f}ms over {args.quadratic_runs} runs")
+        print(f"Speedup: {statistics.median(quadratic) / statistics.median(linear):.0f}x")
+
+        new_pages = assemble_pages(result)
+        old_pages = assemble_pages_quadratic(result)
+        if [p["content"] for p in new_pages] != [p["content"] for p in old_pages]:
+            sys.exit("Page text differs from the previous implementation")
+        print("Page text matches the previous implementation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Concurrent document parsing with Azure Document Intelligence.
+
+Each analyze operation spends most of its time waiting on the service, so
+documents are downloaded, submitted and polled in parallel on a bounded
+thread pool: at most max_concurrency analyze operations (and pollers) are in
+flight at once, which keeps a bulk upload within the resource's rate limits.
+Throttled requests (429), whether submitting or polling, are retried with
+Retry-After / exponential backoff.
+
+For large uploads, parse_blobs_on_executors spreads the same work across
+Spark executors with mapInPandas. The concurrency budget is split between
+the partitions, so the job as a whole still stays within max_concurrency.
+
+Parsed documents are returned as dicts with keys:
+  - document_name: str (blob name)
+  - content: str
+  - content_hash: str (sha256 of the blob bytes)
+  - pages: list[dict] (page_number, content, layout, content_hash)
+  - page_count: int
+"""
+
+import hashlib
+import json
+import math
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.ai.formrecognizer import AnalyzeResult, DocumentAnalysisClient
+from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError
+from azure.storage.blob import ContainerClient
+
+DEFAULT_MAX_CONCURRENCY = 8
+MAX_ANALYZE_ATTEMPTS = 6
+
+# Fewest documents worth shipping to an executor as one partition
+MIN_DOCUMENTS_PER_PARTITION = 10
+
+
+def _retry_after(error: HttpResponseError, attempt: int) -> float:
+    """Seconds to wait before retrying a throttled request."""
+    headers = error.response.headers if error.response is not None else {}
+    try:
+        return float(headers.get("Retry-After", ""))
+    except ValueError:
+        return min(60.0, 2.0 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def analyze_layout(
+    client: DocumentAnalysisClient,
+    data: bytes,
+    max_attempts: int = MAX_ANALYZE_ATTEMPTS,
+) -> AnalyzeResult:
+    """Run prebuilt-layout on a document, backing off when the service throttles.
+
+    A 429 while polling resumes the same operation from its continuation
+    token rather than submitting the document again.
+    """
+    continuation_token = None
+    for attempt in range(max_attempts):
+        try:
+            if continuation_token is None:
+                poller = client.begin_analyze_document("prebuilt-layout", document=data)
+                continuation_token = poller.continuation_token()
+            else:
+                poller = client.begin_analyze_document("prebuilt-layout", None, continuation_token=continuation_token)
+            return poller.result()
+        except HttpResponseError as e:
+            if e.status_code != 429 or attempt == max_attempts - 1:
+                raise
+            delay = _retry_after(e, attempt)
+            print(f"  Document Intelligence throttled, retrying in {delay:.1f}s")
+            time.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+def _page_numbers(element) -> list[int]:
+    """Distinct pages an element appears on, in order."""
+    return list(dict.fromkeys(br.page_number for br in (element.bounding_regions or [])))
+
+
+def _bounding_regions(element) -> list[dict]:
+    return [{"page_number": br.page_number} for br in (element.bounding_regions or [])]
+
+
+def _table_entry(table) -> dict:
+    return {
+        "kind": "table",
+        "row_count": table.row_count,
+        "column_count": table.column_count,
+        "cells": [
+            {
+                "row_index": cell.row_index,
+                "column_index": cell.column_index,
+                "row_span": getattr(cell, "row_span", None) or 1,
+                "column_span": getattr(cell, "column_span", None) or 1,
+                "kind": getattr(cell, "kind", None),
+                "content": cell.content,
+            }
+            for cell in table.cells or []
+        ],
+        "bounding_regions": _bounding_regions(table),
+    }
+
+
+def _figure_entry(figure) -> dict:
+    caption = getattr(figure, "caption", None)
+    return {
+        "kind": "figure",
+        "caption": caption.content if caption is not None else None,
+        "bounding_regions": _bounding_regions(figure),
+    }
+
+
+def assemble_pages(result: AnalyzeResult) -> list[dict]:
+    """Group the analyzed paragraphs, tables and figures by page.
+
+    Elements are bucketed by page number in one pass over each collection,
+    so the cost is linear in the size of the result. An element spanning
+    several pages is listed on each of them. Page text is built from the
+    paragraphs only: Document Intelligence already reports table cell text
+    as paragraphs, so table and figure entries carry no "content" and do not
+    duplicate text for the chunkers.
+    """
+    pages = result.pages or []
+    contents: dict[int, list[str]] = {page.page_number: [] for page in pages}
+    layouts: dict[int, list[dict]] = {page.page_number: [] for page in pages}
+
+    for paragraph in result.paragraphs or []:
+        entry = {
+            "content": paragraph.content,
+            "role": getattr(paragraph, "role", None),
+            "bounding_regions": _bounding_regions(paragraph),
+        }
+        for page_number in _page_numbers(paragraph):
+            if page_number in contents:
+                contents[page_number].append(paragraph.content)
+                layouts[page_number].append(entry)
+
+    # formrecognizer results have no figures; documentintelligence results do
+    for element, to_entry in [
+        *((table, _table_entry) for table in getattr(result, "tables", None) or []),
+        *((figure, _figure_entry) for figure in getattr(result, "figures", None) or []),
+    ]:
+        entry = to_entry(element)
+        for page_number in _page_numbers(element):
+            if page_number in layouts:
+                layouts[page_number].append(entry)
+
+    return [
+        {
+            "page_number": page.page_number,
+            "content": "\n".join(contents[page.page_number]).strip(),
+            "layout": layouts[page.page_number],
+        }
+        for page in pages
+    ]
+
+
+def page_hash(page: dict) -> str:
+    """sha256 of a page's text and layout, used to detect changed pages between versions."""
+    payload = json.dumps({"content": page["content"], "layout": page["layout"]}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def parse_document(name: str, data: bytes, client: DocumentAnalysisClient) -> dict:
+    """Parse one downloaded document (plain text directly, everything else via Document Intelligence)."""
+    if name.rsplit(".", 1)[-1].lower() == "txt":
+        content = data.decode("utf-8")
+        pages = [{"page_number": 1, "content": content, "layout": []}]
+    else:
+        pages = assemble_pages(analyze_layout(client, data))
+        content = "\n\n".join(p["content"] for p in pages if p["content"])
+
+    for page in pages:
+        page["content_hash"] = page_hash(page)
+
+    return {
+        "document_name": name,
+        "content": content,
+        "content_hash": hashlib.sha256(data).hexdigest(),
+        "pages": pages,
+        "page_count": len(pages),
+    }
+
+
+def parse_blobs(
+    container_client: ContainerClient,
+    client: DocumentAnalysisClient,
+    blob_names: list[str],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+) -> list[dict]:
+    """Download and parse blobs concurrently. Results are in blob_names order.
+
+    The first failure cancels the documents that have not started and is
+    raised once the running ones finish.
+    """
+    def download_and_parse(name: str) -> dict:
+        t0 = time.perf_counter()
+        data = container_client.download_blob(name).readall()
+        parsed = parse_document(name, data, client)
+        print(f"  Parsed {name}: {parsed['page_count']} pages in {time.perf_counter() - t0:.1f}s")
+        return parsed
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(blob_names))))
+    try:
+        futures = [executor.submit(download_and_parse, name) for name in blob_names]
+        return [future.result() for future in futures]
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def parse_blobs_on_executors(
+    spark,
+    blob_names: list[str],
+    container_name: str,
+    storage_connection_string: str,
+    document_intelligence_endpoint: str,
+    document_intelligence_key: str,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    num_partitions: int | None = None,
+) -> list[dict]:
+    """Parse blobs across Spark executors, each running parse_blobs on its share.
+
+    By default there is one partition per MIN_DOCUMENTS_PER_PARTITION
+    documents, at most max_concurrency of them. Each partition gets an equal
+    share of max_concurrency, so the executors together never have more
+    analyze operations in flight than a single-node run would. The partition
+    count comes only from the inputs: defaultParallelism is not available on
+    serverless or Spark Connect.
+
+    Executors cannot read Databricks secrets, so the connection details are
+    passed in. This module is pickled by value, so executors only need the
+    Azure SDKs installed, not the utils package. Results are in blob_names
+    order.
+    """
+    from pyspark import cloudpickle
+
+    cloudpickle.register_pickle_by_value(sys.modules[__name__])
+
+    partitions = num_partitions or math.ceil(len(blob_names) / MIN_DOCUMENTS_PER_PARTITION)
+    partitions = max(1, min(partitions, len(blob_names), max_concurrency))
+    partition_concurrency = max(1, max_concurrency // partitions)
+
+    def parse_partition(batches):
+        import pandas as pd
+        from azure.storage.blob import BlobServiceClient
+
+        container_client = BlobServiceClient.from_connection_string(
+            storage_connection_string
+        ).get_container_client(container_name)
+        client = DocumentAnalysisClient(
+            endpoint=document_intelligence_endpoint,
+            credential=AzureKeyCredential(document_intelligence_key),
+        )
+        for batch in batches:
+            parsed = parse_blobs(container_client, client, list(batch["document_name"]), partition_concurrency)
+            yield pd.DataFrame([
+                {
+                    "document_name": doc["document_name"],
+                    "content": doc["content"],
+                    "content_hash": doc["content_hash"],
+                    "pages_json": json.dumps(doc["pages"]),
+                    "page_count": doc["page_count"],
+                }
+                for doc in parsed
+            ])
+
+    names_df = spark.createDataFrame([(name,) for name in blob_names], "document_name string")
+    rows = (
+        names_df.repartition(partitions)
+        .mapInPandas(
+            parse_partition,
+            "document_name string, content string, content_hash string, pages_json string, page_count int",
+        )
+        .collect()
+    )
+
+    by_name = {
+        row["document_name"]: {
+            "document_name": row["document_name"],
+            "content": row["content"],
+            "content_hash": row["content_hash"],
+            "pages": json.loads(row["pages_json"]),
+            "page_count": row["page_count"],
+        }
+        for row in rows
+    }
+    return [by_name[name] for name in blob_names]
@@ -0,0 +1,75 @@
+"""
+Persistent embedding cache for the ingestion pipeline.
+
+A Delta table of embeddings keyed by the sha256 of the chunk text together
+with the embedding deployment and dimensions, so a vector is only reused for
+the model and size it was produced with. Re-uploads, overlapping windows and
+boilerplate pages shared between documents are embedded once.
+
+Rows are only ever appended; concurrent runs may add the same key twice,
+which is harmless since equal keys carry equal vectors.
+"""
+
+import hashlib
+
+import pyspark.sql.functions as F
+from pyspark.sql import SparkSession
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def ensure_cache_table(spark: SparkSession, table: str) -> None:
+    schema_name = table.rsplit(".", 1)[0]
+    spark.sql(f"CREATE SCHEMA IF NOT EXISTS {schema_name}")
+    spark.sql(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            content_hash STRING,
+            deployment STRING,
+            dimensions INT,
+            embedding ARRAY<DOUBLE>,
+            created_at TIMESTAMP
+        ) USING DELTA
+        """
+    )
+
+
+def lookup_embeddings(
+    spark: SparkSession,
+    table: str,
+    hashes: list[str],
+    deployment: str,
+    dimensions: int,
+) -> dict[str, list[float]]:
+    """Cached embeddings for the given content hashes (misses are simply absent)."""
+    if not hashes:
+        return {}
+    wanted = spark.createDataFrame([(h,) for h in set(hashes)], "content_hash string")
+    rows = (
+        spark.table(table)
+        .filter((F.col("deployment") == deployment) & (F.col("dimensions") == dimensions))
+        .join(wanted, "content_hash")
+        .dropDuplicates(["content_hash"])
+        .select("content_hash", "embedding")
+        .collect()
+    )
+    return {row["content_hash"]: list(row["embedding"]) for row in rows}
+
+
+def store_embeddings(
+    spark: SparkSession,
+    table: str,
+    embeddings: dict[str, list[float]],
+    deployment: str,
+    dimensions: int,
+) -> None:
+    """Append newly generated embeddings, keyed by content hash."""
+    if not embeddings:
+        return
+    df = spark.createDataFrame(
+        [(h, deployment, dimensions, [float(x) for x in emb]) for h, emb in embeddings.items()],
+        "content_hash string, deployment string, dimensions int, embedding array<double>",
+    ).withColumn("created_at", F.current_timestamp())
+    df.write.mode("append").saveAsTable(table)
@@ -0,0 +1,228 @@
+"""
+Concurrent, rate-limited embedding generation.
+
+Texts are packed into batches by token count (bounded by max_batch_tokens
+and max_batch_items) and several batches are sent at once. A token bucket
+limiter keeps the run inside the deployment's tokens-per-minute and
+requests-per-minute quotas. It is fed from the x-ratelimit-remaining-*
+headers of every response (read with a raw_response_hook), so the run slows
+down before Azure starts answering 429, and a 429's Retry-After pauses all
+workers. Failed batches are retried on their own with jittered exponential
+backoff; the batches that succeeded are kept.
+
+The SDK's own retry policy is disabled per call (retry_total=0) so throttling
+is handled here, where all workers can see it.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+from azure.ai.inference import EmbeddingsClient
+from azure.core.exceptions import HttpResponseError
+from azure.core.pipeline import PipelineResponse
+
+MAX_BACKOFF_SECONDS = 60.0
+
+
+class _Bucket:
+    """Token bucket refilled continuously at capacity per minute."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = per_minute
+        self.level = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until amount is available (amount is capped at capacity, so it always fits)."""
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+
+class RateLimiter:
+    """Token bucket limiter over tokens and requests per minute.
+
+    A limit of 0 disables that bucket; the limiter then relies on the
+    rate-limit headers and Retry-After alone.
+    """
+
+    def __init__(self, tokens_per_minute: int = 0, requests_per_minute: int = 0) -> None:
+        self._tokens = _Bucket(tokens_per_minute) if tokens_per_minute else None
+        self._requests = _Bucket(requests_per_minute) if requests_per_minute else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> None:
+        """Block until a request of the given token count fits within the limits."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                for bucket, amount in ((self._tokens, tokens), (self._requests, 1)):
+                    if bucket is not None:
+                        bucket.refill(now)
+                        wait = max(wait, bucket.wait_for(amount))
+                if wait <= 0:
+                    if self._tokens is not None:
+                        self._tokens.level -= min(tokens, self._tokens.capacity)
+                    if self._requests is not None:
+                        self._requests.level -= 1
+                    return
+            time.sleep(min(wait, 5.0))
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every worker for the given time (a 429's Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def observe(self, headers) -> None:
+        """Lower the buckets to what the service reports as remaining in its window."""
+        with self._lock:
+            now = time.monotonic()
+            for bucket, header in (
+                (self._tokens, "x-ratelimit-remaining-tokens"),
+                (self._requests, "x-ratelimit-remaining-requests"),
+            ):
+                remaining = _float_header(headers, header)
+                if bucket is not None and remaining is not None:
+                    bucket.refill(now)
+                    bucket.level = min(bucket.level, remaining)
+
+    def response_hook(self, response: PipelineResponse) -> None:
+        """raw_response_hook that feeds every response's rate-limit headers to the limiter."""
+        self.observe(response.http_response.headers)
+
+
+@dataclass
+class EmbeddingStats:
+    tokens: int = 0
+    requests: int = 0
+    retries: int = 0
+    throttled: int = 0
+    elapsed_s: float = 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.elapsed_s if self.elapsed_s else 0.0
+
+
+def _float_header(headers, name: str) -> float | None:
+    try:
+        return float(headers.get(name, ""))
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_after(error: HttpResponseError) -> float | None:
+    """Retry-After of a throttled response, in seconds."""
+    if error.response is None:
+        return None
+    headers = error.response.headers
+    retry_after_ms = _float_header(headers, "retry-after-ms")
+    if retry_after_ms is not None:
+        return retry_after_ms / 1000.0
+    return _float_header(headers, "retry-after")
+
+
+def pack_batches(
+    token_counts: list[int],
+    max_batch_tokens: int,
+    max_batch_items: int,
+) -> list[list[int]]:
+    """Group item indices, in order, into batches within both the token and item limits.
+
+    An item larger than max_batch_tokens gets a batch of its own.
+    """
+    batches: list[list[int]] = []
+    current: list[int] = []
+    current_tokens = 0
+    for i, n in enumerate(token_counts):
+        if current and (current_tokens + n > max_batch_tokens or len(current) >= max_batch_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+def embed_texts(
+    client: EmbeddingsClient,
+    texts: list[str],
+    count_tokens: Callable[[str], int],
+    expected_dims: int,
+    limiter: RateLimiter,
+    max_batch_tokens: int = 32000,
+    max_batch_items: int = 100,
+    max_concurrency: int = 4,
+    max_retries: int = 5,
+) -> tuple[list[list[float]], EmbeddingStats]:
+    """Embed texts concurrently. Returns the embeddings in input order and run statistics.
+
+    A batch that still fails after max_retries raises; batches not yet
+    started are cancelled.
+    """
+    token_counts = [count_tokens(text) for text in texts]
+    batches = pack_batches(token_counts, max_batch_tokens, max_batch_items)
+    results: list[list[float] | None] = [None] * len(texts)
+    stats = EmbeddingStats()
+    stats_lock = threading.Lock()
+
+    def run_batch(batch_idx: int, indices: list[int]) -> None:
+        batch_tokens = sum(token_counts[i] for i in indices)
+        for attempt in range(max_retries + 1):
+            limiter.acquire(batch_tokens)
+            try:
+                response = client.embed(
+                    input=[texts[i] for i in indices],
+                    raw_response_hook=limiter.response_hook,
+                    retry_total=0,
+                )
+                embeddings = [item.embedding for item in response.data]
+                for emb in embeddings:
+                    if len(emb) != expected_dims:
+                        raise ValueError(f"Expected {expected_dims} dimensions, got {len(emb)}")
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+                backoff = min(MAX_BACKOFF_SECONDS, 2.0 ** attempt) * random.uniform(0.5, 1.5)
+                throttled = isinstance(e, HttpResponseError) and e.status_code == 429
+                if throttled:
+                    retry_after = _retry_after(e)
+                    if retry_after is not None:
+                        backoff = retry_after + random.uniform(0, 1)
+                    limiter.pause(backoff)
+                with stats_lock:
+                    stats.retries += 1
+                    stats.throttled += int(throttled)
+                print(f"  Batch {batch_idx + 1}: retry {attempt + 1}/{max_retries} after {backoff:.1f}s: {str(e)[:100]}")
+                time.sleep(backoff)
+                continue
+
+            for i, emb in zip(indices, embeddings):
+                results[i] = emb
+            with stats_lock:
+                stats.tokens += batch_tokens
+                stats.requests += 1
+            return
+
+    t0 = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(batches))))
+    try:
+        futures = [executor.submit(run_batch, idx, indices) for idx, indices in enumerate(batches)]
+        for future in futures:
+            future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    stats.elapsed_s = time.perf_counter() - t0
+
+    return results, stats
@@ -0,0 +1,127 @@
+"""
+Content-hash helpers for incremental ingestion.
+
+The API stores each upload's sha256 in the blob metadata (content_sha256).
+Once a version is fully indexed, the indexing task records its hash and the
+chunking settings it was chunked with (indexed_sha256, indexed_chunking).
+From that:
+  - the parsing task skips blobs whose content is already indexed
+  - the chunking task compares per-page hashes with the indexed version and
+    only re-chunks the pages that changed (when the chunking settings match)
+  - the indexing task deletes the chunks of changed or removed pages that the
+    new version no longer produces
+
+Page-based strategies give chunks page-scoped IDs ({doc_id}_chunk_p{page}_{n}),
+so the indexing task can tell which page an existing index entry belongs to.
+"""
+
+import re
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+from azure.storage.blob import ContainerClient
+
+CONTENT_HASH_METADATA = "content_sha256"
+INDEXED_HASH_METADATA = "indexed_sha256"
+INDEXED_CHUNKING_METADATA = "indexed_chunking"
+
+# Strategies whose chunks never span pages, so pages can be re-chunked independently
+PAGE_BASED_STRATEGIES = {"semantic", "sliding_window"}
+
+# chunk_index of page-scoped chunks is page_number * PAGE_CHUNK_STRIDE + n, so it
+# stays stable when other pages change and stays consecutive within a page
+PAGE_CHUNK_STRIDE = 1000
+
+_PAGE_CHUNK_ID = re.compile(r"_chunk_p(\d+)_\d+$")
+
+
+def is_unchanged(metadata: dict | None) -> bool:
+    """Whether blob metadata says the current content is already indexed."""
+    metadata = metadata or {}
+    content_hash = metadata.get(CONTENT_HASH_METADATA)
+    return bool(content_hash) and content_hash == metadata.get(INDEXED_HASH_METADATA)
+
+
+def chunking_signature(strategy: str, max_tokens: int, overlap_tokens: int) -> str:
+    """Identifies the chunking settings; chunks are only reused across runs with the same signature."""
+    return f"{strategy}:{max_tokens}:{overlap_tokens}"
+
+
+def page_chunk_id(document_id: str, page_number: int, n: int) -> str:
+    return f"{document_id}_chunk_p{page_number}_{n}"
+
+
+def page_chunk_index(page_number: int, n: int) -> int:
+    return page_number * PAGE_CHUNK_STRIDE + n
+
+
+def chunk_id_page(chunk_id: str) -> int | None:
+    """Page number of a page-scoped chunk ID, None for document-wide IDs."""
+    match = _PAGE_CHUNK_ID.search(chunk_id)
+    return int(match.group(1)) if match else None
+
+
+def changed_pages(pages: list[dict], previous_pages: list[dict]) -> list[int]:
+    """Page numbers that differ from the previous version, including pages it had that are now gone."""
+    previous = {p["page_number"]: p.get("content_hash") for p in previous_pages}
+    current = {p["page_number"] for p in pages}
+    changed = [
+        p["page_number"] for p in pages
+        if not p.get("content_hash") or previous.get(p["page_number"]) != p["content_hash"]
+    ]
+    removed = [n for n in previous if n not in current]
+    return sorted(changed + removed)
+
+
+def stale_chunk_ids(
+    existing_ids: list[str],
+    new_ids: set[str],
+    changed: list[int] | None,
+) -> list[str]:
+    """Index entries of a document that its new version no longer produces.
+
+    changed=None means the document was re-chunked in full, so every entry
+    not in new_ids is stale. Otherwise only entries of the changed pages
+    (and any document-wide IDs) are; the other pages were left as they were.
+    """
+    if changed is None:
+        return [cid for cid in existing_ids if cid not in new_ids]
+    changed_set = set(changed)
+    stale = []
+    for cid in existing_ids:
+        if cid in new_ids:
+            continue
+        page = chunk_id_page(cid)
+        if page is None or page in changed_set:
+            stale.append(cid)
+    return stale
+
+
+def mark_indexed(
+    container_client: ContainerClient,
+    blob_name: str,
+    etag: str,
+    content_hash: str,
+    chunking: str,
+) -> bool:
+    """Record in the blob metadata that its content is indexed.
+
+    Conditional on the etag seen at parse time, so a version uploaded while the
+    job ran is never marked as indexed. Returns False if the blob changed or is gone.
+    """
+    blob_client = container_client.get_blob_client(blob_name)
+    try:
+        properties = blob_client.get_blob_properties(etag=etag, match_condition=MatchConditions.IfNotModified)
+        blob_client.set_blob_metadata(
+            {
+                **(properties.metadata or {}),
+                CONTENT_HASH_METADATA: content_hash,
+                INDEXED_HASH_METADATA: content_hash,
+                INDEXED_CHUNKING_METADATA: chunking,
+            },
+            etag=etag,
+            match_condition=MatchConditions.IfNotModified,
+        )
+    except (ResourceModifiedError, ResourceNotFoundError):
+        return False
+    return True
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""RAG Load Test
+
+Drives /chat/stream and/or /chat/query concurrently and reports latency
+percentiles (p50/p95/p99) and throughput. Streamed responses are parsed as
+SSE so time to first token and inter-token latency (gap between chunk
+events) are measured as the browser sees them.
+
+Two load models:
+  - closed loop (default): --concurrency workers each send the next request
+    as soon as their previous one finishes
+  - open loop (--rate): requests arrive as a Poisson process at --rate per
+    second, at most --concurrency in flight; latency is measured from the
+    scheduled arrival, so queueing behind a slow API is not hidden
+
+Questions are taken round-robin from the evaluation test set. Results are
+saved to evaluation/results/load_<timestamp>.json. With --max-p95-ms,
+--max-ttft-p95-ms or --max-error-rate the exit code is 1 when a threshold is
+exceeded, for CI. Run against evaluation/mock_services.py to test without
+Azure.
+
+Usage:
+    uv run --project evaluation evaluation/load_test.py \
+        [--api-url http://localhost:4001] \
+        [--org-id <organization_id>] [--folder-id <folder_id>] \
+        [--route stream|query|mixed] \
+        [--concurrency 8] [--rate 0] \
+        [--requests 200] [--warmup 5] \
+        [--semantic | --no-semantic]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+ROUTES = ("stream", "query")
+
+# ---------------------------------------------------------------------------
+# Measurements
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class RequestResult:
+    route: str
+    ok: bool
+    status: int
+    latency_s: float
+    ttft_s: float | None = None
+    inter_token_s: list[float] = field(default_factory=list)
+    chunk_events: int = 0
+    trace_id: str | None = None
+    error: str | None = None
+
+
+def percentile(values: list[float], p: float) -> float:
+    """p-th percentile (0-100) with linear interpolation between closest ranks."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def distribution_ms(values: list[float]) -> dict:
+    return {
+        "p50": round(percentile(values, 50) * 1000, 1),
+        "p95": round(percentile(values, 95) * 1000, 1),
+        "p99": round(percentile(values, 99) * 1000, 1),
+        "max": round(max(values) * 1000, 1) if values else 0.0,
+    }
+
+
+def summarize(results: list[RequestResult], wall_s: float) -> dict:
+    ok = [r for r in results if r.ok]
+    ttfts = [r.ttft_s for r in ok if r.ttft_s is not None]
+    gaps = [gap for r in ok for gap in r.inter_token_s]
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        "throughput_rps": round(len(ok) / wall_s, 2) if wall_s else 0.0,
+        "latency_ms": distribution_ms([r.latency_s for r in ok]),
+        "ttft_ms": distribution_ms(ttfts) if ttfts else None,
+        "inter_token_ms": distribution_ms(gaps) if gaps else None,
+        "chunk_events_per_s": round(sum(r.chunk_events for r in ok) / wall_s, 1) if wall_s else 0.0,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Requests
+# ---------------------------------------------------------------------------
+
+
+def build_payload(args: argparse.Namespace, question: str) -> dict:
+    payload = {
+        "query": question,
+        "organization_id": args.org_id,
+        "conversation_history": [],
+        "filters": {"folder_ids": [args.folder_id] if args.folder_id else []},
+        "top_k": args.top_k,
+    }
+    if args.semantic is not None:
+        payload["use_semantic_search"] = args.semantic
+    return payload
+
+
+async def run_stream(client: httpx.AsyncClient, url: str, payload: dict, t_start: float) -> RequestResult:
+    result = RequestResult(route="stream", ok=False, status=0, latency_s=0.0)
+    last_chunk_at = None
+    async with client.stream("POST", f"{url}/api/v1/chat/stream", json=payload) as response:
+        result.status = response.status_code
+        if response.status_code != 200:
+            await response.aread()
+            result.error = response.text[:200]
+            result.latency_s = time.perf_counter() - t_start
+            return result
+
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            now = time.perf_counter()
+            if event.get("type") == "chunk":
+                if last_chunk_at is None:
+                    result.ttft_s = now - t_start
+                else:
+                    result.inter_token_s.append(now - last_chunk_at)
+                last_chunk_at = now
+                result.chunk_events += 1
+            elif event.get("type") == "done":
+                result.trace_id = event.get("trace_id")
+                result.ok = True
+
+    result.latency_s = time.perf_counter() - t_start
+    if not result.ok:
+        result.error = "stream ended without a done event"
+    return result
+
+
+async def run_query(client: httpx.AsyncClient, url: str, payload: dict, t_start: float) -> RequestResult:
+    response = await client.post(f"{url}/api/v1/chat/query", json=payload)
+    result = RequestResult(
+        route="query",
+        ok=response.status_code == 200,
+        status=response.status_code,
+        latency_s=time.perf_counter() - t_start,
+        trace_id=response.headers.get("x-trace-id"),
+    )
+    if not result.ok:
+        result.error = response.text[:200]
+    return result
+
+
+async def run_one(
+    client: httpx.AsyncClient,
+    args: argparse.Namespace,
+    route: str,
+    question: str,
+    t_start: float,
+) -> RequestResult:
+    payload = build_payload(args, question)
+    try:
+        if route == "stream":
+            return await run_stream(client, args.api_url, payload, t_start)
+        return await run_query(client, args.api_url, payload, t_start)
+    except Exception as e:
+        return RequestResult(
+            route=route, ok=False, status=0, latency_s=time.perf_counter() - t_start, error=repr(e)[:200]
+        )
+
+
+def plan_requests(args: argparse.Namespace, questions: list[str]) -> list[tuple[str, str]]:
+    """(route, question) for every request, warm-up requests first."""
+    total = args.warmup + args.requests
+    routes = ROUTES if args.route == "mixed" else (args.route,)
+    return [(routes[i % len(routes)], questions[i % len(questions)]) for i in range(total)]
+
+
+async def run_closed_loop(client, args, plan) -> list[RequestResult]:
+    results: list[RequestResult | None] = [None] * len(plan)
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index
+        while next_index < len(plan):
+            i = next_index
+            next_index += 1
+            route, question = plan[i]
+            results[i] = await run_one(client, args, route, question, time.perf_counter())
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return results
+
+
+async def run_open_loop(client, args, plan) -> list[RequestResult]:
+    in_flight = asyncio.Semaphore(args.concurrency)
+    rng = random.Random(args.seed)
+
+    async def scheduled(route: str, question: str, arrival: float) -> RequestResult:
+        async with in_flight:
+            return await run_one(client, args, route, question, arrival)
+
+    tasks = []
+    next_arrival = time.perf_counter()
+    for route, question in plan:
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(scheduled(route, question, next_arrival)))
+        next_arrival += rng.expovariate(args.rate)
+    return list(await asyncio.gather(*tasks))
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+
+def print_report(summary: dict) -> None:
+    def fmt(dist: dict | None) -> str:
+        if not dist:
+            return "-"
+        return f"{dist['p50']:>8.0f} {dist['p95']:>8.0f} {dist['p99']:>8.0f}"
+
+    print()
+    print(f"{'Route':<8} {'Reqs':>5} {'Errors':>6} {'RPS':>7}   "
+          f"{'Latency p50/p95/p99 ms':>26}   {'TTFT p50/p95/p99 ms':>26}   {'ITL p50/p95/p99 ms':>26}")
+    print("-" * 120)
+    for route, s in summary.items():
+        print(
+            f"{route:<8} {s['requests']:>5} {s['errors']:>6} {s['throughput_rps']:>7.2f}   "
+            f"{fmt(s['latency_ms']):>26}   {fmt(s['ttft_ms']):>26}   {fmt(s['inter_token_ms']):>26}"
+        )
+
+
+def check_thresholds(args: argparse.Namespace, overall: dict) -> list[str]:
+    failures = []
+    if args.max_p95_ms is not None and overall["latency_ms"]["p95"] > args.max_p95_ms:
+        failures.append(f"latency p95 {overall['latency_ms']['p95']}ms > {args.max_p95_ms}ms")
+    ttft = overall["ttft_ms"]
+    if args.max_ttft_p95_ms is not None and ttft and ttft["p95"] > args.max_ttft_p95_ms:
+        failures.append(f"TTFT p95 {ttft['p95']}ms > {args.max_ttft_p95_ms}ms")
+    if args.max_error_rate is not None and overall["error_rate"] > args.max_error_rate:
+        failures.append(f"error rate {overall['error_rate']} > {args.max_error_rate}")
+    return failures
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="RAG load test")
+    parser.add_argument("--api-url", default="http://localhost:4001", help="API base URL")
+    parser.add_argument("--org-id", default="loadtest-org", help="Organization ID")
+    parser.add_argument("--folder-id", default="", help="Folder ID filter (empty = none)")
+    parser.add_argument("--route", choices=["stream", "query", "mixed"], default="stream")
+    parser.add_argument("--concurrency", type=int, default=8, help="Workers, or max in flight with --rate")
+    parser.add_argument("--rate", type=float, default=0.0, help="Open-loop arrivals per second (0 = closed loop)")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests")
+    parser.add_argument("--warmup", type=int, default=5, help="Requests sent first and left out of the report")
+    parser.add_argument("--top-k", type=int, default=10)
+    semantic = parser.add_mutually_exclusive_group()
+    semantic.add_argument("--semantic", dest="semantic", action="store_true", default=None)
+    semantic.add_argument("--no-semantic", dest="semantic", action="store_false")
+    parser.add_argument(
+        "--test-set",
+        default=str(Path(__file__).resolve().parent / "test_set.json"),
+        help="Questions to send (round-robin)",
+    )
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for open-loop arrivals")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="Fail if latency p95 exceeds this")
+    parser.add_argument("--max-ttft-p95-ms", type=float, default=None, help="Fail if TTFT p95 exceeds this")
+    parser.add_argument("--max-error-rate", type=float, default=None, help="Fail if the error rate exceeds this")
+    args = parser.parse_args()
+
+    questions = [q["question"] for q in json.loads(Path(args.test_set).read_text())["questions"]]
+    plan = plan_requests(args, questions)
+    mode = f"open loop at {args.rate}/s" if args.rate > 0 else "closed loop"
+    print(f"Load test: {args.requests} requests (+{args.warmup} warm-up), route={args.route}, "
+          f"concurrency={args.concurrency}, {mode}, api={args.api_url}")
+
+    async def run() -> tuple[list[RequestResult], float]:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+            if args.warmup:
+                warmup_args = argparse.Namespace(**{**vars(args), "concurrency": min(args.concurrency, args.warmup)})
+                await run_closed_loop(client, warmup_args, plan[: args.warmup])
+            measured = plan[args.warmup:]
+            t0 = time.perf_counter()
+            if args.rate > 0:
+                results = await run_open_loop(client, args, measured)
+            else:
+                results = await run_closed_loop(client, args, measured)
+            return results, time.perf_counter() - t0
+
+    results, wall_s = asyncio.run(run())
+
+    summary = {
+        route: summarize([r for r in results if r.route == route], wall_s)
+        for route in ROUTES
+        if any(r.route == route for r in results)
+    }
+    overall = summarize(results, wall_s)
+    if len(summary) > 1:
+        summary["all"] = overall
+    print_report(summary)
+
+    errors = [r for r in results if not r.ok]
+    for r in errors[:5]:
+        print(f"  {r.route} error (status {r.status}): {r.error}")
+
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    results_dir = Path(__file__).resolve().parent / "results"
+    results_dir.mkdir(exist_ok=True)
+    output_path = results_dir / f"load_{timestamp}.json"
+    output = {
+        "metadata": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "api_url": args.api_url,
+            "route": args.route,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "semantic": args.semantic,
+            "wall_seconds": round(wall_s, 2),
+        },
+        "summary": summary,
+        "results": [
+            {**asdict(r), "inter_token_s": [round(g, 4) for g in r.inter_token_s]} for r in results
+        ],
+    }
+    with open(output_path, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"\nResults saved to {output_path}")
+
+    failures = check_thresholds(args, overall)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
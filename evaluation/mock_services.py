@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""Local stand-ins for AI Foundry, Azure AI Search and Blob Storage
+
+Serves just enough of each REST API for the chat and document routes to run
+end to end without Azure, with a configurable latency profile, so the load
+test (evaluation/load_test.py) can catch latency and throughput regressions
+in CI. Answers are synthetic; only the timing is meant to be realistic.
+
+Usage:
+    uv run --project evaluation evaluation/mock_services.py \
+        [--port 4010] \
+        [--profile fast|typical|slow] \
+        [--error-rate 0.0]
+
+Then start the API against it with the environment printed at startup:
+    AZURE_AI_MODELS_ENDPOINT=http://127.0.0.1:4010/models
+    AZURE_AI_API_KEY=mock
+    AZURE_SEARCH_ENDPOINT=http://127.0.0.1:4010
+    AZURE_SEARCH_API_KEY=mock
+    AZURE_STORAGE_CONNECTION_STRING=<mock Blob connection string>
+    AZURE_AI_RESOURCE_NAME=  (empty: no Entra ID token refresh)
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+
+from aiohttp import web
+
+# ---------------------------------------------------------------------------
+# Latency profiles
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class LatencyProfile:
+    embed_ms: float
+    search_ms: float
+    rewrite_ms: float
+    ttft_ms: float
+    token_ms: float
+    answer_tokens: int
+    blob_ms: float
+    # Each latency is scaled by a uniform factor in [1 - jitter, 1 + jitter]
+    jitter: float
+    # Share of calls that take tail_factor times longer (simulates service-side spikes)
+    tail_rate: float
+    tail_factor: float
+
+
+PROFILES = {
+    # CI: fast enough for a few hundred requests per run, still exercises every stage
+    "fast": LatencyProfile(
+        embed_ms=5, search_ms=8, rewrite_ms=15, ttft_ms=30, token_ms=2, answer_tokens=60,
+        blob_ms=5, jitter=0.1, tail_rate=0.0, tail_factor=1.0,
+    ),
+    # Roughly what the Azure services do in the same region
+    "typical": LatencyProfile(
+        embed_ms=80, search_ms=120, rewrite_ms=400, ttft_ms=600, token_ms=25, answer_tokens=250,
+        blob_ms=40, jitter=0.3, tail_rate=0.02, tail_factor=5.0,
+    ),
+    # Busy deployments / cross-region
+    "slow": LatencyProfile(
+        embed_ms=250, search_ms=400, rewrite_ms=1200, ttft_ms=2000, token_ms=60, answer_tokens=400,
+        blob_ms=150, jitter=0.5, tail_rate=0.05, tail_factor=4.0,
+    ),
+}
+
+EMBEDDING_DIMENSIONS = 3072
+BLOB_ACCOUNT_NAME = "devstoreaccount1"
+# Shared key signing needs a base64 key; the mock never checks it
+BLOB_ACCOUNT_KEY = "bW9jay1zdG9yYWdlLWFjY291bnQta2V5LW5vdC1hLXNlY3JldA=="
+
+_LATEST_MESSAGE_PATTERN = re.compile(r"Latest message: (.*)\Z", re.DOTALL)
+
+_WORDS = (
+    "revenue grew across all segments driven by higher services sales while operating margin "
+    "expanded as the company reduced costs and increased investment in research and development"
+).split()
+
+
+class MockServices:
+    def __init__(self, profile: LatencyProfile, error_rate: float) -> None:
+        self.profile = profile
+        self.error_rate = error_rate
+        self.blobs: dict[str, tuple[int, datetime, dict[str, str]]] = {}
+        self.calls: dict[str, int] = {}
+
+    async def delay(self, base_ms: float) -> None:
+        p = self.profile
+        factor = random.uniform(1 - p.jitter, 1 + p.jitter)
+        if p.tail_rate and random.random() < p.tail_rate:
+            factor *= p.tail_factor
+        await asyncio.sleep(base_ms * factor / 1000)
+
+    def throttled(self, name: str) -> web.Response | None:
+        """Count the call and, at --error-rate, answer 429 the way Azure does."""
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.error_rate and random.random() < self.error_rate:
+            return web.json_response(
+                {"error": {"code": "429", "message": "Rate limit is exceeded (mock)."}},
+                status=429,
+                headers={"Retry-After": "1"},
+            )
+        return None
+
+    # -- AI Foundry -----------------------------------------------------------
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        if (error := self.throttled("embeddings")) is not None:
+            return error
+        body = await request.json()
+        texts = body.get("input", [])
+        await self.delay(self.profile.embed_ms)
+        return web.json_response({
+            "id": "mock-embeddings",
+            "object": "list",
+            "model": body.get("model", "mock-embedding"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": _vector(text)}
+                for i, text in enumerate(texts)
+            ],
+            "usage": {"prompt_tokens": sum(len(t.split()) for t in texts), "total_tokens": 0},
+        })
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        if (error := self.throttled("chat")) is not None:
+            return error
+        body = await request.json()
+        model = body.get("model", "mock-chat")
+
+        # Rewrite calls are the only ones sent with max_completion_tokens
+        if "max_completion_tokens" in body:
+            await self.delay(self.profile.rewrite_ms)
+            return web.json_response(_completion(model, _latest_message(body["messages"])))
+
+        tokens = _answer_tokens(self.profile.answer_tokens)
+        if not body.get("stream"):
+            await self.delay(self.profile.ttft_ms + self.profile.token_ms * len(tokens))
+            return web.json_response(_completion(model, "".join(tokens)))
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await self.delay(self.profile.ttft_ms)
+        for i, token in enumerate(tokens):
+            if i:
+                await self.delay(self.profile.token_ms)
+            chunk = {
+                "id": "mock-chat",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"role": "assistant", "content": token}, "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    # -- Azure AI Search ------------------------------------------------------
+
+    async def search(self, request: web.Request) -> web.Response:
+        if (error := self.throttled("search")) is not None:
+            return error
+        body = await request.json()
+        top = body.get("top") or 5
+        await self.delay(self.profile.search_ms)
+        organization_id = _filter_value(body.get("filter", ""), "organization_id") or "mock-org"
+        return web.json_response({
+            "value": [_search_document(i, organization_id) for i in range(top)],
+        })
+
+    async def index_documents(self, request: web.Request) -> web.Response:
+        if (error := self.throttled("search")) is not None:
+            return error
+        body = await request.json()
+        await self.delay(self.profile.search_ms)
+        return web.json_response({
+            "value": [
+                {"key": doc.get("id"), "status": True, "errorMessage": None, "statusCode": 200}
+                for doc in body.get("value", [])
+            ],
+        })
+
+    # -- Blob Storage ---------------------------------------------------------
+
+    async def put_blob(self, request: web.Request) -> web.Response:
+        if (error := self.throttled("blob")) is not None:
+            return error
+        data = await request.read()
+        await self.delay(self.profile.blob_ms)
+        now = datetime.now(timezone.utc)
+        metadata = {k: v for k, v in request.headers.items() if k.lower().startswith("x-ms-meta-")}
+        key = _blob_key(request)
+        # Put Blob and Set Blob Metadata both replace the metadata wholesale, as in Azure
+        if request.query.get("comp") == "metadata":
+            if key not in self.blobs:
+                return web.Response(status=404, headers={"x-ms-error-code": "BlobNotFound"})
+            size, modified, _ = self.blobs[key]
+            if request.headers.get("If-Match", _etag(modified)) != _etag(modified):
+                return web.Response(status=412, headers={"x-ms-error-code": "ConditionNotMet"})
+            self.blobs[key] = (size, now, metadata)
+            return web.Response(status=200, headers={
+                "ETag": _etag(now),
+                "Last-Modified": format_datetime(now, usegmt=True),
+            })
+        self.blobs[key] = (len(data), now, metadata)
+        return web.Response(status=201, headers={
+            "ETag": _etag(now),
+            "Last-Modified": format_datetime(now, usegmt=True),
+            "x-ms-request-server-encrypted": "true",
+        })
+
+    async def delete_blob(self, request: web.Request) -> web.Response:
+        if (error := self.throttled("blob")) is not None:
+            return error
+        await self.delay(self.profile.blob_ms)
+        if self.blobs.pop(_blob_key(request), None) is None:
+            return web.Response(status=404, headers={"x-ms-error-code": "BlobNotFound"})
+        return web.Response(status=202)
+
+    async def blob_properties(self, request: web.Request) -> web.Response:
+        if (error := self.throttled("blob")) is not None:
+            return error
+        await self.delay(self.profile.blob_ms)
+        blob = self.blobs.get(_blob_key(request))
+        if blob is None:
+            return web.Response(status=404, headers={"x-ms-error-code": "BlobNotFound"})
+        size, modified, metadata = blob
+        if request.headers.get("If-Match", _etag(modified)) != _etag(modified):
+            return web.Response(status=412, headers={"x-ms-error-code": "ConditionNotMet"})
+        return web.Response(status=200, headers={
+            "Content-Length": str(size),
+            "ETag": _etag(modified),
+            "Last-Modified": format_datetime(modified, usegmt=True),
+            "x-ms-blob-type": "BlockBlob",
+            **metadata,
+        })
+
+    async def list_blobs(self, request: web.Request) -> web.Response:
+        if (error := self.throttled("blob")) is not None:
+            return error
+        await self.delay(self.profile.blob_ms)
+        container = request.match_info["container"]
+        prefix = f"{container}/{request.query.get('prefix', '')}"
+        entries = []
+        for key, (size, modified, _) in sorted(self.blobs.items()):
+            if not key.startswith(prefix):
+                continue
+            entries.append(
+                f"<Blob><Name>{escape(key.split('/', 1)[1])}</Name><Properties>"
+                f"<Last-Modified>{format_datetime(modified, usegmt=True)}</Last-Modified>"
+                f"<Content-Length>{size}</Content-Length><BlobType>BlockBlob</BlobType>"
+                f"</Properties></Blob>"
+            )
+        xml = (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            f'<EnumerationResults ContainerName="{escape(container)}">'
+            f"<Blobs>{''.join(entries)}</Blobs><NextMarker /></EnumerationResults>"
+        )
+        return web.Response(text=xml, content_type="application/xml")
+
+    # -- Misc -----------------------------------------------------------------
+
+    async def head(self, request: web.Request) -> web.Response:
+        # Connection warm-up sends HEAD to each endpoint; any response will do
+        return web.Response(status=200)
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"calls": self.calls, "blobs": len(self.blobs)})
+
+
+def _vector(text: str) -> list[float]:
+    """Deterministic pseudo-embedding, so identical texts get identical vectors."""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+    rng = random.Random(seed)
+    return [rng.uniform(-1, 1) for _ in range(EMBEDDING_DIMENSIONS)]
+
+
+def _answer_tokens(count: int) -> list[str]:
+    tokens = []
+    for i in range(count):
+        word = _WORDS[i % len(_WORDS)]
+        tokens.append(word + (" [1]. " if i % 25 == 24 else " "))
+    return tokens
+
+
+def _latest_message(messages: list[dict]) -> str:
+    content = messages[-1].get("content", "") if messages else ""
+    match = _LATEST_MESSAGE_PATTERN.search(content)
+    return (match.group(1) if match else content).strip()
+
+
+def _completion(model: str, content: str) -> dict:
+    return {
+        "id": "mock-chat",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": 0,
+            "completion_tokens": len(content.split()),
+            "total_tokens": len(content.split()),
+        },
+    }
+
+
+def _filter_value(odata_filter: str, field: str) -> str | None:
+    match = re.search(rf"{field} eq '([^']*)'", odata_filter)
+    return match.group(1) if match else None
+
+
+def _search_document(i: int, organization_id: str) -> dict:
+    return {
+        "@search.score": round(1.0 / (i + 1), 4),
+        "@search.rerankerScore": round(3.5 - i * 0.2, 4),
+        "id": f"mock-doc_chunk_{i}",
+        "content": f"Mock chunk {i}. " + " ".join(_WORDS),
+        "document_id": "mock-doc",
+        "document_name": "mock-report.pdf",
+        "document_url": "http://127.0.0.1/mock-report.pdf",
+        "page_number": i + 1,
+        "chunk_index": i,
+        "metadata": "{}",
+        "organization_id": organization_id,
+        "folder_id": "mock-folder",
+    }
+
+
+def _blob_key(request: web.Request) -> str:
+    return f"{request.match_info['container']}/{request.match_info['blob']}"
+
+
+def _etag(modified: datetime) -> str:
+    """ETag of a blob version, derived from its last-modified time."""
+    return f'"0x{int(modified.timestamp() * 1_000_000):X}"'
+
+
+def build_app(services: MockServices) -> web.Application:
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.add_routes([
+        web.post("/models/embeddings", services.embeddings),
+        web.post("/models/chat/completions", services.chat_completions),
+        web.post(r"/indexes('{index}')/docs/search.post.search", services.search),
+        web.post(r"/indexes('{index}')/docs/search.index", services.index_documents),
+        web.get(f"/{BLOB_ACCOUNT_NAME}/{{container}}", services.list_blobs),
+        web.put(f"/{BLOB_ACCOUNT_NAME}/{{container}}/{{blob:.+}}", services.put_blob),
+        web.delete(f"/{BLOB_ACCOUNT_NAME}/{{container}}/{{blob:.+}}", services.delete_blob),
+        web.route("HEAD", f"/{BLOB_ACCOUNT_NAME}/{{container}}/{{blob:.+}}", services.blob_properties),
+        web.get("/mock/stats", services.stats),
+        web.route("HEAD", "/{tail:.*}", services.head),
+    ])
+    return app
+
+
+def api_environment(host: str, port: int) -> dict[str, str]:
+    """Environment that points the API at the mock services."""
+    base = f"http://{host}:{port}"
+    return {
+        "AZURE_AI_MODELS_ENDPOINT": f"{base}/models",
+        "AZURE_AI_API_KEY": "mock",
+        "AZURE_AI_RESOURCE_NAME": "",
+        "AZURE_SEARCH_ENDPOINT": base,
+        "AZURE_SEARCH_API_KEY": "mock",
+        "AZURE_STORAGE_CONNECTION_STRING": (
+            f"DefaultEndpointsProtocol=http;AccountName={BLOB_ACCOUNT_NAME};"
+            f"AccountKey={BLOB_ACCOUNT_KEY};BlobEndpoint={base}/{BLOB_ACCOUNT_NAME};"
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local AI Foundry / Search / Blob stand-ins")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4010)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="typical")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with 429")
+    parser.add_argument("--seed", type=int, default=None, help="Seed latency jitter for repeatable runs")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    services = MockServices(PROFILES[args.profile], args.error_rate)
+    print(f"Mock services ({args.profile} profile) on http://{args.host}:{args.port}")
+    print("Point the API at them with:")
+    for key, value in api_environment(args.host, args.port).items():
+        print(f"  {key}={value}")
+    web.run_app(build_app(services), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,20 @@
 """RAG Evaluation Runner
 
 Runs each test question against 2 retrieval configurations (baseline vs semantic
-ranker) sequentially, scores responses with an LLM judge (Mistral Large 3),
-and saves timestamped results to evaluation/results/.
+ranker), scores responses with an LLM judge (Mistral Large 3), and saves
+timestamped results to evaluation/results/.
+
+Question x config pairs run concurrently: API calls and judge calls each have
+their own worker limit, so judging one answer overlaps with fetching the next.
+Both limits adapt to throttling (AIMD): a 429 halves the limit and pauses for
+Retry-After, every success grows it back by up to one slot per round.
+
+Every finished pair is appended to results/<run_id>.jsonl straight away, so a
+crashed or interrupted run continues where it stopped with --resume <run_id>
+(pairs that errored are retried). Judge verdicts are cached in
+results/judge_cache.jsonl, keyed by a hash of the judge deployment, question,
+expected answer, answer and chunks, so re-running unchanged answers costs no
+judge calls.
 
 Usage:
     uv run --project evaluation evaluation/run.py \
@@ -11,25 +23,33 @@ Usage:
         --folder-id <folder_id> \
         [--api-url http://localhost:4001] \
         [--test-set evaluation/test_set.json] \
-        [--delay 3]
+        [--concurrency 4] [--judge-concurrency 8] \
+        [--resume <run_id>]
 
 The script reads Azure credentials from apps/api/.env (AZURE_AI_RESOURCE_NAME,
 AZURE_AI_CHAT_DEPLOYMENT) and authenticates via DefaultAzureCredential (az login).
 """
 
 import argparse
+import asyncio
+import hashlib
 import json
+import random
 import sys
 import time
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Awaitable, Callable, TypeVar
 
-import requests
-from azure.ai.inference import ChatCompletionsClient
+import httpx
+from azure.ai.inference.aio import ChatCompletionsClient
 from azure.ai.inference.models import SystemMessage, UserMessage
-from azure.identity import DefaultAzureCredential
+from azure.core.exceptions import HttpResponseError
+from azure.identity.aio import DefaultAzureCredential
 from dotenv import dotenv_values
 
+T = TypeVar("T")
+
 # ---------------------------------------------------------------------------
 # Constants
 # ---------------------------------------------------------------------------
@@ -61,6 +81,12 @@ Retrieved chunks (context the system had available):
 
 _COGNITIVE_SERVICES_SCOPES = ["https://cognitiveservices.azure.com/.default"]
 
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+JUDGE_CACHE_PATH = RESULTS_DIR / "judge_cache.jsonl"
+
+# Status codes treated as "slow down" rather than as failures
+THROTTLE_STATUS_CODES = {429, 503}
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
@@ -75,8 +101,12 @@ def load_env() -> dict:
     return dict(dotenv_values(env_path))
 
 
-def get_judge_client(env: dict[str, str]) -> ChatCompletionsClient:
-    """Create a ChatCompletionsClient for the LLM judge (Mistral Large 3)."""
+def get_judge_client(env: dict[str, str], credential: DefaultAzureCredential) -> ChatCompletionsClient:
+    """Create an async ChatCompletionsClient for the LLM judge (Mistral Large 3).
+
+    SDK retries are off: throttling is handled by the judge AdaptiveLimiter,
+    which needs to see every 429 to back off.
+    """
     resource_name = env.get("AZURE_AI_RESOURCE_NAME", "")
     deployment = env.get("AZURE_AI_CHAT_DEPLOYMENT", "")
     if not resource_name or not deployment:
@@ -85,9 +115,10 @@ def get_judge_client(env: dict[str, str]) -> ChatCompletionsClient:
 
     return ChatCompletionsClient(
         endpoint=f"https://{resource_name}.services.ai.azure.com/models",
-        credential=DefaultAzureCredential(),
+        credential=credential,
         credential_scopes=_COGNITIVE_SERVICES_SCOPES,
         model=deployment,
+        retry_total=0,
     )
 
 
@@ -104,15 +135,143 @@ def format_chunks_for_judge(chunks: list[dict]) -> str:
     return "\n\n".join(parts)
 
 
-def judge_response(
+def _throttle_delay(error: Exception, attempt: int) -> float | None:
+    """Seconds to back off if error is a throttling response, None for any other error."""
+    if isinstance(error, httpx.HTTPStatusError):
+        status, headers = error.response.status_code, error.response.headers
+    elif isinstance(error, HttpResponseError) and error.response is not None:
+        status, headers = error.status_code, error.response.headers
+    else:
+        return None
+    if status not in THROTTLE_STATUS_CODES:
+        return None
+    try:
+        return float(headers.get("Retry-After", ""))
+    except ValueError:
+        # Exponential backoff with jitter when the service does not say
+        return min(60.0, 2.0 ** attempt) * random.uniform(0.5, 1.5)
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that adapts to throttling (additive increase, multiplicative decrease).
+
+    Starts at max_limit. A throttled call halves the limit and pauses new
+    calls for the Retry-After delay; each successful call adds 1/limit, so
+    the limit grows back by about one slot per round of calls.
+    """
+
+    def __init__(self, name: str, max_limit: int, max_attempts: int) -> None:
+        self.name = name
+        self.max_limit = max_limit
+        self.max_attempts = max_attempts
+        self.limit = float(max_limit)
+        self.throttled = 0
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._condition = asyncio.Condition()
+
+    async def _acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+    async def _release(self, throttle_delay: float | None) -> None:
+        async with self._condition:
+            self._in_flight -= 1
+            if throttle_delay is None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            else:
+                self.throttled += 1
+                self.limit = max(1.0, self.limit / 2)
+                self._paused_until = max(self._paused_until, time.monotonic() + throttle_delay)
+                print(f"  {self.name} throttled, limit now {int(self.limit)}, pausing {throttle_delay:.1f}s")
+            self._condition.notify_all()
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn within the limit, retrying throttled calls up to max_attempts times."""
+        for attempt in range(self.max_attempts):
+            await self._acquire()
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = _throttle_delay(e, attempt)
+                await self._release(delay)
+                if delay is None or attempt == self.max_attempts - 1:
+                    raise
+                continue
+            await self._release(None)
+            return result
+        raise AssertionError("unreachable")
+
+
+class JudgeCache:
+    """Judge verdicts keyed by a hash of everything the judge sees, persisted as JSONL."""
+
+    def __init__(self, path: Path, enabled: bool = True) -> None:
+        self.path = path
+        self.enabled = enabled
+        self.hits = 0
+        self._verdicts: dict[str, dict] = {}
+        if enabled and path.exists():
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._verdicts[entry["key"]] = entry["scores"]
+
+    @staticmethod
+    def key(model: str, question: str, expected_answer: str, answer: str, chunks_text: str) -> str:
+        payload = json.dumps([model, question, expected_answer, answer, chunks_text], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        scores = self._verdicts.get(key) if self.enabled else None
+        if scores is not None:
+            self.hits += 1
+        return scores
+
+    def put(self, key: str, scores: dict) -> None:
+        if not self.enabled:
+            return
+        self._verdicts[key] = scores
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"key": key, "scores": scores}) + "\n")
+
+
+def parse_verdict(content: str) -> dict | None:
+    """Parse the judge's JSON verdict, or None if it is not valid JSON."""
+    content = content.strip()
+
+    # Strip markdown fences if the model wraps in ```json ... ```
+    if content.startswith("```"):
+        content = content.split("\n", 1)[-1].rsplit("```", 1)[0].strip()
+
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        return None
+
+
+async def judge_response(
     client: ChatCompletionsClient,
+    limiter: AdaptiveLimiter,
+    cache: JudgeCache,
+    model: str,
     question: str,
     expected_answer: str,
     actual_answer: str,
     chunks: list[dict],
-) -> dict:
-    """Score a response using the LLM judge. Returns scores dict."""
+) -> tuple[dict, bool]:
+    """Score a response using the LLM judge. Returns (scores, served from cache)."""
     chunks_text = format_chunks_for_judge(chunks)
+    cache_key = JudgeCache.key(model, question, expected_answer, actual_answer, chunks_text)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached, True
+
     user_msg = JUDGE_USER_TEMPLATE.format(
         question=question,
         expected_answer=expected_answer,
@@ -120,30 +279,26 @@ def judge_response(
         chunks_text=chunks_text,
     )
 
-    response = client.complete(
+    response = await limiter.call(lambda: client.complete(
         messages=[
             SystemMessage(content=JUDGE_SYSTEM_PROMPT),
             UserMessage(content=user_msg),
         ],
-    )
+    ))
 
-    content = response.choices[0].message.content.strip()
+    content = response.choices[0].message.content
+    scores = parse_verdict(content)
+    if scores is None:
+        # Not cached; the pair is logged as an error, so --resume asks again
+        raise ValueError(f"Judge returned invalid JSON: {content[:200]}")
 
-    # Strip markdown fences if the model wraps in ```json ... ```
-    if content.startswith("```"):
-        content = content.split("\n", 1)[-1].rsplit("```", 1)[0].strip()
-
-    try:
-        scores = json.loads(content)
-    except json.JSONDecodeError:
-        print(f"  WARNING: Judge returned invalid JSON: {content[:200]}")
-        scores = {"faithfulness": 0, "relevance": 0, "completeness": 0, "reasoning": f"Parse error: {content[:200]}"}
-
-    return scores
+    cache.put(cache_key, scores)
+    return scores, False
 
 
-def run_question(
-    session: requests.Session,
+async def run_question(
+    client: httpx.AsyncClient,
+    limiter: AdaptiveLimiter,
     api_url: str,
     org_id: str,
     folder_id: str,
@@ -159,13 +314,55 @@ def run_question(
         **config_overrides,
     }
 
-    response = session.post(
-        f"{api_url}/api/v1/chat/query",
-        json=payload,
-        timeout=120,
-    )
-    response.raise_for_status()
-    return response.json()
+    async def post() -> dict:
+        response = await client.post(f"{api_url}/api/v1/chat/query", json=payload, timeout=120)
+        response.raise_for_status()
+        return response.json()
+
+    return await limiter.call(post)
+
+
+class ResultLog:
+    """Append-only JSONL of finished question x config pairs; the last record per pair wins."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.records: dict[tuple[str, str], dict] = {}
+        if path.exists():
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.records[(record["question_id"], record["config"])] = record
+
+    def is_done(self, question_id: str, config: str) -> bool:
+        record = self.records.get((question_id, config))
+        return record is not None and "error" not in record
+
+    def append(self, record: dict) -> None:
+        self.records[(record["question_id"], record["config"])] = record
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def results(self, questions: list[dict], configs: list[tuple[str, dict]]) -> list[dict]:
+        """Per-question results in the layout of the final results JSON."""
+        results = []
+        for q in questions:
+            q_result = {
+                "question_id": q["id"],
+                "question": q["question"],
+                "category": q.get("category", "unknown"),
+                "expected_answer": q["expected_answer"],
+                "configs": {},
+            }
+            for cfg_name, _ in configs:
+                record = self.records.get((q["id"], cfg_name))
+                if record is not None:
+                    q_result["configs"][cfg_name] = {
+                        k: v for k, v in record.items() if k not in ("question_id", "config")
+                    }
+            results.append(q_result)
+        return results
 
 
 def print_summary(results: list[dict], configs: list[tuple[str, dict]]) -> None:
@@ -212,18 +409,118 @@ def print_summary(results: list[dict], configs: list[tuple[str, dict]]) -> None:
     print()
 
 
+def build_summary(results: list[dict], configs: list[tuple[str, dict]]) -> dict:
+    summary = {}
+    for cfg_name, _ in configs:
+        scores_lists: dict[str, list[float]] = {"faithfulness": [], "relevance": [], "completeness": [], "total_ms": []}
+        for r in results:
+            cfg_data = r["configs"].get(cfg_name, {})
+            if cfg_data and "error" not in cfg_data:
+                s = cfg_data.get("scores", {})
+                scores_lists["faithfulness"].append(s.get("faithfulness", 0))
+                scores_lists["relevance"].append(s.get("relevance", 0))
+                scores_lists["completeness"].append(s.get("completeness", 0))
+                scores_lists["total_ms"].append(cfg_data.get("timing", {}).get("total_ms", 0))
+
+        def avg(lst: list[float]) -> float:
+            return round(sum(lst) / len(lst), 2) if lst else 0
+
+        summary[cfg_name] = {
+            "avg_faithfulness": avg(scores_lists["faithfulness"]),
+            "avg_relevance": avg(scores_lists["relevance"]),
+            "avg_completeness": avg(scores_lists["completeness"]),
+            "avg_total_ms": avg(scores_lists["total_ms"]),
+            "num_questions": len(scores_lists["faithfulness"]),
+        }
+    return summary
+
+
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
 
 
+async def evaluate(args: argparse.Namespace, questions: list[dict], log: ResultLog) -> tuple[int, int, JudgeCache]:
+    """Run every pending question x config pair. Returns (pairs run, pairs failed, judge cache)."""
+    env = load_env()
+    credential = DefaultAzureCredential()
+    judge_client = get_judge_client(env, credential)
+    judge_model = env.get("AZURE_AI_CHAT_DEPLOYMENT", "")
+    judge_cache = JudgeCache(JUDGE_CACHE_PATH, enabled=not args.no_judge_cache)
+    api_limiter = AdaptiveLimiter("API", args.concurrency, args.max_attempts)
+    judge_limiter = AdaptiveLimiter("Judge", args.judge_concurrency, args.max_attempts)
+
+    pending = [
+        (q, cfg_name, cfg_overrides)
+        for q in questions
+        for cfg_name, cfg_overrides in CONFIGS
+        if not log.is_done(q["id"], cfg_name)
+    ]
+    skipped = len(questions) * len(CONFIGS) - len(pending)
+    if skipped:
+        print(f"Resuming: {skipped} pairs already done, {len(pending)} to run")
+
+    finished = 0
+    failed = 0
+
+    async def run_pair(http_client: httpx.AsyncClient, q: dict, cfg_name: str, cfg_overrides: dict) -> None:
+        nonlocal finished, failed
+        record = {"question_id": q["id"], "config": cfg_name}
+        try:
+            api_response = await run_question(
+                http_client, api_limiter, args.api_url, args.org_id, args.folder_id,
+                q["question"], cfg_overrides,
+            )
+            record.update({
+                "answer": api_response.get("answer", ""),
+                "query_rewritten": api_response.get("query_rewritten", ""),
+                "citations": api_response.get("citations", []),
+                "timing": api_response.get("timing", {}),
+                "chunks_used": api_response.get("chunks_used", []),
+            })
+            scores, from_cache = await judge_response(
+                judge_client, judge_limiter, judge_cache, judge_model,
+                q["question"], q["expected_answer"], record["answer"], record["chunks_used"],
+            )
+            record["scores"] = scores
+            status = (
+                f"F={scores.get('faithfulness', 0)} R={scores.get('relevance', 0)} "
+                f"C={scores.get('completeness', 0)}, {record['timing'].get('total_ms', 0):.0f}ms"
+                + (" (cached verdict)" if from_cache else "")
+            )
+        except httpx.HTTPStatusError as e:
+            record["error"] = str(e)
+            status = f"HTTP error: {e.response.status_code}"
+            failed += 1
+        except Exception as e:
+            record["error"] = str(e)
+            status = f"Error: {e}"
+            failed += 1
+
+        log.append(record)
+        finished += 1
+        print(f"[{finished}/{len(pending)}] {q['id']} config={cfg_name}: {status}")
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with credential, judge_client, httpx.AsyncClient(limits=limits) as http_client:
+        await asyncio.gather(*(run_pair(http_client, *pair) for pair in pending))
+
+    if api_limiter.throttled or judge_limiter.throttled:
+        print(f"Throttled responses: API {api_limiter.throttled}, judge {judge_limiter.throttled}")
+    return len(pending), failed, judge_cache
+
+
 def main():
     parser = argparse.ArgumentParser(description="RAG Evaluation Runner")
     parser.add_argument("--org-id", required=True, help="Organization ID")
     parser.add_argument("--folder-id", default="", help="Folder ID to scope retrieval (optional)")
     parser.add_argument("--api-url", default="http://localhost:4001", help="API base URL")
     parser.add_argument("--test-set", default="evaluation/test_set.json", help="Path to test set JSON")
-    parser.add_argument("--delay", type=int, default=20, help="Seconds to wait between API calls (rate limit avoidance)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Max concurrent API calls (adapts down on 429)")
+    parser.add_argument("--judge-concurrency", type=int, default=8, help="Max concurrent judge calls (adapts down on 429)")
+    parser.add_argument("--max-attempts", type=int, default=6, help="Attempts per call when throttled")
+    parser.add_argument("--resume", default="", help="Run ID (or .jsonl path) of an interrupted run to continue")
+    parser.add_argument("--no-judge-cache", action="store_true", help="Always call the judge")
     args = parser.parse_args()
 
     # Load test set
@@ -238,124 +535,43 @@ def main():
     questions = test_set["questions"]
     print(f"Loaded {len(questions)} questions from {test_set_path}")
     print(f"Running {len(CONFIGS)} configurations x {len(questions)} questions = {len(CONFIGS) * len(questions)} total API calls")
-    print(f"Delay between calls: {args.delay}s")
+    print(f"Concurrency: {args.concurrency} API calls, {args.judge_concurrency} judge calls")
     print()
 
-    # Set up clients
-    env = load_env()
-    judge_client = get_judge_client(env)
-    http_client = requests.Session()
-
-    results = []
-    total_calls = len(CONFIGS) * len(questions)
-    current_call = 0
-
-    for q_idx, q in enumerate(questions):
-        q_id = q["id"]
-        question_text = q["question"]
-        expected_answer = q["expected_answer"]
-        category = q.get("category", "unknown")
-
-        print(f"[{q_idx + 1}/{len(questions)}] {q_id}: {question_text[:80]}...")
-
-        q_result = {
-            "question_id": q_id,
-            "question": question_text,
-            "category": category,
-            "expected_answer": expected_answer,
-            "configs": {},
-        }
-
-        for cfg_name, cfg_overrides in CONFIGS:
-            current_call += 1
-            print(f"  [{current_call}/{total_calls}] config={cfg_name} ... ", end="", flush=True)
-
-            try:
-                # Call the API
-                api_response = run_question(
-                    http_client, args.api_url, args.org_id, args.folder_id,
-                    question_text, cfg_overrides,
-                )
-
-                answer = api_response.get("answer", "")
-                citations = api_response.get("citations", [])
-                timing = api_response.get("timing", {})
-                chunks_used = api_response.get("chunks_used", [])
-                query_rewritten = api_response.get("query_rewritten", "")
-
-                total_ms = timing.get("total_ms", 0)
-                print(f"answer={len(answer)} chars, {total_ms:.0f}ms ... ", end="", flush=True)
-
-                # Judge the response
-                scores = judge_response(
-                    judge_client, question_text, expected_answer, answer, chunks_used,
-                )
-                f_score = scores.get("faithfulness", 0)
-                r_score = scores.get("relevance", 0)
-                c_score = scores.get("completeness", 0)
-                print(f"F={f_score} R={r_score} C={c_score}")
-
-                q_result["configs"][cfg_name] = {
-                    "answer": answer,
-                    "query_rewritten": query_rewritten,
-                    "citations": citations,
-                    "timing": timing,
-                    "chunks_used": chunks_used,
-                    "scores": scores,
-                }
-
-            except requests.HTTPError as e:
-                print(f"HTTP error: {e.response.status_code if e.response else 'unknown'}")
-                q_result["configs"][cfg_name] = {"error": str(e)}
-            except Exception as e:
-                print(f"Error: {e}")
-                q_result["configs"][cfg_name] = {"error": str(e)}
-
-            # Rate limit delay (skip after the very last call)
-            if current_call < total_calls:
-                time.sleep(args.delay)
-
-        results.append(q_result)
-
-    http_client.close()
-
-    # Build summary
-    summary = {}
-    for cfg_name, _ in CONFIGS:
-        scores_lists: dict[str, list[float]] = {"faithfulness": [], "relevance": [], "completeness": [], "total_ms": []}
-        for r in results:
-            cfg_data = r["configs"].get(cfg_name, {})
-            if "error" not in cfg_data:
-                s = cfg_data.get("scores", {})
-                scores_lists["faithfulness"].append(s.get("faithfulness", 0))
-                scores_lists["relevance"].append(s.get("relevance", 0))
-                scores_lists["completeness"].append(s.get("completeness", 0))
-                scores_lists["total_ms"].append(cfg_data.get("timing", {}).get("total_ms", 0))
-
-        def avg(lst: list[float]) -> float:
-            return round(sum(lst) / len(lst), 2) if lst else 0
-
-        summary[cfg_name] = {
-            "avg_faithfulness": avg(scores_lists["faithfulness"]),
-            "avg_relevance": avg(scores_lists["relevance"]),
-            "avg_completeness": avg(scores_lists["completeness"]),
-            "avg_total_ms": avg(scores_lists["total_ms"]),
-            "num_questions": len(scores_lists["faithfulness"]),
-        }
+    RESULTS_DIR.mkdir(exist_ok=True)
+    if args.resume:
+        log_path = Path(args.resume) if args.resume.endswith(".jsonl") else RESULTS_DIR / f"{args.resume}.jsonl"
+        if not log_path.exists():
+            print(f"ERROR: No run to resume at {log_path}")
+            sys.exit(1)
+        run_id = log_path.stem
+    else:
+        run_id = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+        log_path = RESULTS_DIR / f"{run_id}.jsonl"
+    print(f"Run ID: {run_id} (progress in {log_path})")
+
+    log = ResultLog(log_path)
+    t0 = time.perf_counter()
+    ran, failed, judge_cache = asyncio.run(evaluate(args, questions, log))
+    elapsed = time.perf_counter() - t0
+    print(f"\nRan {ran} pairs in {elapsed:.0f}s ({failed} failed, {judge_cache.hits} judge verdicts from cache)")
+
+    results = log.results(questions, CONFIGS)
+    summary = build_summary(results, CONFIGS)
 
     # Save results
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-    results_dir = Path(__file__).resolve().parent / "results"
-    results_dir.mkdir(exist_ok=True)
-    output_path = results_dir / f"{timestamp}.json"
+    output_path = RESULTS_DIR / f"{run_id}.json"
 
     output = {
         "metadata": {
             "timestamp": datetime.now(timezone.utc).isoformat(),
+            "run_id": run_id,
             "api_url": args.api_url,
             "organization_id": args.org_id,
             "folder_id": args.folder_id,
-            "delay_seconds": args.delay,
+            "concurrency": args.concurrency,
+            "judge_concurrency": args.judge_concurrency,
+            "elapsed_seconds": round(elapsed, 1),
             "test_set": str(test_set_path),
             "num_questions": len(questions),
             "num_configs": len(CONFIGS),
@@ -368,6 +584,8 @@ def main():
         json.dump(output, f, indent=2)
 
     print(f"\nResults saved to {output_path}")
+    if failed:
+        print(f"{failed} pairs failed; re-run with --resume {run_id} to retry them")
 
     # Print summary table
     print_summary(results, CONFIGS)